@@ -48,6 +48,10 @@ class NotImplementedError(dbus.DBusException):
     _dbus_error_name = DAEMON_ORG + '.NotImplementedError'
 
 
+class CursorError(dbus.DBusException):
+    _dbus_error_name = DAEMON_ORG + '.CursorError'
+
+
 #------------------------------------------------------------------- Main class
 
 
@@ -99,11 +103,37 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param sender:
         '''
         if not self._lock:
-            self._lock = sender
-            logger.info('LOCK: Locked by : %s' % sender)
+            self.set_lock(sender)
             return True
         return False
 
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='b',
+                         sender_keyword='sender')
+    def AcquireReadLease(self, sender=None):
+        '''
+        Get a shared read lease, needed to call the read methods without
+        the dnfdaemon lock. Any number of clients can have a read lease,
+        also while another client has the lock.
+        The lease is released when the client leaves the bus.
+        :param sender:
+        '''
+        return self.add_read_lease(sender)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='b',
+                         sender_keyword='sender')
+    def ReleaseReadLease(self, sender=None):
+        '''
+        Release the shared read lease
+        :param sender:
+        '''
+        return self.remove_read_lease(sender)
+
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='b',
@@ -121,17 +151,81 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='',
-                         out_signature='b',
+                         out_signature='s',
                          sender_keyword='sender')
-    def ExpireCache(self, sender=None):
+    def GetResultCacheStats(self, sender=None):
+        '''
+        Get the hit/miss counters and the size of the result cache, used
+        for Search, GetPackages and GetPackagesByName
+        :return: dict with hits, misses, evictions, entries, size and
+                 max_size (JSON)
+        '''
+        return self.get_result_cache_stats()
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='s',
+                         sender_keyword='sender')
+    def GetStats(self, sender=None):
+        '''
+        Get the call and error counters, latency percentiles and reply sizes
+        of the D-Bus methods
+        :return: dict with uptime and a dict of stats for each method (JSON)
+        '''
+        return self.get_stats()
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='b',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def ExpireCache(self, sender=None, reply_handler=None, error_handler=None):
         '''
         Enabled a list of repositories, disabled all other repos
         :param repo_ids: list of repo ids to enable
         :param sender:
         '''
-        self.working_start(sender)
-        rc = self.expire_cache()
-        return self.working_ended(rc)
+        def expire_cache():
+            rc, count, size = self.expire_cache()
+            return rc
+
+        self.run_writer(sender, reply_handler, error_handler, expire_cache)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='as',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def ExpireRepoCache(self, repo_ids, sender=None, reply_handler=None,
+                        error_handler=None):
+        '''
+        Expire the cache of some of the enabled repositories
+        :param repo_ids: list of repo ids to expire
+        :param sender:
+        :return: dict with success, files and bytes removed (JSON)
+        '''
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.expire_repo_cache, repo_ids)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='s',
+                         sender_keyword='sender')
+    def GetCacheUsage(self, sender=None):
+        '''
+        Get the number of packages and bytes used by each repository in
+        the package cache
+        :param sender:
+        :return: dict with the repo usage, the total bytes and the cache
+                 quota (JSON)
+        '''
+        self.reader_start(sender)
+        value = self.get_cache_usage()
+        return self.working_ended(value)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -144,7 +238,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param filter: filter to limit the listed repositories
         :param sender:
         '''
-        self.working_start(sender)
+        self.reader_start(sender)
         repos = self.get_repositories(filter)
         return self.working_ended(repos)
 
@@ -152,16 +246,17 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='as',
                          out_signature='',
-                         sender_keyword='sender')
-    def SetEnabledRepos(self, repo_ids, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def SetEnabledRepos(self, repo_ids, sender=None, reply_handler=None,
+                        error_handler=None):
         '''
         Enabled a list of repositories, disabled all other repos
         :param repo_ids: list of repo ids to enable
         :param sender:
         '''
-        self.working_start(sender)
-        self.set_enabled_repos(repo_ids)
-        return self.working_ended()
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.set_enabled_repos, repo_ids)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -175,7 +270,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param setting: name of setting (debuglevel etc..)
         :param sender:
         '''
-        self.working_start(sender)
+        self.reader_start(sender)
         value = self.get_config(setting)
         return self.working_ended(value)
 
@@ -191,7 +286,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param repo_id:
         :param sender:
         '''
-        self.working_start(sender)
+        self.reader_start(sender)
         value = self.get_repo(repo_id)
         return self.working_ended(value)
 
@@ -199,23 +294,94 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='sas',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetPackages(self, pkg_filter, fields, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPackages(self, pkg_filter, fields, sender=None,
+                    reply_handler=None, error_handler=None):
         '''
         Get a list of package ids, based on a package pkg_filterer
         :param pkg_filter: pkg pkg_filter string ('installed','updates' etc)
         :param sender:
         '''
-        self.working_start(sender)
-        value = self.get_packages(pkg_filter, fields)
-        return self.working_ended(value)
+        if fields == ['summary', 'size', 'group']:
+            self.run_reader(sender, reply_handler, error_handler,
+                            self.get_packages_ndsg, pkg_filter)
+        else:
+            self.run_reader(sender, reply_handler, error_handler,
+                            self.get_packages, pkg_filter, fields)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetUpdatesSummary(self, sender=None,
+                          reply_handler=None, error_handler=None):
+        '''
+        Get the number of available updates and the total download size
+        :param sender:
+        :return: dict with updates, installs and download_size (JSON)
+        '''
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_updates_summary)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='sasii',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPackagesPage(self, pkg_filter, fields, offset, limit, sender=None,
+                        reply_handler=None, error_handler=None):
+        '''
+        Get a page of the package list for a package filter
+        :param pkg_filter: pkg pkg_filter string ('installed','updates' etc)
+        :param fields: list of package attributes to get
+        :param offset: index of the first package in the page
+        :param limit: max. number of packages in the page (0 = all)
+        :param sender:
+        :return: dict with packages, total and cursor for the next page
+                 (JSON)
+        '''
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_packages_page, pkg_filter, fields, offset,
+                        limit)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='si',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPage(self, cursor, limit, sender=None, reply_handler=None,
+                error_handler=None):
+        '''
+        Get the next page of a package list from GetPackagesPage or
+        SearchPage
+        :param cursor: cursor returned with the previous page
+        :param limit: max. number of packages in the page (0 = all)
+        :param sender:
+        :return: dict with packages, total and cursor for the next page
+                 (JSON)
+        '''
+        def get_page():
+            value = self.get_page(cursor, limit)
+            if value is None:
+                raise CursorError('The cursor is not valid anymore, the '
+                                  'package list has been reloaded')
+            return value
+
+        self.run_reader(sender, reply_handler, error_handler, get_page)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='sasb',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetPackagesByName(self, name, attrs, newest_only, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPackagesByName(self, name, attrs, newest_only, sender=None,
+                          reply_handler=None, error_handler=None):
         '''
         Get a list of packages from a name pattern
         :param name: name pattern
@@ -223,16 +389,18 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param attrs: list of package attributes to get
         :param sender:
         '''
-        self.working_start(sender)
-        values = self.get_packages_by_name_with_attr(name, attrs, newest_only)
-        return self.working_ended(values)
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_packages_by_name_with_attr, name, attrs,
+                        newest_only)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='ss',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetAttribute(self, id, attr, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetAttribute(self, id, attr, sender=None,
+                     reply_handler=None, error_handler=None):
         '''
         Get an attribute from a yum package id
         it will return a python repr string of the attribute
@@ -241,9 +409,28 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
                               description, changelog etc..)
         :param sender:
         '''
-        self.working_start(sender)
-        value = self.get_attribute(id, attr)
-        return self.working_ended(value)
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_attribute, id, attr)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='asas',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetAttributes(self, pkg_ids, attrs, sender=None,
+                      reply_handler=None, error_handler=None):
+        '''
+        Get a list of attributes for a list of package ids in one call
+        :param pkg_ids: list of package ids
+        :param attrs: list of attribute names (summary, size,
+                      description, action etc..)
+        :param sender:
+        :return: dict with a list of attribute values for each package id,
+                 None for packages not found (JSON)
+        '''
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_attributes, pkg_ids, attrs)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -253,20 +440,44 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     def Unlock(self, sender=None):
         ''' release the lock'''
         if self.check_lock(sender):
-            logger.info('UNLOCK: Lock Release by %s' % self._lock)
-            self._lock = None
-            self._reset_base()
+            self.release_lock()
             return True
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='asasasbbb',
                          out_signature='s',
-                         sender_keyword='sender')
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
     def Search(self, fields, keys, attrs, match_all, newest_only,
-               tags, sender=None):
+               tags, sender=None, reply_handler=None,
+               error_handler=None):
+        '''
+        Search for for packages, where given fields contain given key words
+        :param fields: list of fields to search in
+        :param keys: list of keywords to search for
+        :param attrs: list of extra attributes to get
+        :param match_all: match all flag, if True return only packages
+                          matching all keys
+        :param newest_only: return only the newest version of a package
+        :param tags: seach pkgtags
+        '''
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.search_with_attr, fields, keys, attrs, match_all,
+                        newest_only, tags)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='asasasbbbii',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def SearchPage(self, fields, keys, attrs, match_all, newest_only,
+                   tags, offset, limit, sender=None,
+                   reply_handler=None, error_handler=None):
         '''
         Search for for packages, where given fields contain given key words
+        and return a page of the result
         :param fields: list of fields to search in
         :param keys: list of keywords to search for
         :param attrs: list of extra attributes to get
@@ -274,31 +485,36 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
                           matching all keys
         :param newest_only: return only the newest version of a package
         :param tags: seach pkgtags
+        :param offset: index of the first package in the page
+        :param limit: max. number of packages in the page (0 = all)
+        :return: dict with packages, total and cursor for the next page
+                 (JSON)
         '''
-        self.working_start(sender)
-        result = self.search_with_attr(
-            fields, keys, attrs, match_all, newest_only, tags)
-        return self.working_ended(result)
+        self.run_reader(sender, reply_handler, error_handler, self.search_page,
+                        fields, keys, attrs, match_all, newest_only, tags,
+                        offset, limit)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetGroups(self, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetGroups(self, sender=None, reply_handler=None,
+                  error_handler=None):
         '''
         Return a category/group tree
         '''
-        self.working_start(sender)
-        value = self.get_groups()
-        return self.working_ended(value)
+        self.run_reader(sender, reply_handler, error_handler, self.get_groups)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='ssas',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetGroupPackages(self, grp_id, grp_flt, fields, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetGroupPackages(self, grp_id, grp_flt, fields, sender=None,
+                         reply_handler=None, error_handler=None):
         '''
         Get packages in a group by grp_id and grp_flt
         :param grp_id: The Group id
@@ -306,9 +522,54 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param fields: list of package attributes to include in list
         :param sender:
         '''
-        self.working_start(sender)
-        value = self.get_group_pkgs(grp_id, grp_flt, fields)
-        return self.working_ended(value)
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_group_pkgs, grp_id, grp_flt, fields)
+
+#=========================================================================
+# Native D-Bus API (API version 3)
+# Same as the methods above, but returning D-Bus typed values, not JSON
+#=========================================================================
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='sas',
+                         out_signature='aa{sv}',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPackagesNative(self, pkg_filter, fields, sender=None,
+                          reply_handler=None, error_handler=None):
+        '''
+        Get packages and attributes, based on a package filter
+        :param pkg_filter: pkg pkg_filter string ('installed','updates' etc)
+        :param fields: list of package attributes to get
+        :param sender:
+        :return: list of dicts with the pkg_id as 'id' and the attributes
+        '''
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_packages_native, pkg_filter, fields)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='asasasbbb',
+                         out_signature='aa{sv}',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def SearchNative(self, fields, keys, attrs, match_all, newest_only,
+                     tags, sender=None, reply_handler=None,
+                     error_handler=None):
+        '''
+        Search for for packages, where given fields contain given key words
+        :param fields: list of fields to search in
+        :param keys: list of keywords to search for
+        :param attrs: list of extra attributes to get
+        :param match_all: match all flag, if True return only packages
+                          matching all keys
+        :param newest_only: return only the newest version of a package
+        :param tags: seach pkgtags
+        :return: list of dicts with the pkg_id as 'id' and the attributes
+        '''
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.search_native, fields, keys, attrs, match_all,
+                        newest_only, tags)
 
 #
 #  Template for new method
@@ -344,6 +605,12 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         ''' Progress for a single instance in the batch '''
         pass
 
+    @dbus.service.signal(DAEMON_INTERFACE, signature='a{sd}dddu')
+    def DownloadProgressBatch(self, files, total_frac, bytes_per_sec, eta,
+                              total_files):
+        ''' Progress for the files updated since the last batch '''
+        pass
+
     @dbus.service.signal(DAEMON_INTERFACE)
     def DownloadEnd(self, name, status, msg):
         ''' Download of af single instace ended '''
@@ -365,6 +632,28 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         self._is_working = False
         return value
 
+    def reader_start(self, sender):
+        self.check_read_access(sender)
+        self._is_working = True
+        self._watchdog_count = 0
+
+    def run_writer(self, sender, reply_handler, error_handler, func, *args):
+        '''
+        Check the sender and run a method changing the sack in the main
+        loop, when no read method is running in a worker thread, the reply
+        is sent when the method is done.
+        '''
+        self.check_lock(sender)
+        self.run_exclusive(reply_handler, error_handler, func, *args)
+
+    def run_reader(self, sender, reply_handler, error_handler, func, *args):
+        '''
+        Check the sender and run a read-only method in a worker thread,
+        the reply is sent when the method is done.
+        '''
+        self.check_read_access(sender)
+        self.run_in_worker(reply_handler, error_handler, func, *args)
+
     def check_lock(self, sender):
         '''
         Check that the current sender is owning the dnfdaemon lock
@@ -377,12 +666,37 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         else:
             raise LockedError('dnfdaemon is not locked, but was expected to be')
 
+    def check_read_access(self, sender):
+        '''
+        Check that the current sender is owning the dnfdaemon lock or a
+        shared read lease
+        :param sender:
+        '''
+        if self._lock == sender or self.has_read_lease(sender):
+            return True
+        raise LockedError('dnfdaemon read lease or lock is needed')
+
 
 def main():
     parser = argparse.ArgumentParser(description='Yum D-Bus Session Daemon')
     parser.add_argument('-v', '--verbose', action='store_true')
     parser.add_argument('-d', '--debug', action='store_true')
     parser.add_argument('--notimeout', action='store_true')
+    parser.add_argument('--workers', type=int,
+                        default=dnfdaemon.server.MAX_WORKERS,
+                        help='number of worker threads for read methods')
+    parser.add_argument('--config',
+                        help='dnf config file (default: /etc/dnf/dnf.conf)')
+    parser.add_argument('--progress-rate', type=float,
+                        default=dnfdaemon.server.PROGRESS_RATE,
+                        help='max number of download progress signals a '
+                             'second')
+    parser.add_argument('--legacy-progress', action='store_true',
+                        help='send a DownloadProgress signal for every '
+                             'progress change, not DownloadProgressBatch')
+    parser.add_argument('--stats-file',
+                        help='write the method stats (JSON) to this file '
+                             'every minute')
     args = parser.parse_args()
     if args.verbose:
         if args.debug:
@@ -393,7 +707,14 @@ def main():
 
     # setup the DBus mainloop
     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    dbus.mainloop.glib.threads_init()
     yd = DnfDaemon()
+    yd.max_workers = max(args.workers, 1)
+    yd.progress_rate = args.progress_rate
+    yd.legacy_progress = args.legacy_progress
+    yd.config_file = args.config
+    if args.stats_file:
+        yd._setup_stats_file(args.stats_file)
     if not args.notimeout:
         yd._setup_watchdog()
     yd.mainloop_run()
@@ -27,13 +27,17 @@ from dnfdaemon.server import Logger
 
 import argparse
 import dbus
+import dbus.lowlevel
 import dbus.service
 import dbus.mainloop.glib
 import dnfdaemon.server
+import functools
 import logging
 
 DAEMON_ORG = 'org.baseurl.DnfSystem'
 DAEMON_INTERFACE = DAEMON_ORG
+ACTION_READ = DAEMON_ORG + '.read'
+ACTION_WRITE = DAEMON_ORG + '.write'
 logger = logging.getLogger('dnfdaemon.system')
 
 
@@ -54,10 +58,25 @@ class NotImplementedError(dbus.DBusException):
     _dbus_error_name = DAEMON_ORG + '.NotImplementedError'
 
 
+class CursorError(dbus.DBusException):
+    _dbus_error_name = DAEMON_ORG + '.CursorError'
+
+
+class ProfilingError(dbus.DBusException):
+    _dbus_error_name = DAEMON_ORG + '.ProfilingError'
+
+
 #------------------------------------------------------------ Callback handlers
 
 class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
 
+    # methods there can be called without a PolicyKit authorization
+    NO_AUTH_METHODS = ('GetVersion', 'ReleaseReadLease')
+    # methods needing the write action, all other methods needs read
+    WRITE_METHODS = ('GroupInstall', 'GroupRemove', 'Install', 'Remove',
+                     'Update', 'Reinstall', 'Downgrade', 'RunTransaction',
+                     'ConfirmGPGImport', 'StartProfiling', 'StopProfiling')
+
     def __init__(self):
         dnfdaemon.server.DnfDaemonBase.__init__(self)
         bus_name = dbus.service.BusName(DAEMON_ORG, bus=dbus.SystemBus())
@@ -109,11 +128,38 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         """
         self.check_permission_read(sender)
         if not self._lock:
-            self._lock = sender
-            logger.info('LOCK: Locked by : %s' % sender)
+            self.set_lock(sender)
             return True
         return False
 
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='b',
+                         sender_keyword='sender')
+    def AcquireReadLease(self, sender=None):
+        """
+        Get a shared read lease, needed to call the read methods without
+        the dnfdaemon lock. Any number of clients can have a read lease,
+        also while another client has the lock.
+        The lease is released when the client leaves the bus.
+        :param sender:
+        """
+        self.check_permission_read(sender)
+        return self.add_read_lease(sender)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='b',
+                         sender_keyword='sender')
+    def ReleaseReadLease(self, sender=None):
+        """
+        Release the shared read lease
+        :param sender:
+        """
+        return self.remove_read_lease(sender)
+
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='b',
@@ -129,6 +175,70 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         self._watchdog_disabled = not state
         return state
 
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='s',
+                         sender_keyword='sender')
+    def GetResultCacheStats(self, sender=None):
+        """
+        Get the hit/miss counters and the size of the result cache, used
+        for Search, GetPackages and GetPackagesByName
+        :return: dict with hits, misses, evictions, entries, size and
+                 max_size (JSON)
+        """
+        self.check_permission_read(sender)
+        return self.get_result_cache_stats()
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='s',
+                         sender_keyword='sender')
+    def GetStats(self, sender=None):
+        """
+        Get the call and error counters, latency percentiles and reply sizes
+        of the D-Bus methods
+        :return: dict with uptime and a dict of stats for each method (JSON)
+        """
+        self.check_permission_read(sender)
+        return self.get_stats()
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='s',
+                         out_signature='b',
+                         sender_keyword='sender')
+    def StartProfiling(self, mode, sender=None):
+        """
+        Start profiling the daemon, until StopProfiling is called
+        :param mode: 'cpu' (cProfile) or 'memory' (tracemalloc)
+        :param sender:
+        :return: False if the daemon is profiled already
+        """
+        self.check_permission_write(sender)
+        if mode not in dnfdaemon.server.Profiler.MODES:
+            raise ProfilingError('Unknown profiling mode : %s' % mode)
+        return self.start_profiling(mode)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='s',
+                         sender_keyword='sender')
+    def StopProfiling(self, sender=None):
+        """
+        Stop profiling and write the profile to the profile directory
+        :param sender:
+        :return: dict with mode, path of the profile and top hotspots, None
+                 if the daemon is not profiled (JSON)
+        """
+        self.check_permission_write(sender)
+        try:
+            return self.stop_profiling()
+        except OSError as err:
+            raise ProfilingError('Cannot write the profile : %s' % err)
+
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='s',
@@ -140,7 +250,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param filter: filter to limit the listed repositories
         :param sender:
         """
-        self.working_start(sender, write=False)
+        self.reader_start(sender)
         repos = self.get_repositories(filter)
         return self.working_ended(repos)
 
@@ -148,32 +258,71 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='as',
                          out_signature='',
-                         sender_keyword='sender')
-    def SetEnabledRepos(self, repo_ids, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def SetEnabledRepos(self, repo_ids, sender=None, reply_handler=None,
+                        error_handler=None):
         """
         Enabled a list of repositories, disabled all other repos
         :param repo_ids: list of repo ids to enable
         :param sender:
         """
-        self.working_start(sender, write=False)
-        self.set_enabled_repos(repo_ids)
-        return self.working_ended()
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.set_enabled_repos, repo_ids, write=False)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='',
                          out_signature='b',
-                         sender_keyword='sender')
-    def ExpireCache(self, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def ExpireCache(self, sender=None, reply_handler=None, error_handler=None):
         """
         Enabled a list of repositories, disabled all other repos
         :param repo_ids: list of repo ids to enable
         :param sender:
         :return: True if cache is populated without errors
         """
-        self.working_start(sender, write=False)
-        rc = self.expire_cache()
-        return self.working_ended(rc)
+        def expire_cache():
+            rc, count, size = self.expire_cache()
+            return rc
+
+        self.run_writer(sender, reply_handler, error_handler, expire_cache,
+                        write=False)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='as',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def ExpireRepoCache(self, repo_ids, sender=None, reply_handler=None,
+                        error_handler=None):
+        """
+        Expire the cache of some of the enabled repositories
+        :param repo_ids: list of repo ids to expire
+        :param sender:
+        :return: dict with success, files and bytes removed (JSON)
+        """
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.expire_repo_cache, repo_ids, write=False)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='s',
+                         sender_keyword='sender')
+    def GetCacheUsage(self, sender=None):
+        """
+        Get the number of packages and bytes used by each repository in
+        the package cache
+        :param sender:
+        :return: dict with the repo usage, the total bytes and the cache
+                 quota (JSON)
+        """
+        self.reader_start(sender)
+        value = self.get_cache_usage()
+        return self.working_ended(value)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -187,7 +336,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param setting: name of setting (debuglevel etc..)
         :param sender:
         """
-        self.working_start(sender, write=False)
+        self.reader_start(sender)
         value = self.get_config(setting)
         return self.working_ended(value)
 
@@ -195,17 +344,18 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='ss',
                          out_signature='b',
-                         sender_keyword='sender')
-    def SetConfig(self, setting, value, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def SetConfig(self, setting, value, sender=None, reply_handler=None,
+                  error_handler=None):
         """
         Set yum config setting for the running session
         :param setting: yum conf setting to set
         :param value: value to set
         :param sender:
         """
-        self.working_start(sender, write=False)
-        rc = self.set_option(setting, value)
-        return self.working_ended(rc)
+        self.run_writer(sender, reply_handler, error_handler, self.set_option,
+                        setting, value, write=False)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -219,7 +369,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param repo_id:
         :param sender:
         """
-        self.working_start(sender, write=False)
+        self.reader_start(sender)
         value = self.get_repo(repo_id)
         return self.working_ended(value)
 
@@ -227,26 +377,94 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='sas',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetPackages(self, pkg_filter, fields, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPackages(self, pkg_filter, fields, sender=None,
+                    reply_handler=None, error_handler=None):
         """
         Get a list of package ids, based on a package pkg_filterer
         :param pkg_filter: pkg pkg_filter string ('installed','updates' etc)
         :param sender:
         """
-        self.working_start(sender, write=False)
-        if fields ==  ['summary', 'size', 'group']:
-            value = self.get_packages_ndsg(pkg_filter)
+        if fields == ['summary', 'size', 'group']:
+            self.run_reader(sender, reply_handler, error_handler,
+                            self.get_packages_ndsg, pkg_filter)
         else:
-            value = self.get_packages(pkg_filter, fields)
-        return self.working_ended(value)
+            self.run_reader(sender, reply_handler, error_handler,
+                            self.get_packages, pkg_filter, fields)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetUpdatesSummary(self, sender=None,
+                          reply_handler=None, error_handler=None):
+        """
+        Get the number of available updates and the total download size
+        :param sender:
+        :return: dict with updates, installs and download_size (JSON)
+        """
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_updates_summary)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='sasii',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPackagesPage(self, pkg_filter, fields, offset, limit, sender=None,
+                        reply_handler=None, error_handler=None):
+        """
+        Get a page of the package list for a package filter
+        :param pkg_filter: pkg pkg_filter string ('installed','updates' etc)
+        :param fields: list of package attributes to get
+        :param offset: index of the first package in the page
+        :param limit: max. number of packages in the page (0 = all)
+        :param sender:
+        :return: dict with packages, total and cursor for the next page
+                 (JSON)
+        """
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_packages_page, pkg_filter, fields, offset,
+                        limit)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='si',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPage(self, cursor, limit, sender=None, reply_handler=None,
+                error_handler=None):
+        """
+        Get the next page of a package list from GetPackagesPage or
+        SearchPage
+        :param cursor: cursor returned with the previous page
+        :param limit: max. number of packages in the page (0 = all)
+        :param sender:
+        :return: dict with packages, total and cursor for the next page
+                 (JSON)
+        """
+        def get_page():
+            value = self.get_page(cursor, limit)
+            if value is None:
+                raise CursorError('The cursor is not valid anymore, the '
+                                  'package list has been reloaded')
+            return value
+
+        self.run_reader(sender, reply_handler, error_handler, get_page)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='sasb',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetPackagesByName(self, name, attrs, newest_only, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPackagesByName(self, name, attrs, newest_only, sender=None,
+                          reply_handler=None, error_handler=None):
         """
         Get a list of packages from a name pattern
         :param name: name pattern
@@ -254,16 +472,18 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param attrs: list of package attributes to get
         :param sender:
         """
-        self.working_start(sender, write=False)
-        values = self.get_packages_by_name_with_attr(name, attrs, newest_only)
-        return self.working_ended(values)
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_packages_by_name_with_attr, name, attrs,
+                        newest_only)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='ss',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetAttribute(self, pkg_id, attr, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetAttribute(self, pkg_id, attr, sender=None,
+                     reply_handler=None, error_handler=None):
         """
         Get an attribute from a yum package pkg_id
         it will return a python repr string of the attribute
@@ -272,9 +492,28 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
                      changelog etc..)
         :param sender:
         """
-        self.working_start(sender, write=False)
-        value = self.get_attribute(pkg_id, attr)
-        return self.working_ended(value)
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_attribute, pkg_id, attr)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='asas',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetAttributes(self, pkg_ids, attrs, sender=None,
+                      reply_handler=None, error_handler=None):
+        """
+        Get a list of attributes for a list of package ids in one call
+        :param pkg_ids: list of package ids
+        :param attrs: list of attribute names (summary, size, description,
+                      action etc..)
+        :param sender:
+        :return: dict with a list of attribute values for each package id,
+                 None for packages not found (JSON)
+        """
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_attributes, pkg_ids, attrs)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -290,7 +529,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :return: list of (pkg_id, state, installed) pairs
         :rtype: json encoded string
         """
-        self.working_start(sender, write=False)
+        self.reader_start(sender)
         value = self.get_history_transaction_pkgs(tid)
         return self.working_ended(value)
 
@@ -298,15 +537,16 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='i',
                          out_signature='s',
-                         sender_keyword='sender')
-    def HistoryUndo(self, tid, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def HistoryUndo(self, tid, sender=None, reply_handler=None,
+                    error_handler=None):
         """Undo history from a given yum history transaction id.
 
         tid: history transaction id
         """
-        self.working_start(sender, write=False)
-        value = self.history_undo(tid)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.history_undo, tid, write=False)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -324,7 +564,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :return: a list of (transaction is, date-time) pairs
         :type sender: json encoded string
         """
-        self.working_start(sender, write=False)
+        self.reader_start(sender)
         value = self.get_history_by_days(start_days, end_days)
         return self.working_ended(value)
 
@@ -341,7 +581,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :return: list of (tid,isodates)
         :type sender: json encoded string
         """
-        self.working_start(sender, write=False)
+        self.reader_start(sender)
         value = self.history_search(pattern)
         return self.working_ended(value)
 
@@ -354,129 +594,136 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         """ release the lock"""
         self.check_permission_read(sender)
         if self.check_lock(sender):
-            self._reset_base()
-            logger.info('UNLOCK: Lock Release by %s' % self._lock)
-            self._lock = None
+            self.release_lock()
             return True
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='s',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GroupInstall(self, cmds, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GroupInstall(self, cmds, sender=None, reply_handler=None,
+                     error_handler=None):
         """
         Install groups based on command patterns separated by spaces
         sinulate what 'dnf group install <arguments>' does
         :param cmds: command patterns separated by spaces
         :param sender:
         """
-        self.working_start(sender)
-        value = self.group_install(cmds)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.group_install, cmds)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='s',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GroupRemove(self, cmds, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GroupRemove(self, cmds, sender=None, reply_handler=None,
+                    error_handler=None):
         """
         Install groups based on command patterns separated by spaces
         sinulate what 'dnf group install <arguments>' does
         :param cmds: command patterns separated by spaces
         :param sender:
         """
-        self.working_start(sender)
-        value = self.group_remove(cmds)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.group_remove, cmds)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='s',
                          out_signature='s',
-                         sender_keyword='sender')
-    def Install(self, cmds, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def Install(self, cmds, sender=None, reply_handler=None,
+                error_handler=None):
         """
         Install packages based on command patterns separated by spaces
         sinulate what 'yum install <arguments>' does
         :param cmds: command patterns separated by spaces
         :param sender:
         """
-        self.working_start(sender)
-        value = self.install(cmds)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler, self.install,
+                        cmds)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='s',
                          out_signature='s',
-                         sender_keyword='sender')
-    def Remove(self, cmds, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def Remove(self, cmds, sender=None, reply_handler=None,
+               error_handler=None):
         """
         Remove packages based on command patterns separated by spaces
         sinulate what 'yum remove <arguments>' does
         :param cmds: command patterns separated by spaces
         :param sender:
         """
-        self.working_start(sender)
-        value = self.remove(cmds)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler, self.remove,
+                        cmds)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='s',
                          out_signature='s',
-                         sender_keyword='sender')
-    def Update(self, cmds, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def Update(self, cmds, sender=None, reply_handler=None,
+               error_handler=None):
         """
         Update packages based on command patterns separated by spaces
         sinulate what 'yum update <arguments>' does
         :param cmds: command patterns separated by spaces
         :param sender:
         """
-        self.working_start(sender)
-        value = self.update(cmds)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler, self.update,
+                        cmds)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='s',
                          out_signature='s',
-                         sender_keyword='sender')
-    def Reinstall(self, cmds, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def Reinstall(self, cmds, sender=None, reply_handler=None,
+                  error_handler=None):
         """
         Reinstall packages based on command patterns separated by spaces
         sinulate what 'yum reinstall <arguments>' does
         :param cmds: command patterns separated by spaces
         :param sender:
         """
-        self.working_start(sender)
-        value = self.reinstall(cmds)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler, self.reinstall,
+                        cmds)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='s',
                          out_signature='s',
-                         sender_keyword='sender')
-    def Downgrade(self, cmds, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def Downgrade(self, cmds, sender=None, reply_handler=None,
+                  error_handler=None):
         """
         Downgrade packages based on command patterns separated by spaces
         sinulate what 'yum downgrade <arguments>' does
         :param cmds: command patterns separated by spaces
         :param sender:
         """
-        self.working_start(sender)
-        value = self.downgrade(cmds)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler, self.downgrade,
+                        cmds)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='ss',
                          out_signature='s',
-                         sender_keyword='sender')
-    def AddTransaction(self, pkg_id, action, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def AddTransaction(self, pkg_id, action, sender=None, reply_handler=None,
+                       error_handler=None):
         """
         Add an package to the current transaction
 
@@ -484,22 +731,22 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param action: the action to perform ( install, update, remove,
                        obsolete, reinstall, downgrade, localinstall )
         """
-        self.working_start(sender, write=False)
-        value = self.add_transaction(pkg_id, action)
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.add_transaction, pkg_id, action, write=False)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='',
                          out_signature='',
-                         sender_keyword='sender')
-    def ClearTransaction(self, sender):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def ClearTransaction(self, sender=None, reply_handler=None,
+                         error_handler=None):
         """
         Clear the transactopm
         """
-        self.working_start(sender, write=False)
-        self.clear_transaction()
-        return self.working_ended()
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.clear_transaction, write=False)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -510,7 +757,7 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         """
         Return the members of the current transaction
         """
-        self.working_start(sender, write=False)
+        self.reader_start(sender)
         value = self.get_transaction()
         return self.working_ended(value)
 
@@ -518,37 +765,63 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='',
                          out_signature='s',
-                         sender_keyword='sender')
-    def BuildTransaction(self, sender):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def BuildTransaction(self, sender=None, reply_handler=None,
+                         error_handler=None):
         """
         Resolve dependencies of current transaction
         """
-        self.working_start(sender, write=False)
-        value = self.build_transaction()
-        return self.working_ended(value)
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.build_transaction, write=False)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='',
                          out_signature='s',
-                         sender_keyword='sender')
-    def RunTransaction(self, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def RunTransaction(self, sender=None, reply_handler=None,
+                       error_handler=None):
         """Run the current yum transaction."""
-        self.working_start(sender)
-        self.check_permission_write(sender)
-        self.check_lock(sender)
-        result = self.run_transaction()
-        return self.working_ended(result)
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.run_transaction)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='asasasbbb',
                          out_signature='s',
-                         sender_keyword='sender')
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
     def Search(self, fields, keys, attrs, match_all, newest_only,
-               tags, sender=None):
+               tags, sender=None, reply_handler=None,
+               error_handler=None):
+        """
+        Search for for packages, where given fields contain given key words
+        :param fields: list of fields to search in
+        :param keys: list of keywords to search for
+        :param attrs: list of extra attributes to get
+        :param match_all: match all flag, if True return only packages
+                          matching all keys
+        :param newest_only: return only the newest version of a package
+        :param tags: seach pkgtags
+        """
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.search_with_attr, fields, keys, attrs, match_all,
+                        newest_only, tags)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='asasasbbbii',
+                         out_signature='s',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def SearchPage(self, fields, keys, attrs, match_all, newest_only,
+                   tags, offset, limit, sender=None,
+                   reply_handler=None, error_handler=None):
         """
         Search for for packages, where given fields contain given key words
+        and return a page of the result
         :param fields: list of fields to search in
         :param keys: list of keywords to search for
         :param attrs: list of extra attributes to get
@@ -556,31 +829,36 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
                           matching all keys
         :param newest_only: return only the newest version of a package
         :param tags: seach pkgtags
+        :param offset: index of the first package in the page
+        :param limit: max. number of packages in the page (0 = all)
+        :return: dict with packages, total and cursor for the next page
+                 (JSON)
         """
-        self.working_start(sender, write=False)
-        result = self.search_with_attr(
-            fields, keys, attrs, match_all, newest_only, tags)
-        return self.working_ended(result)
+        self.run_reader(sender, reply_handler, error_handler, self.search_page,
+                        fields, keys, attrs, match_all, newest_only, tags,
+                        offset, limit)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetGroups(self, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetGroups(self, sender=None, reply_handler=None,
+                  error_handler=None):
         """
         Return a category/group tree
         """
-        self.working_start(sender, write=False)
-        value = self.get_groups()
-        return self.working_ended(value)
+        self.run_reader(sender, reply_handler, error_handler, self.get_groups)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
                          in_signature='ssas',
                          out_signature='s',
-                         sender_keyword='sender')
-    def GetGroupPackages(self, grp_id, grp_flt, fields, sender=None):
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetGroupPackages(self, grp_id, grp_flt, fields, sender=None,
+                         reply_handler=None, error_handler=None):
         """
         Get packages in a group by grp_id and grp_flt
         :param grp_id: The Group id
@@ -588,9 +866,8 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         :param fields: list of package attributes to include in list
         :param sender:
         """
-        self.working_start(sender, write=False)
-        value = self.get_group_pkgs(grp_id, grp_flt, fields)
-        return self.working_ended(value)
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_group_pkgs, grp_id, grp_flt, fields)
 
     @Logger
     @dbus.service.method(DAEMON_INTERFACE,
@@ -610,6 +887,128 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         self._gpg_confirm[hexkeyid] = confirmed
         return self.working_ended()
 
+#=========================================================================
+# Native D-Bus API (API version 3)
+# Same as the methods above, but returning D-Bus typed values, not JSON
+#=========================================================================
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='sas',
+                         out_signature='aa{sv}',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def GetPackagesNative(self, pkg_filter, fields, sender=None,
+                          reply_handler=None, error_handler=None):
+        """
+        Get packages and attributes, based on a package filter
+        :param pkg_filter: pkg pkg_filter string ('installed','updates' etc)
+        :param fields: list of package attributes to get
+        :param sender:
+        :return: list of dicts with the pkg_id as 'id' and the attributes
+        """
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.get_packages_native, pkg_filter, fields)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='asasasbbb',
+                         out_signature='aa{sv}',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def SearchNative(self, fields, keys, attrs, match_all, newest_only,
+                     tags, sender=None, reply_handler=None,
+                     error_handler=None):
+        """
+        Search for for packages, where given fields contain given key words
+        :param fields: list of fields to search in
+        :param keys: list of keywords to search for
+        :param attrs: list of extra attributes to get
+        :param match_all: match all flag, if True return only packages
+                          matching all keys
+        :param newest_only: return only the newest version of a package
+        :param tags: seach pkgtags
+        :return: list of dicts with the pkg_id as 'id' and the attributes
+        """
+        self.run_reader(sender, reply_handler, error_handler,
+                        self.search_native, fields, keys, attrs, match_all,
+                        newest_only, tags)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='ba(sa(sdas))',
+                         sender_keyword='sender')
+    def GetTransactionNative(self, sender=None):
+        """
+        Return the members of the current transaction
+        :return: (rc, [(action, [(pkg_id, size, [obs_id, ...]), ...]), ...])
+        """
+        self.reader_start(sender)
+        value = self.get_transaction_native()
+        return self.working_ended(value)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='',
+                         out_signature='ba(sa(sdas))as',
+                         sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def BuildTransactionNative(self, sender=None, reply_handler=None,
+                               error_handler=None):
+        """
+        Resolve dependencies of current transaction
+        :return: (rc, transaction, error messages), the transaction is the
+                 same as in GetTransactionNative
+        """
+        self.run_writer(sender, reply_handler, error_handler,
+                        self.build_transaction_native, write=False)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='ii',
+                         out_signature='a(is)',
+                         sender_keyword='sender')
+    def GetHistoryByDaysNative(self, start_days, end_days, sender=None):
+        """
+        Get History transaction in a interval of days from today
+        :param start_days: start of interval in days from now (0 = today)
+        :param end_days:end of interval in days from now
+        :return: a list of (transaction id, date-time) pairs
+        """
+        self.reader_start(sender)
+        value = self.get_history_by_days_native(start_days, end_days)
+        return self.working_ended(value)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='as',
+                         out_signature='a(is)',
+                         sender_keyword='sender')
+    def HistorySearchNative(self, pattern, sender=None):
+        """
+        Search the history for transaction matching a pattern
+        :param pattern: patterne to match
+        :return: list of (tid, isodates)
+        """
+        self.reader_start(sender)
+        value = self.history_search_native(pattern)
+        return self.working_ended(value)
+
+    @Logger
+    @dbus.service.method(DAEMON_INTERFACE,
+                         in_signature='i',
+                         out_signature='a(ssb)',
+                         sender_keyword='sender')
+    def GetHistoryPackagesNative(self, tid, sender=None):
+        """
+        Get packages from a given yum history transaction id
+        :param tid: history transaction id
+        :return: list of (pkg_id, state, installed)
+        """
+        self.reader_start(sender)
+        value = self.get_history_transaction_pkgs_native(tid)
+        return self.working_ended(value)
+
 #=========================================================================
 # DBus signals
 #=========================================================================
@@ -629,6 +1028,12 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         """ Progress for a single instance in the batch """
         pass
 
+    @dbus.service.signal(DAEMON_INTERFACE, signature='a{sd}dddu')
+    def DownloadProgressBatch(self, files, total_frac, bytes_per_sec, eta,
+                              total_files):
+        """ Progress for the files updated since the last batch """
+        pass
+
     @dbus.service.signal(DAEMON_INTERFACE)
     def DownloadEnd(self, name, status, msg):
         """ Download of af single instace ended """
@@ -670,6 +1075,15 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         """
         pass
 
+    @dbus.service.signal(DAEMON_INTERFACE, signature='a(ssxxxx)')
+    def RPMProgressBatch(self, events):
+        """
+        RPM Progress DBus signal, with the events since the last batch
+        :param events: list of (package, action, te_current, te_total,
+                       ts_current, ts_total) like the RPMProgress signal
+        """
+        pass
+
     @dbus.service.signal(DAEMON_INTERFACE)
     def GPGImport(self, pkg_id, userid, hexkeyid, keyurl, timestamp):
         """
@@ -700,6 +1114,33 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         self._is_working = False
         return value
 
+    def reader_start(self, sender):
+        self.check_permission_read(sender)
+        self.check_read_access(sender)
+        self._is_working = True
+        self._watchdog_count = 0
+
+    def run_writer(self, sender, reply_handler, error_handler, func, *args,
+                   write=True):
+        """Check the sender and run a method changing the sack or the
+        transaction in the main loop, when no read method is running in a
+        worker thread, the reply is sent when the method is done.
+        """
+        if write:
+            self.check_permission_write(sender)
+        else:
+            self.check_permission_read(sender)
+        self.check_lock(sender)
+        self.run_exclusive(reply_handler, error_handler, func, *args)
+
+    def run_reader(self, sender, reply_handler, error_handler, func, *args):
+        """Check the sender and run a read-only method in a worker thread,
+        the reply is sent when the method is done.
+        """
+        self.check_permission_read(sender)
+        self.check_read_access(sender)
+        self.run_in_worker(reply_handler, error_handler, func, *args)
+
     def check_lock(self, sender):
         """
         Check that the current sender is owning the dnfdaemon lock
@@ -712,37 +1153,133 @@ class DnfDaemon(dnfdaemon.server.DnfDaemonBase):
         else:
             raise LockedError('dnfdaemon is not locked, but was expected to be')
 
+    def check_read_access(self, sender):
+        """
+        Check that the current sender is owning the dnfdaemon lock or a
+        shared read lease
+        :param sender:
+        """
+        if self._lock == sender or self.has_read_lease(sender):
+            return True
+        raise LockedError('dnfdaemon read lease or lock is needed')
+
     def check_permission_write(self, sender):
         """ Check for senders permission to update system packages"""
-        if sender in self.authorized_sender_write:
-            return
-        else:
-            self._check_permission(sender, 'org.baseurl.DnfSystem.write')
-            self.authorized_sender_write.add(sender)
+        self._check_authorized(sender, ACTION_WRITE)
 
     def check_permission_read(self, sender):
         """ Check for senders permission to read system packages"""
-        if sender in self.authorized_sender_read:
-            return
-        else:
-            self._check_permission(sender, 'org.baseurl.DnfSystem.read')
-            self.authorized_sender_read.add(sender)
+        self._check_authorized(sender, ACTION_READ)
 
-    def _check_permission(self, sender, action):
-        """ Check senders permissions using PolicyKit1
+    def _check_authorized(self, sender, action):
+        """Check the sender is in the authorization cache.
+
+        The sender is authorized by _message_cb, before the method is
+        called, so this only fails if the method needs an action, there is
+        not in NO_AUTH_METHODS/WRITE_METHODS.
         """
         if not sender:
             raise ValueError('sender == None')
+        if not self._auth_cache.is_authorized(sender, action):
+            raise AccessDeniedError('Session is not authorized')
 
+    def _get_method_action(self, message):
+        """Get the PolicyKit action needed to call a method, None if
+        the method can be called without an authorization.
+        """
+        if message.get_interface() not in (None, DAEMON_INTERFACE):
+            return None
+        name = message.get_member()
+        method = getattr(type(self), name, None)
+        if getattr(method, '_dbus_interface', None) != DAEMON_INTERFACE:
+            return None
+        if name in self.NO_AUTH_METHODS:
+            return None
+        if name in self.WRITE_METHODS:
+            return ACTION_WRITE
+        return ACTION_READ
+
+    def _message_cb(self, connection, message):
+        """Dispatch a method call, when the sender is authorized.
+
+        The authorization is checked asynchronously, while a PolicyKit
+        dialog is open the main loop keeps serving the other clients, and
+        the method call is dispatched (and replied) when the check is done.
+        """
+        dispatch = functools.partial(
+            dnfdaemon.server.DnfDaemonBase._message_cb, self, connection,
+            message)
+        action = self._get_method_action(message)
+        sender = message.get_sender()
+        if (action is None or not sender or
+                self._auth_cache.is_authorized(sender, action)):
+            return dispatch()
+        self.authorize(sender, action, dispatch,
+                       functools.partial(self._reply_error, connection,
+                                         message))
+
+    def _reply_error(self, connection, message, err):
+        if message.get_no_reply():
+            return
+        if not isinstance(err, dbus.DBusException):
+            err = AccessDeniedError(str(err))
+        reply = dbus.lowlevel.ErrorMessage(message, err.get_dbus_name(),
+                                           str(err))
+        connection.send_message(reply)
+
+    def authorize(self, sender, action, reply_handler, error_handler):
+        """Authorize a sender for an action with PolicyKit1.
+
+        reply_handler is called when the sender is authorized, else
+        error_handler is called with the error. Calls from the same sender
+        for the same action, while a check is running, waits for that check.
+        """
+        key = (sender, action)
+        if key in self._auth_pending:
+            self._auth_pending[key].append((reply_handler, error_handler))
+            return
+        self._auth_pending[key] = [(reply_handler, error_handler)]
+        self._check_permission(sender, action,
+                               functools.partial(self._authorize_done, key),
+                               functools.partial(self._authorize_error, key))
+
+    def _authorize_done(self, key, result):
+        granted = result[0]
+        if granted:
+            self._auth_cache.add(*key)
+            self._authorize_ended(key, None)
+        else:
+            self._authorize_ended(
+                key, AccessDeniedError('Session is not authorized'))
+
+    def _authorize_error(self, key, err):
+        logger.debug('PolicyKit check failed for %s : %s', key[0], err)
+        self._authorize_ended(key, AccessDeniedError(str(err)))
+
+    def _authorize_ended(self, key, err):
+        self._watchdog_count = 0
+        for reply_handler, error_handler in self._auth_pending.pop(key, []):
+            if err is None:
+                reply_handler()
+            else:
+                error_handler(err)
+
+    def _check_permission(self, sender, action, reply_handler,
+                          error_handler):
+        """ Check senders permissions using PolicyKit1
+
+        The check is asynchronous, reply_handler is called with the
+        (granted, challenge, details) result.
+        """
         obj = dbus.SystemBus().get_object(
             'org.freedesktop.PolicyKit1',
-            '/org/freedesktop/PolicyKit1/Authority')
+            '/org/freedesktop/PolicyKit1/Authority', introspect=False)
         obj = dbus.Interface(obj, 'org.freedesktop.PolicyKit1.Authority')
-        (granted, _, details) = obj.CheckAuthorization(
+        obj.CheckAuthorization(
             ('system-bus-name', {'name': sender}), action, {},
-            dbus.UInt32(1), '', timeout=600)
-        if not granted:
-            raise AccessDeniedError('Session is not authorized')
+            dbus.UInt32(1), '', signature='(sa{sv})sa{ss}us',
+            reply_handler=reply_handler, error_handler=error_handler,
+            timeout=600)
 
 
 def main():
@@ -750,6 +1287,32 @@ def main():
     parser.add_argument('-v', '--verbose', action='store_true')
     parser.add_argument('-d', '--debug', action='store_true')
     parser.add_argument('--notimeout', action='store_true')
+    parser.add_argument('--workers', type=int,
+                        default=dnfdaemon.server.MAX_WORKERS,
+                        help='number of worker threads for read methods')
+    parser.add_argument('--progress-rate', type=float,
+                        default=dnfdaemon.server.PROGRESS_RATE,
+                        help='max number of download progress signals a '
+                             'second')
+    parser.add_argument('--legacy-progress', action='store_true',
+                        help='send a DownloadProgress signal for every '
+                             'progress change, not DownloadProgressBatch, '
+                             'and a RPMProgress signal for every rpm '
+                             'callback')
+    parser.add_argument('--rpm-progress-batch', action='store_true',
+                        help='send the rpm progress as RPMProgressBatch '
+                             'signals')
+    parser.add_argument('--cache-quota', type=dnfdaemon.server.parse_size,
+                        default=0,
+                        help='max. size of the package cache, like 2G, the '
+                             'least recently used packages are removed '
+                             'after a transaction (default: no quota)')
+    parser.add_argument('--stats-file',
+                        help='write the method stats (JSON) to this file '
+                             'every minute')
+    parser.add_argument('--profile-dir',
+                        default=dnfdaemon.server.PROFILE_DIR,
+                        help='directory for the profiles from StopProfiling')
     args = parser.parse_args()
     if args.verbose:
         if args.debug:
@@ -760,7 +1323,16 @@ def main():
 
     # setup the DBus mainloop
     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    dbus.mainloop.glib.threads_init()
     yd = DnfDaemon()
+    yd.max_workers = max(args.workers, 1)
+    yd.progress_rate = args.progress_rate
+    yd.legacy_progress = args.legacy_progress
+    yd.rpm_progress_batch = args.rpm_progress_batch
+    yd.cache_quota = args.cache_quota
+    yd.profile_dir = args.profile_dir
+    if args.stats_file:
+        yd._setup_stats_file(args.stats_file)
     if not args.notimeout:
         yd._setup_watchdog()
     yd.mainloop_run()
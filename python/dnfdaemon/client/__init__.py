@@ -54,6 +54,10 @@ and overload the signal handlers)::
             # Do your stuff here
             pass
 
+        def on_RPMProgressBatch(self, events):
+            # Do your stuff here
+            pass
+
         def on_GPGImport(self, pkg_id, userid, hexkeyid, keyurl,  timestamp ):
            # do stuff here
            pass
@@ -68,6 +72,12 @@ and overload the signal handlers)::
            # do stuff here
            pass
 
+        def on_DownloadProgressBatch(self, files, total_frac, bytes_per_sec,
+                                     eta, total_files):
+            ''' Progress for the files updated since the last batch '''
+           # do stuff here
+           pass
+
         def on_DownloadEnd(self, name, status, msg):
             ''' Download of af single instace ended '''
            # do stuff here
@@ -104,7 +114,7 @@ import re
 import weakref
 import logging
 
-CLIENT_API_VERSION = 2
+CLIENT_API_VERSION = 3
 
 logger = logging.getLogger("dnfdaemon.client")
 
@@ -151,6 +161,14 @@ class APIVersionError(DaemonError):
     'The yum transaction failed'
 
 
+class CursorError(DaemonError):
+    'The page cursor is not valid anymore'
+
+
+class ProfilingError(DaemonError):
+    'The daemon profiling failed'
+
+
 #
 # Helper Classes
 #
@@ -212,7 +230,8 @@ class DnfDaemonBase:
             proxy = bus.get(org, "/", interface)
             # Get daemon version, to check if it is alive
             self.running_api_version = proxy.GetVersion()
-            if not self.running_api_version == CLIENT_API_VERSION:
+            # newer servers keep the older API methods
+            if self.running_api_version < CLIENT_API_VERSION:
                 raise APIVersionError('Client API : %d <> Server API : %s' %
                                       (CLIENT_API_VERSION,
                                       self.running_api_version))
@@ -246,6 +265,10 @@ class DnfDaemonBase:
             raise TransactionError(msg)
         elif exc == self.dbus_org + '.NotImplementedError':
             raise TransactionError(msg)
+        elif exc == self.dbus_org + '.CursorError':
+            raise CursorError(msg)
+        elif exc == self.dbus_org + '.ProfilingError':
+            raise ProfilingError(msg)
         else:
             raise DaemonError(str(err))
 
@@ -315,6 +338,10 @@ class DnfDaemonBase:
         #print("RPMProgress : %s %s" % (action, package))
         pass
 
+    def on_RPMProgressBatch(self, events):
+        #print("RPMProgressBatch : %d events" % len(events))
+        pass
+
     def on_GPGImport(self, pkg_id, userid, hexkeyid, keyurl, timestamp):
         #values = (pkg_id, userid, hexkeyid, keyurl, timestamp)
         #print("on_GPGImport : %s" % (repr(values)))
@@ -332,6 +359,13 @@ class DnfDaemonBase:
         #print("on_DownloadProgress : %s" % (repr(values)))
         pass
 
+    def on_DownloadProgressBatch(self, files, total_frac, bytes_per_sec, eta,
+                                 total_files):
+        ''' Progress for the files updated since the last batch '''
+        #values = (files, total_frac, bytes_per_sec, eta, total_files)
+        #print("on_DownloadProgressBatch : %s" % (repr(values)))
+        pass
+
     def on_DownloadEnd(self, name, status, msg):
         ''' Download of af single instace ended '''
         #values = (name, status, msg)
@@ -369,6 +403,24 @@ class DnfDaemonBase:
         except Exception as err:
             self._handle_dbus_error(err)
 
+    def AcquireReadLease(self):
+        '''Get a shared read lease, this give access to the read methods
+        (GetPackages, Search etc.) without the exclusive yum lock.
+        Many clients can have a read lease, also while another client
+        has the lock.
+        '''
+        try:
+            return self._run_dbus_async('AcquireReadLease')
+        except Exception as err:
+            self._handle_dbus_error(err)
+
+    def ReleaseReadLease(self):
+        '''Release the shared read lease'''
+        try:
+            return self._run_dbus_async('ReleaseReadLease')
+        except Exception as err:
+            self._handle_dbus_error(err)
+
     def SetWatchdogState(self, state):
         '''Set the Watchdog state
 
@@ -380,6 +432,25 @@ class DnfDaemonBase:
         except Exception as err:
             self._handle_dbus_error(err)
 
+    def GetResultCacheStats(self):
+        '''Get the hit/miss counters and the size of the daemon result
+        cache
+
+        Returns:
+            dict with hits, misses, evictions, entries, size and max_size
+        '''
+        return json.loads(self._run_dbus_async('GetResultCacheStats'))
+
+    def GetStats(self):
+        '''Get the call and error counters, latency percentiles
+        (p50, p90, p99 and max in seconds) and reply sizes of the daemon
+        D-Bus methods
+
+        Returns:
+            dict with uptime and a dict of stats for each method
+        '''
+        return json.loads(self._run_dbus_async('GetStats'))
+
     def GetPackages(self, pkg_filter, fields=[]):
         '''Get a list of pkg list for a given package filter
 
@@ -396,11 +467,85 @@ class DnfDaemonBase:
             'GetPackages', '(sas)', pkg_filter, fields)
         return json.loads(result)
 
+    def GetUpdatesSummary(self):
+        '''Get the number of available updates and the total download size
+
+        The updates are only resolved once, until the package metadata or
+        the installed packages change, so this is cheap to poll.
+
+        Returns:
+            dict with updates (number of updated packages), installs
+            (number of new install only packages, like kernels) and
+            download_size (bytes)
+        '''
+        return json.loads(self._run_dbus_async('GetUpdatesSummary'))
+
+    def GetPackagesPage(self, pkg_filter, fields=[], offset=0, limit=100):
+        '''Get a page of the pkg list for a given package filter
+
+        Args:
+            pkg_filter: package filter ('installed','available',
+                               'updates','obsoletes','recent','extras')
+            fields: yum package objects attributes to get.
+            offset: index of the first package in the page
+            limit: max. number of packages in the page (0 = all)
+
+        Returns:
+            dict with 'packages' (same format as GetPackages), 'total'
+            (number of packages in the list) and 'cursor' to use with
+            GetPage to get the next page ('' if this is the last page)
+        '''
+        result = self._run_dbus_async(
+            'GetPackagesPage', '(sasii)', pkg_filter, fields, offset, limit)
+        return json.loads(result)
+
+    def GetPage(self, cursor, limit=100):
+        '''Get the next page of a package list from GetPackagesPage
+        or SearchPage
+
+        Args:
+            cursor: cursor returned with the previous page
+            limit: max. number of packages in the page (0 = all)
+
+        Returns:
+            dict with 'packages', 'total' and 'cursor'
+
+        Raises:
+            CursorError: if the package list has been reloaded
+                         (ExpireCache, SetEnabledRepos etc.) since the
+                         cursor was returned
+        '''
+        result = self._run_dbus_async('GetPage', '(si)', cursor, limit)
+        return json.loads(result)
+
     def ExpireCache(self):
         '''Expire the dnf metadata, so they will be refresed'''
         rc = self._run_dbus_async('ExpireCache', '()')
         return rc
 
+    def ExpireRepoCache(self, repo_ids):
+        '''Expire the dnf metadata of some repositories
+
+        Args:
+            repo_ids: list of repository ids to expire
+
+        Returns:
+            dict with 'success', and the number of 'files' and 'bytes'
+            removed from the cache
+        '''
+        result = self._run_dbus_async('ExpireRepoCache', '(as)', repo_ids)
+        return json.loads(result)
+
+    def GetCacheUsage(self):
+        '''Get the package cache usage of the repositories
+
+        Returns:
+            dict with 'repos' (repo id -> dict with the number of
+            'packages' and 'bytes'), the total 'bytes' and the 'quota'
+        '''
+        result = self._run_dbus_async('GetCacheUsage')
+        return json.loads(result)
+
     def GetRepositories(self, repo_filter):
         '''Get a list of repository ids where name matches a filter
 
@@ -458,6 +603,21 @@ class DnfDaemonBase:
             result = json.loads(result)
         return result
 
+    def GetAttributes(self, pkg_ids, attrs):
+        '''Get package attributes for a list of packages in one call
+
+        Args:
+            pkg_ids: list of pkg_ids to get attributes from
+            attrs: list of attribute names to get
+
+        Returns:
+            dict with a list of attribute values (same order as attrs)
+            for each pkg_id, None if the package is not found
+        '''
+        result = self._run_dbus_async('GetAttributes', '(asas)',
+                                      pkg_ids, attrs)
+        return json.loads(result)
+
     def GetPackagesByName(self, name, attr=[], newest_only=True):
         '''Get a list of pkg ids for starts with name
 
@@ -507,6 +667,57 @@ class DnfDaemonBase:
         return json.loads(self._run_dbus_async('Search', '(asasasbbb)',
                           fields, keys, attrs, match_all, newest_only, tags))
 
+    def SearchPage(self, fields, keys, attrs, match_all, newest_only, tags,
+                   offset=0, limit=100):
+        '''Search for packages where keys is matched in fields, and get
+        a page of the result
+
+        Args:
+            fields: yum po attributes to search in
+            keys: keys to search for
+            attrs: list of extra package attributes to get
+            match_all: match all keys or only one
+            newest_only: return only the newest version of packages
+            tags: search pkgtags
+            offset: index of the first package in the page
+            limit: max. number of packages in the page (0 = all)
+
+        Returns:
+            dict with 'packages', 'total' and 'cursor', like GetPackagesPage
+        '''
+        result = self._run_dbus_async(
+            'SearchPage', '(asasasbbbii)', fields, keys, attrs, match_all,
+            newest_only, tags, offset, limit)
+        return json.loads(result)
+
+    def GetPackagesNative(self, pkg_filter, fields=[]):
+        '''Get a list of packages for a given package filter
+
+        Same as GetPackages, but the packages are returned as D-Bus typed
+        values, not as JSON.
+
+        Args:
+            pkg_filter: package filter ('installed','available',
+                               'updates','obsoletes','recent','extras')
+            fields: yum package objects attributes to get.
+
+        Returns:
+            list of dicts with the pkg_id as 'id' and the fields, fields
+            with no value are left out
+        '''
+        return self._run_dbus_async(
+            'GetPackagesNative', '(sas)', pkg_filter, fields)
+
+    def SearchNative(self, fields, keys, attrs, match_all, newest_only, tags):
+        '''Search for packages where keys is matched in fields
+
+        Same as Search, but the packages are returned like
+        GetPackagesNative.
+        '''
+        return self._run_dbus_async(
+            'SearchNative', '(asasasbbb)', fields, keys, attrs, match_all,
+            newest_only, tags)
+
     def Exit(self):
         '''End the daemon'''
         self._run_dbus_async('Exit')
@@ -554,6 +765,8 @@ class Client(DnfDaemonBase):
             self.on_TransactionEvent(*args)
         elif signal == "RPMProgress":
             self.on_RPMProgress(*args)
+        elif signal == "RPMProgressBatch":
+            self.on_RPMProgressBatch(*args)
         elif signal == "GPGImport":
             self.on_GPGImport(*args)
         elif signal == "DownloadStart":
@@ -562,6 +775,8 @@ class Client(DnfDaemonBase):
             self.on_DownloadEnd(*args)
         elif signal == "DownloadProgress":
             self.on_DownloadProgress(*args)
+        elif signal == "DownloadProgressBatch":
+            self.on_DownloadProgressBatch(*args)
         elif signal == "RepoMetaDataProgress":
             self.on_RepoMetaDataProgress(*args)
         elif signal == "ErrorMessage":
@@ -722,6 +937,72 @@ class Client(DnfDaemonBase):
         value = self._run_dbus_async('GetHistoryPackages', '(i)', tid)
         return json.loads(value)
 
+    def GetTransactionNative(self):
+        '''Get the current transaction, as D-Bus typed values
+
+        Returns:
+            (rc, [(action, [(pkg_id, size, [obs_id,...]),...]),...])
+        '''
+        return self._run_dbus_async('GetTransactionNative')
+
+    def BuildTransactionNative(self):
+        '''Depsolve the current transaction, as D-Bus typed values
+
+        Returns:
+            (rc, transaction, error messages), the transaction is the same
+            as in GetTransactionNative
+        '''
+        return self._run_dbus_async('BuildTransactionNative')
+
+    def GetHistoryByDaysNative(self, start_days, end_days):
+        '''Same as GetHistoryByDays, as D-Bus typed values
+
+        Returns:
+            list of (transaction id, date-time) pairs
+        '''
+        return self._run_dbus_async(
+            'GetHistoryByDaysNative', '(ii)', start_days, end_days)
+
+    def HistorySearchNative(self, pattern):
+        '''Same as HistorySearch, as D-Bus typed values
+
+        Returns:
+            list of (tid,isodates)
+        '''
+        return self._run_dbus_async('HistorySearchNative', '(as)', pattern)
+
+    def GetHistoryPackagesNative(self, tid):
+        '''Same as GetHistoryPackages, as D-Bus typed values
+
+        Returns:
+            list of (pkg_id, state, installed)
+        '''
+        return self._run_dbus_async('GetHistoryPackagesNative', '(i)', tid)
+
+    def StartProfiling(self, mode):
+        '''Start profiling the daemon, until StopProfiling is called
+
+        Args:
+            mode: 'cpu' (cProfile) or 'memory' (tracemalloc)
+
+        Returns:
+            False if the daemon is profiled already
+
+        Raises:
+            ProfilingError: if the mode is unknown
+        '''
+        return self._run_dbus_async('StartProfiling', '(s)', mode)
+
+    def StopProfiling(self):
+        '''Stop profiling, the profile is written to the profile directory
+        of the daemon
+
+        Returns:
+            dict with mode, path of the profile file and top, a list of the
+            hotspots, None if the daemon is not profiled
+        '''
+        return json.loads(self._run_dbus_async('StopProfiling'))
+
     def HistoryUndo(self, tid):
         """Undo a given dnf history transaction id
 
@@ -22,7 +22,7 @@ Common stuff for the dnfdaemon dbus services
 from datetime import datetime
 from dnf.exceptions import DownloadError, Error
 
-from gi.repository import GLib
+from gi.repository import Gio, GLib
 from . import backend
 
 import dbus
@@ -37,14 +37,27 @@ import dnf.comps
 import dnf.subject
 import dnf.transaction
 import dnf.yum
+import bisect
+import collections
+import concurrent.futures
+import cProfile
 import functools
 import hawkey
 import json
 import logging
+import marshal
 import operator
+import os
+import pickle
+import pstats
+import stat
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
 
-API_VERSION = 2  # API Version must be bumped at API changes
+API_VERSION = 3  # API Version must be bumped at API changes
 MAINLOOP = GLib.MainLoop()
 
 # Fake attributes, there is simulating real package attribute
@@ -54,19 +67,211 @@ FAKE_ATTR = ['downgrades', 'action', 'pkgtags',
 
 NONE = json.dumps(None)
 
+# Max. number of package lists kept for paging with GetPage
+MAX_PAGED_RESULTS = 8
+
+# Max. size in bytes of the JSON results kept in the result cache
+RESULT_CACHE_SIZE = 32 * 1024 * 1024
+
+# Default number of worker threads for the read-only methods
+MAX_WORKERS = 2
+
+# Multipliers of the size suffixes accepted by parse_size
+SIZE_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+# Time in seconds a PolicyKit authorization is cached for a sender
+AUTH_CACHE_TTL = 300
+
+# Upper bounds in seconds of the method latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+# Max. number of elements of a list or dict measured for the reply size,
+# the size of larger ones is estimated from a sample
+PAYLOAD_SAMPLE = 16
+
+# Seconds between writes of the method stats to the --stats-file
+STATS_INTERVAL = 60
+
+# Directory for the profiles written by StopProfiling
+PROFILE_DIR = '/var/lib/dnfdaemon/profiles'
+
+# Number of hotspots returned by StopProfiling
+PROFILE_TOP = 25
+
+# Number of frames stored for each memory allocation, when profiling memory
+PROFILE_FRAMES = 10
+
+# Max number of DownloadProgressBatch signals sent a second
+PROGRESS_RATE = 10
+
+
+def _to_dbus_value(value):
+    """Convert a package attribute value to a D-Bus typed value.
+
+    Used for the variants in the a{sv} package dicts of the native API.
+    None can't be sent as a variant, so None values in lists are
+    converted to '', dicts leave them out.
+    """
+    if isinstance(value, bool):
+        return dbus.Boolean(value)
+    elif isinstance(value, int):
+        return dbus.Int64(value)
+    elif isinstance(value, float):
+        return dbus.Double(value)
+    elif isinstance(value, str):
+        return dbus.String(value)
+    elif isinstance(value, dict):
+        return dbus.Dictionary(
+            {str(key): _to_dbus_value(val) for key, val in value.items()
+             if val is not None}, signature='sv')
+    elif isinstance(value, (list, tuple)):
+        if all(isinstance(val, str) for val in value):
+            return dbus.Array(value, signature='s')
+        return dbus.Array([_to_dbus_value(val) if val is not None else ''
+                           for val in value], signature='v')
+    elif value is None:
+        return None
+    return dbus.String(str(value))
+
 #------------------------------------------------------------ Callback handlers
 
 logger = logging.getLogger('dnfdaemon.common')
 
 
+def _payload_size(value):
+    """Get the approximate size in bytes of a D-Bus value.
+
+    Only PAYLOAD_SAMPLE elements of a list or dict is measured, evenly
+    spread, so a large package list is not walked a second time.
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    elif isinstance(value, dict):
+        return _sample_size(list(value.items()))
+    elif isinstance(value, (list, tuple)):
+        return _sample_size(value)
+    elif value is None:
+        return 0
+    return 8
+
+
+def _sample_size(values):
+    count = len(values)
+    if count <= PAYLOAD_SAMPLE:
+        return sum(_payload_size(val) for val in values)
+    step = count / PAYLOAD_SAMPLE
+    size = sum(_payload_size(values[int(num * step)])
+               for num in range(PAYLOAD_SAMPLE))
+    return size * count // PAYLOAD_SAMPLE
+
+
+class MethodStats:
+    """Call and error counters, latency histogram and reply sizes for
+    each D-Bus method.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed, size=0, error=False):
+        with self._lock:  # also called from the worker threads
+            entry = self._methods.get(name)
+            if entry is None:
+                entry = self._methods[name] = {
+                    'calls': 0, 'errors': 0, 'time': 0.0, 'max': 0.0,
+                    'bytes': 0, 'max_bytes': 0,
+                    'buckets': [0] * len(LATENCY_BUCKETS)}
+            entry['calls'] += 1
+            if error:
+                entry['errors'] += 1
+            entry['time'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+            entry['bytes'] += size
+            entry['max_bytes'] = max(entry['max_bytes'], size)
+            entry['buckets'][
+                bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def wrap_handlers(self, name, start, reply_handler, error_handler):
+        """Wrap the reply and error handlers of an async method, so the
+        call is recorded when the reply is sent.
+        """
+        def on_reply(*values):
+            self.record(name, time.perf_counter() - start,
+                        _payload_size(values))
+            return reply_handler(*values)
+
+        def on_error(err):
+            self.record(name, time.perf_counter() - start, error=True)
+            return error_handler(err)
+
+        return on_reply, on_error
+
+    @staticmethod
+    def _percentile(entry, pct):
+        """Get a latency percentile, as the upper bound of the histogram
+        bucket it is in.
+        """
+        rank = pct / 100.0 * entry['calls']
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, entry['max'])
+        return entry['max']
+
+    def stats(self):
+        methods = {}
+        with self._lock:
+            for name, entry in self._methods.items():
+                methods[name] = {
+                    'calls': entry['calls'], 'errors': entry['errors'],
+                    'time': entry['time'],
+                    'p50': self._percentile(entry, 50),
+                    'p90': self._percentile(entry, 90),
+                    'p99': self._percentile(entry, 99),
+                    'max': entry['max'],
+                    'bytes': entry['bytes'], 'max_bytes': entry['max_bytes'],
+                    # [upper bound (None = no bound), calls] for used buckets
+                    'histogram': [[bound if bound != float('inf') else None,
+                                   count] for bound, count in
+                                  zip(LATENCY_BUCKETS, entry['buckets'])
+                                  if count]}
+        return {'uptime': time.time() - self.started, 'methods': methods}
+
+
 def Logger(func):
     """
-    This decorator catch yum exceptions and send fatal signal to frontend
+    This decorator catch yum exceptions and send fatal signal to frontend,
+    and records the calls in the method stats of the daemon
     """
+    name = func.__name__
+
     def newFunc(*args, **kwargs):
-        logger.debug("%s started args: %s " % (func.__name__, repr(args[1:])))
-        rc = func(*args, **kwargs)
-        logger.debug("%s ended" % func.__name__)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s started args: %s " % (name, repr(args[1:])))
+        daemon = args[0] if args and isinstance(args[0],
+                                                DnfDaemonBase) else None
+        start = time.perf_counter()
+        is_async = daemon is not None and 'reply_handler' in kwargs
+        if is_async:  # the call ends when the reply is sent
+            kwargs['reply_handler'], kwargs['error_handler'] = \
+                daemon._stats.wrap_handlers(name, start,
+                                            kwargs['reply_handler'],
+                                            kwargs['error_handler'])
+        try:
+            rc = func(*args, **kwargs)
+        except Exception:
+            if daemon is not None:
+                daemon._stats.record(name, time.perf_counter() - start,
+                                     error=True)
+            raise
+        if daemon is not None and not is_async:
+            daemon._stats.record(name, time.perf_counter() - start,
+                                 _payload_size(rc))
+        logger.debug("%s ended", name)
         return rc
 
     newFunc.__name__ = func.__name__
@@ -84,8 +289,18 @@ class GPGError(Exception):
 
 
 class TransactionProgress(dnf.callback.TransactionProgress):
+    """RPM transaction callback handler.
+
+    The start and the end of each transaction element is sent right away,
+    and the byte progress in between is sent at most base.progress_rate
+    times a second. If base.rpm_progress_batch is set, the byte progress
+    events are sent together as RPMProgressBatch signals, with the
+    pending events sent right away at a start or an end of an element,
+    and if base.legacy_progress
+    is set, a RPMProgress signal is sent for every callback like before.
+    """
 
-    def __init__(self, base):
+    def __init__(self, base, clock=time.monotonic):
         self.actions = {dnf.callback.PKG_CLEANUP: 'cleanup',
                         dnf.callback.PKG_DOWNGRADE: 'downgrade',
                         dnf.callback.PKG_REMOVE: 'erase',
@@ -114,6 +329,27 @@ class TransactionProgress(dnf.callback.TransactionProgress):
         super(dnf.callback.TransactionProgress, self).__init__()
         self.base = base
         self.do_verify = False
+        self._clock = clock
+        self._legacy = base.legacy_progress
+        self._batch = base.rpm_progress_batch
+        rate = base.progress_rate
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._pkg_ids = {}  # package -> package id, for this transaction
+        self._element = None  # (pkg_id, action) of the current element
+        self._last_emit = None
+        self._events = []  # events for the next RPMProgressBatch
+        self._bytes_event = False  # last event is a byte progress event
+
+    def _get_pkg_id(self, package):
+        """Get the package id of a transaction element package."""
+        # package can be both str or dnf package object
+        if isinstance(package, str):
+            return package
+        pkg_id = self._pkg_ids.get(package)
+        if pkg_id is None:
+            pkg_id = self.base._get_id(package)
+            self._pkg_ids[package] = pkg_id
+        return pkg_id
 
     def progress(self, package, action, te_current, te_total, ts_current,
               ts_total):
@@ -127,16 +363,295 @@ class TransactionProgress(dnf.callback.TransactionProgress):
         @param ts_current: number of processes completed in whole transaction
         @param ts_total: total number of processes in the transaction.
         """
-        if package:
-            # package can be both str or dnf package object
-            if not isinstance(package, str):
-                pkg_id = self.base._get_id(package)
+        if not package:
+            return
+        pkg_id = self._get_pkg_id(package)
+        action = self.actions.get(action, action)
+        event = (pkg_id, action, te_current, te_total, ts_current, ts_total)
+        if self._legacy:
+            self.base.RPMProgress(*event)
+            return
+        element = (pkg_id, action)
+        # the start and the end of an element is always sent
+        is_bytes = element == self._element and te_current < te_total
+        self._element = element
+        now = self._clock()
+        due = self._last_emit is None or \
+            now - self._last_emit >= self._interval
+        if self._batch:
+            if self._bytes_event and self._events[-1][:2] == element:
+                self._events[-1] = event  # only the latest byte progress
+            else:
+                self._events.append(event)
+            self._bytes_event = is_bytes
+            if due or not is_bytes:
+                self.flush()
+        elif due or not is_bytes:
+            self._last_emit = now
+            self.base.RPMProgress(*event)
+
+    def flush(self):
+        """Send the pending events of a batch."""
+        if self._events:
+            self._last_emit = self._clock()
+            events, self._events = self._events, []
+            self._bytes_event = False
+            self.base.RPMProgressBatch(events)
+
+
+class ResultCache:
+    """LRU cache for JSON encoded results, limited by the total size of
+    the cached results. Used by the read methods in the worker threads.
+    """
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get a cached result, None if the key is not cached."""
+        with self._lock:
+            value = self._results.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._results.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Cache a result, and evict the least recently used results
+        until the cache is below the size limit.
+        """
+        if len(value) > self.max_size:  # never fits in the cache
+            return
+        with self._lock:
+            if key in self._results:
+                self.size -= len(self._results.pop(key))
+            self._results[key] = value
+            self.size += len(value)
+            while self.size > self.max_size:
+                _key, old = self._results.popitem(last=False)
+                self.size -= len(old)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._results), 'size': self.size,
+                    'max_size': self.max_size}
+
+
+def cached_result(func):
+    """Cache the JSON result of a DnfDaemonBase method in the result
+    cache, see DnfDaemonBase._get_result_key for the cache key.
+    """
+    @functools.wraps(func)
+    def newFunc(self, *args):
+        key = self._get_result_key(func.__name__, args)
+        value = self._result_cache.get(key)
+        if value is None:
+            value = func(self, *args)
+            self._result_cache.put(key, value)
+        return value
+    return newFunc
+
+
+class RpmdbWatcher:
+    """Watch the rpmdb and dnf history db directories for changes, like
+    packages installed with rpm or dnf outside the daemon.
+    """
+
+    EVENTS = (Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+              Gio.FileMonitorEvent.CREATED,
+              Gio.FileMonitorEvent.DELETED)
+
+    def __init__(self, paths, callback):
+        self._callback = callback
+        self._monitors = []
+        for path in paths:
+            gfile = Gio.File.new_for_path(path)
+            try:
+                monitor = gfile.monitor_directory(Gio.FileMonitorFlags.NONE,
+                                                  None)
+            except GLib.Error as err:
+                logger.debug('cannot watch %s : %s', path, err)
+                continue
+            monitor.connect('changed', self._on_changed)
+            self._monitors.append(monitor)
+
+    def _on_changed(self, monitor, gfile, other_file, event):
+        if event in self.EVENTS:
+            self._callback()
+
+    def cancel(self):
+        for monitor in self._monitors:
+            monitor.cancel()
+        self._monitors = []
+
+
+class AuthorizationCache:
+    """Cache of the actions a sender is authorized for.
+
+    An authorization expires after ttl seconds, and all authorizations of
+    a sender are removed when the sender leaves the bus.
+    """
+
+    def __init__(self, ttl=AUTH_CACHE_TTL, watch=None, clock=time.monotonic):
+        self.ttl = ttl
+        self._watch = watch  # called with a sender, returns a watch or None
+        self._clock = clock
+        self._senders = {}  # sender -> (watch, {action: expire time})
+
+    def is_authorized(self, sender, action):
+        entry = self._senders.get(sender)
+        if entry is None:
+            return False
+        actions = entry[1]
+        expires = actions.get(action)
+        if expires is None:
+            return False
+        if expires <= self._clock():
+            del actions[action]
+            if not actions:
+                self.remove(sender)
+            return False
+        return True
+
+    def add(self, sender, action):
+        if sender not in self._senders:
+            watch = self._watch(sender) if self._watch else None
+            self._senders[sender] = (watch, {})
+        self._senders[sender][1][action] = self._clock() + self.ttl
+
+    def remove(self, sender):
+        """Remove all authorizations of a sender."""
+        entry = self._senders.pop(sender, None)
+        if entry and entry[0]:
+            entry[0].cancel()
+
+    def clear(self):
+        for sender in list(self._senders):
+            self.remove(sender)
+
+    def __len__(self):
+        return len(self._senders)
+
+
+class Profiler:
+    """CPU (cProfile) or memory (tracemalloc) profiling of the daemon.
+
+    CPU profiling covers the main loop, and the read methods running in
+    worker threads, see run_job.
+    """
+
+    MODES = ('cpu', 'memory')
+
+    def __init__(self, mode, directory=PROFILE_DIR):
+        if mode not in self.MODES:
+            raise ValueError('unknown profiling mode : %s' % mode)
+        self.mode = mode
+        self.directory = directory
+        self._profile = None
+        self._job_profiles = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.mode == 'cpu':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            tracemalloc.start(PROFILE_FRAMES)
+
+    def run_job(self, func, *args):
+        """Run a method in a worker thread, profiled when profiling CPU."""
+        if self._profile is None:
+            return func(*args)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # the main loop profile covers all threads
+            return func(*args)
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._job_profiles.append(profile)
+
+    def stop(self, top=PROFILE_TOP):
+        """Stop profiling and write the profile to the profile directory.
+
+        :return: dict with mode, the path of the profile and the top
+                 hotspots
+        """
+        self._check_directory()
+        prefix = 'dnfdaemon-%s-%s-' % (
+            self.mode, datetime.now().strftime('%Y%m%d-%H%M%S'))
+        suffix = '.pstats' if self.mode == 'cpu' else '.snapshot'
+        # a new file, the name of the profile can't be guessed
+        fd, path = tempfile.mkstemp(suffix, prefix, self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            if self.mode == 'cpu':
+                hotspots = self._stop_cpu(f, top)
             else:
-                pkg_id = package
-            if action in self.actions:
-                action = self.actions[action]
-            self.base.RPMProgress(
-                pkg_id, action, te_current, te_total, ts_current, ts_total)
+                hotspots = self._stop_memory(f, top)
+        return {'mode': self.mode, 'path': path, 'top': hotspots}
+
+    def _check_directory(self):
+        """Create the profile directory, and check it is a directory only
+        accessible by the daemon user, not a symlink.
+        """
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        st = os.lstat(self.directory)
+        if not stat.S_ISDIR(st.st_mode):
+            raise NotADirectoryError('%s is not a directory' %
+                                     self.directory)
+        if st.st_uid != os.geteuid() or stat.S_IMODE(st.st_mode) != 0o700:
+            raise PermissionError('%s must be owned by uid %d with mode '
+                                  '0700' % (self.directory, os.geteuid()))
+
+    def _stop_cpu(self, f, top):
+        self._profile.disable()
+        with self._lock:
+            profiles = [self._profile] + self._job_profiles
+            self._profile = None
+            self._job_profiles = []
+        stats = pstats.Stats()
+        for profile in profiles:
+            try:
+                stats.add(profile)
+            except TypeError:  # nothing profiled
+                pass
+        marshal.dump(stats.stats, f)  # like Stats.dump_stats
+        # stats : (file, line, function) -> (primitive calls, calls,
+        #                                     own time, cumulative time, ..)
+        items = sorted(stats.stats.items(), key=lambda item: item[1][2],
+                       reverse=True)
+        return [{'function': pstats.func_std_string(func),
+                 'calls': value[1], 'tottime': value[2],
+                 'cumtime': value[3]} for func, value in items[:top]]
+
+    def _stop_memory(self, f, top):
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        snapshot = snapshot.filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),))
+        pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)  # like dump()
+        return [{'location': str(entry.traceback[0]), 'size': entry.size,
+                 'count': entry.count}
+                for entry in snapshot.statistics('lineno')[:top]]
 
 
 class DownloadCallback:
@@ -155,6 +670,13 @@ class DownloadCallback:
         # send a signal
         self.DownloadProgress(name, frac, total_frac, total_files)
 
+    def downloadProgressBatch(self, files, total_frac, bytes_per_sec, eta,
+                              total_files):
+        """ Progress for the files updated since the last batch """
+        # send a signal
+        self.DownloadProgressBatch(files, total_frac, bytes_per_sec, eta,
+                                   total_files)
+
     def downloadEnd(self, name, status, msg):
         """ Download of af single instace ended """
         if not status:
@@ -172,8 +694,17 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
 
     def __init__(self):
         self.logger = logging.getLogger('dnfdaemon.base')
-        self.authorized_sender_read = set()
-        self.authorized_sender_write = set()
+        self._auth_cache = AuthorizationCache(watch=self._watch_sender)
+        self._auth_pending = {}  # (sender, action) -> [(done, error), ...]
+        self._stats = MethodStats()
+        self._stats_file = None
+        self.profile_dir = PROFILE_DIR
+        self.config_file = None  # dnf config file, None = the default
+        self.progress_rate = PROGRESS_RATE
+        self.legacy_progress = False  # send a signal for every callback
+        self.rpm_progress_batch = False  # send RPMProgressBatch signals
+        self.cache_quota = 0  # max. bytes of the package cache, 0 = no quota
+        self._profiler = None
         self._lock = None
         self._base = None
         self._can_quit = True
@@ -184,10 +715,23 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         self._timeout_idle = 20
         # time to daemon is closed when locked and not working
         self._timeout_locked = 600
-        self._obsoletes_list = None     # Cache for obsoletes
         self._gpg_confirm = {}  # store confirmed gpg key import confirmations
         self._config_options = {}
         self._enabled_repos = []
+        self._paged_results = collections.OrderedDict()
+        self._paged_result_id = 0
+        self._result_cache = ResultCache()
+        self._rpmdb_watcher = None
+        self._installed_changed = False
+        self.max_workers = MAX_WORKERS
+        self._executor = None
+        self._paged_lock = threading.Lock()  # paged results of the workers
+        self._jobs = 0  # read methods queued or running in worker threads
+        self._waiting_jobs = collections.deque()  # read methods waiting
+        self._writers = collections.deque()  # methods waiting for the jobs
+        self._writing = False  # a method is running exclusively
+        self._lock_watch = None
+        self._read_leases = {}  # sender -> name owner watch
 
 
 
@@ -201,6 +745,11 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         """
         yumbase property so we can auto initialize it if not defined
         """
+        if threading.current_thread() is not threading.main_thread():
+            return self._base  # set up before the read method is submitted
+        if self._base and (self._installed_changed and self._can_quit and
+                           not self._jobs):
+            self._refresh_installed()
         if not self._base:
             self._get_base()
         return self._base
@@ -210,6 +759,7 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
 # RunTransaction -> run_transaction, etc
 #=========================================================================
 
+    @cached_result
     def search_with_attr(self, fields, keys, attrs, match_all, newest_only,
                           tags):
         """Search for for packages, where given fields contain given key words
@@ -225,24 +775,104 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         # FIXME: Add support for search in pkgtags, when supported in dnf
         showdups = not newest_only
         pkgs = self.base.search(fields, keys, match_all, showdups)
-        values = [self._get_po_list(po, attrs) for po in pkgs]
+        values = self._get_po_lists(pkgs, attrs)
         return json.dumps(values)
 
-    def expire_cache(self):
-        """Expire the dnf cache."""
+    def search_page(self, fields, keys, attrs, match_all, newest_only, tags,
+                    offset, limit):
+        """Search for packages, and return a page of the result.
+
+        Same as search_with_attr, but only the packages from offset and
+        limit packages forward is returned, together with a cursor to get
+        the next page with get_page.
+        """
+        showdups = not newest_only
+        pkgs = self.base.search(fields, keys, match_all, showdups)
+        result_id, result = self._add_paged_result(pkgs, attrs)
+        return self._get_page(result_id, result, offset, limit)
+
+    def get_packages_page(self, pkg_filter, attrs, offset, limit):
+        """Get packages based on a filter, and return a page of the result.
+
+        Same as get_packages, but only the packages from offset and limit
+        packages forward is returned, together with a cursor to get the
+        next page with get_page.
+        """
+        pkgs = []
+        if pkg_filter in ['installed', 'available', 'updates', 'obsoletes',
+                          'recent', 'extras', 'updates_all']:
+            pkgs = getattr(self.base.packages, pkg_filter)
+        result_id, result = self._add_paged_result(pkgs, attrs)
+        return self._get_page(result_id, result, offset, limit)
+
+    def get_page(self, cursor, limit):
+        """Get the next page of a paged package list.
+
+        :param cursor: cursor returned with the previous page
+        :param limit: max. number of packages in the page (0 = all)
+        :return: the page or None, if the cursor is not valid anymore,
+                 because the sack has been reloaded since.
+        """
         try:
-            self.base.expire_cache()
+            generation, result_id, offset = [int(value) for value
+                                             in cursor.split(':')]
+        except ValueError:
+            return None
+        with self._paged_lock:
+            result = self._paged_results.get(result_id)
+            if result is None:
+                return None
+            if generation != self.base.sack_generation:
+                del self._paged_results[result_id]
+                return None
+            self._paged_results.move_to_end(result_id)
+        return self._get_page(result_id, result, offset, limit)
+
+    def expire_cache(self, repo_ids=None):
+        """Expire the dnf cache.
+
+        :param repo_ids: ids of the repos to expire, default is all enabled
+        :return: (success, number of files removed, bytes freed)
+        """
+        self._paged_results.clear()
+        self._result_cache.clear()
+        count = size = 0
+        try:
+            count, size = self.base.expire_cache(repo_ids)
             self.base.reset(sack=True, repos=True)
             #FIXME: Workaround for dnf.Base.reset in hawkey 6.0.3
             # https://bugzilla.redhat.com/show_bug.cgi?id=1332067
             self.base.read_all_repos()
             self.base.repos.all().set_progress_bar(self.base.md_progress)
             self.base.setup_base()
-            return True
+            self._enforce_cache_quota()
+            return True, count, size
         except dnf.exceptions.RepoError as e:
             self.logger.error(str(e))
             self.ErrorMessage(str(e))
-            return False
+            return False, count, size
+
+    def expire_repo_cache(self, repo_ids):
+        """Expire the cache of some of the enabled repos.
+
+        :param repo_ids: ids of the repos to expire
+        :return: dict with success, files and bytes removed (JSON)
+        """
+        rc, count, size = self.expire_cache([str(repo_id)
+                                             for repo_id in repo_ids])
+        return json.dumps({'success': rc, 'files': count, 'bytes': size})
+
+    def get_cache_usage(self):
+        """Get the number of packages and the bytes used by each repo in
+        the package cache.
+
+        :return: dict with the usage of each repo, the total bytes and the
+                 quota (JSON)
+        """
+        repos = self.base.get_cache_usage()
+        total = sum(usage['bytes'] for usage in repos.values())
+        return json.dumps({'repos': repos, 'bytes': total,
+                           'quota': self.cache_quota})
 
     def get_groups(self):
         """Get available comps categories & groups"""
@@ -355,13 +985,9 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
                         value = list(value)
                     repo_conf[c] = value
 
-            enab = repo.enabled
-            if not enab:
-                r = self._enabled_repos
-                r.append(repo_id)
-                self.set_enabled_repos(r)
-
-            pkgs = self.base.sack.query().filterm(reponame__eq=repo_id)
+            # a disabled repo is not loaded in the shared sack, so the
+            # transaction of the lock owner is kept
+            pkgs = self.base.get_repo_packages(repo_id)
             sz = 0
             for pkg in pkgs:
                 sz += pkg._size
@@ -369,19 +995,18 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             repo_conf['size'] = sz
             repo_conf['packages'] = len(pkgs)
             value = json.dumps(repo_conf)
-            if not enab:
-                r = self._enabled_repos
-                r.remove(repo_id)
-                self.set_enabled_repos(r)
         return value
 
     def set_enabled_repos(self, repo_ids):
         """Enable a list of repos, disable the ones not in list"""
         self._enabled_repos = repo_ids
+        self._paged_results.clear()
+        self._result_cache.clear()
         self._reset_base()
         self._get_base(reset=True, load_sack=False)
         self._base.setup_base()  # load the sack with the current enabled repos
 
+    @cached_result
     def get_packages(self, pkg_filter, attrs):
         """Get packages and attribute values based on a filter.
 
@@ -392,10 +1017,20 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         if pkg_filter in ['installed', 'available', 'updates', 'obsoletes',
                           'recent', 'extras', 'updates_all']:
             pkgs = getattr(self.base.packages, pkg_filter)
-            value = [self._get_po_list(po, attrs) for po in pkgs]
+            value = self._get_po_lists(pkgs, attrs)
         return json.dumps(value)
 
+    def get_updates_summary(self):
+        """Get the number of available updates and the total download
+        size.
+
+        The updates are resolved once for the current sack, so this is
+        cheap to call again until the sack is reloaded.
+        """
+        return json.dumps(self.base.packages.updates_summary())
+
     @Logger
+    @cached_result
     def get_packages_ndsg(self, pkg_filter):
         """Get packages and attribute values based on a filter.
 
@@ -428,10 +1063,27 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             value = json.dumps(None)
         return value
 
+    def get_attributes(self, pkg_ids, attrs):
+        """Get attributes for a list of packages.
+
+        :param pkg_ids: list of yum package ids
+        :param attrs: list of attributes to get
+        :return: dict with a list of attribute values for each package id,
+                 None for packages not found
+        """
+        pkgs = [self._get_po(pkg_id) for pkg_id in pkg_ids]
+        found = [po for po in pkgs if po]
+        values = dict(zip(found, self._get_attr_values(found, attrs)))
+        result = {}
+        for pkg_id, po in zip(pkg_ids, pkgs):
+            result[pkg_id] = values[po] if po else None
+        return json.dumps(result)
+
+    @cached_result
     def get_packages_by_name_with_attr(self, name, attrs, newest_only):
         """get packages matching a name wildcard with given attributes."""
         pkgs = self._get_po_by_name(name, newest_only)
-        values = [self._get_po_list(po, attrs) for po in pkgs]
+        values = self._get_po_lists(pkgs, attrs)
         return json.dumps(values)
 
     def get_group_pkgs(self, grp_id, grp_flt, attrs):
@@ -456,7 +1108,7 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             pkgs = self.base.packages.filter_packages(best_pkgs)
         else:
             pass
-        value = [self._get_po_list(po, attrs) for po in pkgs]
+        value = self._get_po_lists(pkgs, attrs)
         return json.dumps(value)
 
     def group_install(self, cmds):
@@ -630,19 +1282,35 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         self.TransactionEvent('start-run', NONE)
         rc = 0
         msgs = []
+        config_stamp = self.base.get_config_stamp()
         to_dnl = self._get_packages_to_download()
+        if self.cache_quota:
+            # the cached packages are used again, don't evict them first
+            self.base.touch_packages([po.localPkg() for po in to_dnl
+                                      if not po._from_cmdline])
         try:
             if to_dnl:
                 data = [self._get_id(po) for po in to_dnl]
                 self.TransactionEvent('pkg-to-download', data)
                 self.TransactionEvent('download', NONE)
-                self.base.download_packages(to_dnl, self.base.progress)
-                self.TransactionEvent('signature-check', NONE)
-                self._check_gpg_signatures(to_dnl)
+                # check the signatures while the rest is downloaded
+                checker = backend.SignatureChecker(self.base)
+                self.base.progress.sig_checker = checker
+                try:
+                    self.base.download_packages(to_dnl, self.base.progress)
+                    self._enforce_cache_quota()
+                    self.TransactionEvent('signature-check', NONE)
+                    self._check_gpg_signatures(to_dnl, checker)
+                finally:
+                    self.base.progress.sig_checker = None
+                    checker.close()
             self.TransactionEvent('run-transaction', NONE)
             display = TransactionProgress(self)  # RPM Display callback
             self._can_quit = False
-            self.base.do_transaction(display=display)
+            try:
+                self.base.do_transaction(display=display)
+            finally:
+                display.flush()
         except DownloadError as e:
             rc = 4  # Download errors
             if isinstance(e.errmap, dict):
@@ -665,7 +1333,12 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             msgs = [str(e)]
             #print("DEBUG:", msgs)
         self._can_quit = True
-        self._reset_base()
+        self._result_cache.clear()
+        self._enforce_cache_quota()
+        # if only the installed packages has changed, keep the dnf.Base
+        if not (rc == 0 and self._base.get_config_stamp() == config_stamp
+                and self._base.reload_installed()):
+            self._reset_base()
         self.TransactionEvent('end-run', NONE)
         result = json.dumps((rc, msgs))
         return result
@@ -676,27 +1349,8 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         :param start: start days from today
         :param end: end days from today
         """
-        # FIXME: Base.history is not public api
-        # https://bugzilla.redhat.com/show_bug.cgi?id=1079526
-        result = []
-        now = datetime.now()
-        history = self.base.history.old(complete_transactions_only=False)
-        i = 0
-        result = []
-        while i < len(history):
-            ht = history[i]
-            i += 1
-            #print("DBG: ", ht, ht.end_timestamp)
-            if not ht.end_timestamp:
-                continue
-            tm = datetime.fromtimestamp(ht.end_timestamp)
-            delta = now - tm
-            if delta.days < start:  # before start days
-                continue
-            elif delta.days > end:  # after end days
-                break
-            result.append(ht)
-        value = json.dumps(self._get_id_time_list(result))
+        value = json.dumps(
+            self._get_id_time_list(self._get_history_by_days(start, end)))
         return value
 
     def history_search(self, pattern):
@@ -705,15 +1359,8 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         :param pattern: list of search patterns
         :type pattern: list
         """
-        # FIXME: Base.history is not public api
-        # https://bugzilla.redhat.com/show_bug.cgi?id=1079526
-        result = []
-        tids = self.base.history.search(pattern)
-        if len(tids) > 0:
-            result = self.base.history.old(tids)
-        else:
-            result = []
-        value = json.dumps(self._get_id_time_list(result))
+        value = json.dumps(
+            self._get_id_time_list(self._history_search(pattern)))
         return value
 
     def history_undo(self, tid):
@@ -749,27 +1396,51 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
 
     def get_history_transaction_pkgs(self, tid):
         """Get the package transactions for given transaction id."""
-        # FIXME: Base.history is not public api
-        # https://bugzilla.redhat.com/show_bug.cgi?id=1079526
-        result = []
-        tx = self.base.history.old([tid], complete_transactions_only=False)
-        result = []
-        for pkg in tx[0].packages():
-            pkg_id = self._get_id(pkg)
-            installed = pkg.action in dnf.transaction.FORWARD_ACTIONS + [dnf.transaction.PKG_REINSTALL]
-            action_name = pkg.action_name
-            if action_name == "Upgrade":
-                # HACK: rename action name due to recent change in DNF 3
-                action_name = "Update"
-            elem = (pkg_id, action_name, installed)
-            result.append(elem)
-        value = json.dumps(result)
+        value = json.dumps(self._get_history_transaction_pkgs(tid))
         return value
 
+    def get_result_cache_stats(self):
+        """Get hit/miss counters and size of the result cache (JSON)."""
+        return json.dumps(self._result_cache.stats())
+
+    def start_profiling(self, mode):
+        """Start CPU ('cpu') or memory ('memory') profiling.
+
+        :return: False if the daemon is profiled already
+        """
+        if self._profiler is not None:
+            return False
+        profiler = Profiler(mode, self.profile_dir)
+        profiler.start()
+        self._profiler = profiler
+        logger.info('PROFILING: %s profiling started' % mode)
+        return True
+
+    def stop_profiling(self):
+        """Stop profiling and write the profile to the profile dir.
+
+        :return: mode, path of the profile and top hotspots (JSON), None if
+                 the daemon is not profiled
+        """
+        if self._profiler is None:
+            return NONE
+        profiler, self._profiler = self._profiler, None
+        result = profiler.stop()
+        logger.info('PROFILING: %s profile written to %s' %
+                    (result['mode'], result['path']))
+        return json.dumps(result)
+
+    def get_stats(self):
+        """Get the call counters, latencies and reply sizes of the D-Bus
+        methods (JSON).
+        """
+        return json.dumps(self._stats.stats())
+
     def set_option(self, option, value):
         """Set an DNF config option to a given value."""
         value = json.loads(value)
         self.logger.debug("Setting Option %s = %s" % (option, value))
+        self._result_cache.clear()
         self._config_options[option] = value
         if hasattr(self.base.conf, option):
             setattr(self.base.conf, option, value)
@@ -783,13 +1454,98 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             return False
         pass
 
+#=========================================================================
+# The native D-Bus API (API version 3)
+# Same as the methods above, but the values are returned as D-Bus typed
+# structures, not as JSON strings.
+#=========================================================================
+
+    def get_packages_native(self, pkg_filter, attrs):
+        """Get packages and attribute values based on a filter.
+
+        :param pkg_filter: pkg pkg_filter string ('installed','updates' etc)
+        :param attrs: list of attributes to get.
+        :return: list of dicts with the pkg_id as 'id' and the attributes
+                 (aa{sv})
+        """
+        pkgs = []
+        if pkg_filter in ['installed', 'available', 'updates', 'obsoletes',
+                          'recent', 'extras', 'updates_all']:
+            pkgs = getattr(self.base.packages, pkg_filter)
+        return self._get_po_dicts(pkgs, attrs)
+
+    def search_native(self, fields, keys, attrs, match_all, newest_only,
+                      tags):
+        """Search for for packages, where given fields contain given key
+        words.
+
+        Same as search_with_attr, but the packages is returned like
+        get_packages_native.
+        """
+        showdups = not newest_only
+        pkgs = self.base.search(fields, keys, match_all, showdups)
+        return self._get_po_dicts(pkgs, attrs)
+
+    def get_transaction_native(self):
+        """Get the current transaction.
+
+        :return: (rc, [(action, [(pkg_id, size, [obs_id, ...]), ...]), ...])
+                 (ba(sa(sdas)))
+        """
+        trans = self._get_transaction_native(self._get_transaction())
+        return bool(trans), trans
+
+    def build_transaction_native(self):
+        """Resolve dependencies of current transaction.
+
+        :return: (rc, transaction, error msgs) (ba(sa(sdas))as)
+        """
+        self.TransactionEvent('start-build', NONE)
+        rc, output = self._build_transaction()
+        self.TransactionEvent('end-build', NONE)
+        if rc:
+            return True, self._get_transaction_native(output), []
+        return False, [], output
+
+    def get_history_by_days_native(self, start, end):
+        """Get the history transaction by a give date interval.
+
+        :return: list of (tid, isodate) pairs (a(is))
+        """
+        return self._get_id_time_list(self._get_history_by_days(start, end))
+
+    def history_search_native(self, pattern):
+        """Search in the history.
+
+        :return: list of (tid, isodate) pairs (a(is))
+        """
+        return self._get_id_time_list(self._history_search(pattern))
+
+    def get_history_transaction_pkgs_native(self, tid):
+        """Get the package transactions for given transaction id.
+
+        :return: list of (pkg_id, action, installed) (a(ssb))
+        """
+        return self._get_history_transaction_pkgs(tid)
+
 #=========================================================================
 # Helper methods
 #=========================================================================
-    def _check_gpg_signatures(self, pkgs):
-        ''' The the signatures of the downloaded packages '''
+    def _check_gpg_signatures(self, pkgs, checker=None):
+        ''' The the signatures of the downloaded packages
+
+        :param checker: SignatureChecker with the checks started while
+                        downloading
+        '''
         for po in pkgs:
-            result, errmsg = self.base._sig_check_pkg(po)
+            if checker:
+                result, errmsg = checker.result(po)
+                if result == 1:
+                    # the key can be imported for an earlier package, after
+                    # the check has started
+                    result, errmsg = self.base._sig_check_pkg(po)
+            else:
+                result, errmsg = self.base._sig_check_pkg(po)
             logger.debug('checking signature for : %s, %s', str(po), result)
             if result == 0:
                 # Verified ok, or verify not req'd
@@ -849,6 +1605,24 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         grp = self.base.comps.group_by_pattern(pattern)
         return grp
 
+    def _enforce_cache_quota(self):
+        """Evict the least recently used packages, if the package cache
+        uses more than the cache quota.
+
+        The packages of the current transaction are kept, it can be run
+        again after a failure.
+        """
+        if not self.cache_quota:
+            return
+        keep = set()
+        if self._base.transaction:
+            keep = {po.localPkg()
+                    for po in self._base.transaction.install_set}
+        try:
+            self.base.enforce_cache_quota(self.cache_quota, keep)
+        except OSError as e:
+            self.logger.error('cannot enforce the cache quota : %s', e)
+
     def _get_packages_to_download(self):
         """Get packages to download for the current dnf transaction."""
         return list(self.base.transaction.install_set)
@@ -920,12 +1694,6 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             output = e.value.split('. ')
         return rc, output
 
-    def _get_obsoletes(self):
-        """Cache a list of obsoletes."""
-        if not self._obsoletes_list:
-            self._obsoletes_list = list(self.base.packages.obsoletes)
-        return self._obsoletes_list
-
     def _get_update_info(self, po):
         """Get update info for a package."""
         if po:
@@ -968,6 +1736,104 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             po_list.append(value)
         return po_list
 
+    def _get_result_key(self, method, args):
+        """Get the result cache key for a method call.
+
+        The key contains everything the result depends on, so results from
+        an older sack or other repo and config settings is never used.
+        """
+        args = tuple(tuple(arg) if isinstance(arg, list) else arg
+                     for arg in args)
+        repos = tuple(sorted(repo.id for repo in
+                             self.base.repos.iter_enabled()))
+        options = json.dumps(self._config_options, sort_keys=True)
+        return (method, args, self.base.sack_generation, repos, options)
+
+    def _add_paged_result(self, pkgs, attrs):
+        """Store a package list for paging, return the result id and the
+        stored result.
+        """
+        result = (self.base.sack_generation, list(pkgs), attrs)
+        with self._paged_lock:  # shared by the read methods
+            self._paged_result_id += 1
+            result_id = self._paged_result_id
+            self._paged_results[result_id] = result
+            while len(self._paged_results) > MAX_PAGED_RESULTS:
+                self._paged_results.popitem(last=False)
+        return result_id, result
+
+    def _get_page(self, result_id, result, offset, limit):
+        """Get a page from a stored package list.
+
+        :return: dict with the packages in the page, the total number of
+                 packages and a cursor for the next page, '' if this is the
+                 last page (JSON)
+        """
+        generation, pkgs, attrs = result
+        offset = max(offset, 0)
+        if limit > 0:
+            end = min(offset + limit, len(pkgs))
+        else:
+            end = len(pkgs)
+        if end < len(pkgs):
+            cursor = '%d:%d:%d' % (generation, result_id, end)
+        else:
+            cursor = ''
+        value = {'packages': self._get_po_lists(pkgs[offset:end], attrs),
+                 'total': len(pkgs),
+                 'cursor': cursor}
+        return json.dumps(value)
+
+    def _get_po_lists(self, pkgs, attrs):
+        """Get a list of packages with given attributes.
+
+        Same as _get_po_list for every package in pkgs, but fake attributes
+        like action are calculated for the whole list in one go.
+        """
+        if not attrs:
+            return [self._get_id(po) for po in pkgs]
+        values = self._get_attr_values(pkgs, attrs)
+        return [[self._get_id(po)] + row for po, row in zip(pkgs, values)]
+
+    def _get_po_dicts(self, pkgs, attrs):
+        """Get a list of {'id': pkg_id, attr: value, ...} dicts with D-Bus
+        typed values, for the native API.
+
+        Attributes with a None value is left out.
+        """
+        values = self._get_attr_values(pkgs, attrs)
+        result = []
+        for po, row in zip(pkgs, values):
+            pkg_dict = dbus.Dictionary({'id': self._get_id(po)},
+                                       signature='sv')
+            for attr, value in zip(attrs, row):
+                if value is not None:
+                    pkg_dict[attr] = _to_dbus_value(value)
+            result.append(pkg_dict)
+        return result
+
+    def _get_transaction_native(self, trans):
+        """Convert a transaction from _get_transaction to D-Bus structs."""
+        return [(action, [(pkg_id, float(size), list(obsoletes))
+                          for pkg_id, size, obsoletes in pkgs])
+                for action, pkgs in trans]
+
+    def _get_attr_values(self, pkgs, attrs):
+        """Get a list of attribute values for each package in a list.
+
+        Fake attributes are calculated for all the packages in one go,
+        where it is possible.
+        """
+        columns = []
+        for attr in attrs:
+            if attr in FAKE_ATTR:  # is this a fake attr:
+                columns.append(self._get_fake_attributes_bulk(pkgs, attr))
+            else:
+                columns.append([getattr(po, attr, None) for po in pkgs])
+        if not columns:
+            return [[] for po in pkgs]
+        return [list(values) for values in zip(*columns)]
+
     def _get_id_time_list(self, hist_trans):
         """Get a list of (tid, isodate) pairs from a list of
         history transactions.
@@ -978,6 +1844,62 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             result.append((ht.tid, tm.isoformat()))
         return result
 
+    def _get_history_by_days(self, start, end):
+        """Get the history transactions in a given date interval."""
+        # FIXME: Base.history is not public api
+        # https://bugzilla.redhat.com/show_bug.cgi?id=1079526
+        result = []
+        now = datetime.now()
+        history = self.base.history.old(complete_transactions_only=False)
+        i = 0
+        result = []
+        while i < len(history):
+            ht = history[i]
+            i += 1
+            #print("DBG: ", ht, ht.end_timestamp)
+            if not ht.end_timestamp:
+                continue
+            tm = datetime.fromtimestamp(ht.end_timestamp)
+            delta = now - tm
+            if delta.days < start:  # before start days
+                continue
+            elif delta.days > end:  # after end days
+                break
+            result.append(ht)
+        return result
+
+    def _history_search(self, pattern):
+        """Get the history transactions matching a pattern."""
+        # FIXME: Base.history is not public api
+        # https://bugzilla.redhat.com/show_bug.cgi?id=1079526
+        result = []
+        tids = self.base.history.search(pattern)
+        if len(tids) > 0:
+            result = self.base.history.old(tids)
+        else:
+            result = []
+        return result
+
+    def _get_history_transaction_pkgs(self, tid):
+        """Get (pkg_id, action, installed) for the packages in a given
+        transaction id.
+        """
+        # FIXME: Base.history is not public api
+        # https://bugzilla.redhat.com/show_bug.cgi?id=1079526
+        result = []
+        tx = self.base.history.old([tid], complete_transactions_only=False)
+        result = []
+        for pkg in tx[0].packages():
+            pkg_id = self._get_id(pkg)
+            installed = pkg.action in dnf.transaction.FORWARD_ACTIONS + [dnf.transaction.PKG_REINSTALL]
+            action_name = pkg.action_name
+            if action_name == "Upgrade":
+                # HACK: rename action name due to recent change in DNF 3
+                action_name = "Update"
+            elem = (pkg_id, action_name, installed)
+            result.append(elem)
+        return result
+
     def _get_fake_attributes(self, po, attr):
         """Get pseudo attributes for a given package.
 
@@ -999,19 +1921,43 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         elif attr == 'requires':
             return self._get_requires(po)
 
-    def _get_requires(self, pkg):
-        """Get requirements and providers for a package. """
+    def _get_fake_attributes_bulk(self, pkgs, attr):
+        """Get pseudo attributes for a list of packages.
+
+        :param attr: Fake attribute
+        :type attr: string
+        :return: list of values, in the same order as pkgs
+        """
+        if attr == 'action':
+            return self.base.packages.actions.classify(pkgs)
+        elif attr == 'downgrades':
+            return self._get_downgrades_bulk(pkgs)
+        elif attr == 'requires':
+            providers = {}  # providers are shared between packages
+            return [self._get_requires(po, providers) for po in pkgs]
+        else:
+            return [self._get_fake_attributes(po, attr) for po in pkgs]
+
+    def _get_requires(self, pkg, providers=None):
+        """Get requirements and providers for a package.
+
+        :param providers: cache of provider ids by requirement, to share
+                          between calls.
+        """
         req_dict = {}
+        if providers is None:
+            providers = {}
         requires = pkg.requires
         q = self.base.sack.query()
         for req in requires:
             req_str = str(req)
             if 'solvable:' in req_str or 'rpmlib(' in req_str:
                 continue
-            providers = self.by_provides(self.base.sack, [req_str], q)
-            req_dict[req_str] = []
-            for prov in providers.latest().run():
-                req_dict[req_str].append(self._get_id(prov))
+            if req_str not in providers:
+                provs = self.by_provides(self.base.sack, [req_str], q)
+                providers[req_str] = [self._get_id(prov)
+                                      for prov in provs.latest().run()]
+            req_dict[req_str] = list(providers[req_str])
         return req_dict
 
     @staticmethod
@@ -1026,19 +1972,34 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
 
     def _get_downgrades(self, pkg):
         """Get available downgrades for a package"""
-        pkg_ids = []
+        return self._get_downgrades_bulk([pkg])[0]
+
+    def _get_downgrades_bulk(self, pkgs):
+        """Get available downgrades for a list of packages"""
+        if not pkgs:
+            return []
+        names = list(set(pkg.name for pkg in pkgs))
         q = self.base.sack.query()
-        inst = q.installed().filter(name=pkg.name, arch=pkg.arch).run()
-        if inst:
-            if pkg.evr_eq(inst[0]):  # if pkg is installed, return downgrades
-                avail = q.available().filter(name=pkg.name, arch=pkg.arch)
-                for apkg in avail:
-                    if pkg.evr_gt(apkg):
-                        pkg_ids.append(self._get_id(apkg))
-            elif pkg.evr_lt(inst[0]):  # if pkg < inst, return installed pkg
-                pkg_ids.append(self._get_id(inst[0]))
-        logger.debug('downgrades for %s : %s', str(pkg), str(pkg_ids))
-        return pkg_ids
+        installed = {}
+        for ipkg in q.installed().filter(name=names):
+            installed.setdefault((ipkg.name, ipkg.arch), ipkg)
+        available = {}
+        for apkg in q.available().filter(name=names):
+            available.setdefault((apkg.name, apkg.arch), []).append(apkg)
+        result = []
+        for pkg in pkgs:
+            pkg_ids = []
+            inst = installed.get((pkg.name, pkg.arch))
+            if inst:
+                if pkg.evr_eq(inst):  # if pkg is installed, return downgrades
+                    for apkg in available.get((pkg.name, pkg.arch), []):
+                        if pkg.evr_gt(apkg):
+                            pkg_ids.append(self._get_id(apkg))
+                elif pkg.evr_lt(inst):  # if pkg < inst, return installed pkg
+                    pkg_ids.append(self._get_id(inst))
+            logger.debug('downgrades for %s : %s', str(pkg), str(pkg_ids))
+            result.append(pkg_ids)
+        return result
 
     def _get_pkgtags(self, po):
         """Get tags from a given package."""
@@ -1058,33 +2019,11 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
 
     def _get_po(self, id):
         """Get the package from given package id."""
-        n, e, v, r, a, repo_id = id.split(',')
-        q = self.base.sack.query()
-        if repo_id.startswith('@'):  # installed package
-            f = q.installed()
-            f = f.filter(name=n, version=v, release=r, arch=a)
-            if len(f) > 0:
-                return f[0]
-            else:
-                return None
-        else:
-            f = q.available()
-            f = f.filter(name=n, version=v, release=r, arch=a)
-            if len(f) > 0:
-                return f[0]
-            else:
-                return None
+        return self.base.pkg_index.get(id)
 
     def _get_po_available(self, id):
-        """ """
-        n, e, v, r, a, repo_id = id.split(',')
-        q = self.base.sack.query()
-        f = q.available()
-        f = f.filter(name=n, version=v, release=r, arch=a)
-        if len(f) > 0:
-            return f[0]
-        else:
-            return None
+        """Get the available package from given package id."""
+        return self.base.pkg_index.get_available(id)
 
     def _get_id(self, pkg):
         """Get a package id from a given package."""
@@ -1105,33 +2044,13 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         :param po: package
         :return: action (remove, install, update, downgrade, obsolete)
         """
-        action = 'install'
-        n, a, e, v, r = po.pkgtup
-        q = self.base.sack.query()
-        if po.reponame.startswith('@'):
-            action = 'remove'
-        else:
-            upd = q.upgrades().filter(name=n, version=v, release=r, arch=a)
-            if upd:
-                action = 'update'
-            else:
-                obsoletes = self._get_obsoletes()
-                if po in obsoletes:
-                    action = 'obsolete'
-                else:
-                    # get installed packages with same name
-                    ipkgs = q.installed().filter(name=po.name).run()
-                    if ipkgs:
-                        ipkg = ipkgs[0]
-                        if ipkg.evr_gt(po):  # inst po > po => downgrade
-                            action = 'downgrade'
-        return action
+        return self.base.packages.actions.get(po)
 
     def _get_base(self, reset=False, load_sack=True):
         """Get a cached dnf.Base object."""
         if not self._base or reset:
             logger.debug('setup DnfBase')
-            self._base = backend.DnfBase(self)
+            self._base = backend.DnfBase(self, self.config_file)
             for option in self._config_options:
                 value = self._config_options[option]
                 setattr(self._base.conf, option, value)
@@ -1147,14 +2066,218 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
                         pass
             if load_sack:
                 self._base.setup_base()
+            if not self._rpmdb_watcher:
+                self._rpmdb_watcher = RpmdbWatcher(
+                    self._base.get_rpmdb_paths(), self._on_rpmdb_changed)
         return self._base
 
+    def _on_rpmdb_changed(self):
+        """Called by the rpmdb watcher, the installed packages is reloaded
+        on the next call needing them.
+        """
+        self._installed_changed = True
+
+    def _refresh_installed(self):
+        """Reload the installed packages, if the rpmdb has been changed
+        outside the daemon since the sack was loaded.
+
+        Reloading the sack resets the goal, so it is postponed while a
+        transaction is pending, until it is run or cleared. The cursors of
+        the paged results is invalidated by the new sack generation, so
+        GetPage tells the client the list has been reloaded.
+        """
+        if self._base.goal_pending():
+            return
+        self._installed_changed = False
+        if self._base.rpmdb_changed():
+            logger.debug('rpmdb changed, reloading installed packages')
+            self._result_cache.clear()
+            if not self._base.reload_installed():
+                self._reset_base()
+
     def _reset_base(self):
-        """Close the current dnf.Base object."""
+        """Close the current dnf.Base object, when no read method is
+        running in a worker thread.
+        """
+        self._exclusive(self._close_base)
+
+    def _close_base(self):
         if self._base:
             self._base.close()
             self._base = None
 
+    def set_lock(self, sender):
+        """Give the exclusive dnfdaemon lock to a sender."""
+        self._lock = sender
+        self._lock_watch = self._watch_sender(sender)
+        logger.info('LOCK: Locked by : %s' % sender)
+
+    def release_lock(self):
+        """Release the dnfdaemon lock and close the dnf.Base object."""
+        logger.info('UNLOCK: Lock Release by %s' % self._lock)
+        if self._lock_watch:
+            self._lock_watch.cancel()
+            self._lock_watch = None
+        self._lock = None
+        self._reset_base()
+
+    def add_read_lease(self, sender):
+        """Give a shared read lease to a sender.
+
+        Any number of senders can have a read lease, also while another
+        sender has the dnfdaemon lock.
+        """
+        if sender not in self._read_leases:
+            self._read_leases[sender] = self._watch_sender(sender)
+            logger.info('LEASE: Read lease to : %s' % sender)
+        return True
+
+    def remove_read_lease(self, sender):
+        """Release the read lease of a sender."""
+        if sender not in self._read_leases:
+            return False
+        watch = self._read_leases.pop(sender)
+        if watch:
+            watch.cancel()
+        logger.info('LEASE: Read lease released by : %s' % sender)
+        return True
+
+    def has_read_lease(self, sender):
+        return sender in self._read_leases
+
+    def _watch_sender(self, sender):
+        """Watch for the sender leaving the bus, so the lock and read
+        lease of the sender is released right away.
+        """
+        try:
+            connection = self.connection
+        except AttributeError:  # not on a bus
+            return None
+        return connection.watch_name_owner(
+            sender, functools.partial(self._on_name_owner_changed, sender))
+
+    def _on_name_owner_changed(self, sender, owner):
+        if owner:  # the sender is still on the bus
+            return
+        logger.debug('%s has left the bus' % sender)
+        self._auth_cache.remove(sender)
+        self.remove_read_lease(sender)
+        if self._lock == sender:
+            self.release_lock()
+
+    def run_in_worker(self, reply_handler, error_handler, func, *args):
+        """Run a read-only method in a worker thread.
+
+        Read methods share the sack, so they run at the same time, but a
+        read method is queued while a method changing the sack is waiting
+        for the running ones (see run_exclusive). The reply, or the error,
+        is sent from the main loop, when the method is done.
+        """
+        self._watchdog_count = 0
+        if self._writers:
+            self._waiting_jobs.append((reply_handler, error_handler, func,
+                                       args))
+        else:
+            self._submit_job(reply_handler, error_handler, func, args)
+
+    def _submit_job(self, reply_handler, error_handler, func, args):
+        try:
+            self.base  # the dnf.Base is only set up in the main loop
+        except Exception as err:
+            logger.debug('%s failed : %s', func.__name__, err)
+            error_handler(err)
+            return
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='dnfdaemon-worker')
+        self._jobs += 1
+        self._executor.submit(self._run_job, reply_handler, error_handler,
+                              func, args)
+
+    def _run_job(self, reply_handler, error_handler, func, args):
+        try:
+            profiler = self._profiler
+            if profiler is not None:
+                value = profiler.run_job(func, *args)
+            else:
+                value = func(*args)
+        except Exception as err:
+            logger.debug('%s failed : %s', func.__name__, err)
+            GLib.idle_add(self._job_done, error_handler, err)
+        else:
+            GLib.idle_add(self._job_done, reply_handler, value)
+
+    def _job_done(self, handler, value):
+        self._jobs -= 1
+        self._watchdog_count = 0
+        handler(value)
+        if not self._jobs:
+            self._run_writers()
+        return False  # don't call again
+
+    def run_exclusive(self, reply_handler, error_handler, func, *args):
+        """Run a method changing the sack or the transaction in the main
+        loop, when no read method is running in a worker thread.
+
+        The main loop never waits for the workers, the method is queued
+        and run when the last running read method is done. The reply, or
+        the error, is sent when the method is done.
+        """
+        self._watchdog_count = 0
+        self._exclusive(self._run_writer, reply_handler, error_handler,
+                        func, args)
+
+    def _run_writer(self, reply_handler, error_handler, func, args):
+        self._is_working = True
+        try:
+            value = func(*args)
+        except Exception as err:
+            logger.debug('%s failed : %s', func.__name__, err)
+            error_handler(err)
+        else:
+            # like the value returned by a sync D-Bus method
+            if value is None:  # no out args
+                reply_handler()
+            elif isinstance(value, tuple):  # more than one out arg
+                reply_handler(*value)
+            else:
+                reply_handler(value)
+        finally:
+            self._is_working = False
+
+    def _exclusive(self, func, *args):
+        """Call func now, if no read method is running in a worker thread,
+        else when the running read methods are done.
+        """
+        if self._writing:  # called by a method running exclusively
+            func(*args)
+        elif self._jobs or self._writers:
+            self._writers.append((func, args))
+        else:
+            self._writing = True
+            try:
+                func(*args)
+            finally:
+                self._writing = False
+
+    def _run_writers(self):
+        """Run the methods queued by _exclusive, then submit the read
+        methods queued behind them.
+        """
+        self._writing = True
+        try:
+            while self._writers:
+                func, args = self._writers.popleft()
+                try:
+                    func(*args)
+                except Exception:
+                    logger.exception('%s failed', func.__name__)
+        finally:
+            self._writing = False
+        while self._waiting_jobs and not self._writers:
+            self._submit_job(*self._waiting_jobs.popleft())
+
     def _setup_watchdog(self):
         """Setup the DBUS service watchdog to run every second when idle."""
         GLib.timeout_add(1000, self._watchdog)
@@ -1162,7 +2285,8 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
     def _watchdog(self):
         """Handle the DBUS service watchdog calls."""
         terminate = False
-        if self._watchdog_disabled or self._is_working:  # is working
+        if (self._watchdog_disabled or self._is_working or self._jobs or
+                self._writers or self._auth_pending):
             return True
         if not self._lock:  # is locked
             if self._watchdog_count > self._timeout_idle:
@@ -1179,7 +2303,27 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
             self.logger.debug("Watchdog : %i" % self._watchdog_count)
             return True
 
+    def _setup_stats_file(self, path):
+        """Write the method stats to a file every STATS_INTERVAL seconds
+        and when the daemon quits.
+        """
+        self._stats_file = path
+        GLib.timeout_add_seconds(STATS_INTERVAL, self._write_stats)
+
+    def _write_stats(self):
+        tmp_path = self._stats_file + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(self.get_stats())
+            os.replace(tmp_path, self._stats_file)
+        except OSError as err:
+            logger.warning('cannot write stats to %s : %s',
+                           self._stats_file, err)
+        return True  # call again
+
     def mainloop_quit(self):
+        if self._stats_file:
+            self._write_stats()
         MAINLOOP.quit()
 
     def mainloop_run(self):
@@ -1202,6 +2346,21 @@ class DnfDaemonBase(dbus.service.Object, DownloadCallback):
         pass
 
 
+def parse_size(value):
+    """Parse a size in bytes, with an optional k, M, G or T suffix."""
+    number = value.strip()
+    unit = SIZE_UNITS.get(number[-1:].lower(), 1)
+    if unit > 1:
+        number = number[:-1]
+    try:
+        size = int(float(number) * unit)
+    except (ValueError, OverflowError):
+        size = -1
+    if size < 0:
+        raise ValueError('invalid size : %s' % value)
+    return size
+
+
 def doTextLoggerSetup(logroot='dnfdaemon', logfmt='%(asctime)s: %(message)s',
                       loglvl=logging.INFO):
     """Setup Python logging."""
@@ -18,7 +18,8 @@
 """
 dnf base and callbacks for dnfdaemon dbus services
 """
-from time import time
+from array import array
+from time import monotonic, time
 from dnf.i18n import _, ucd
 from dnf.yum import misc
 
@@ -26,32 +27,507 @@ import dnf
 import dnf.const
 import dnf.conf
 import dnf.exceptions
+import dnf.goal
 import dnf.callback
 import dnf.comps
 import dnf.rpm
+import dnf.sack
 import dnf.subject
 import dnf.transaction
 import dnf.yum
 import hawkey
+import concurrent.futures
+import hashlib
 import itertools
+import json
 import logging
+import multiprocessing
 import sys
 import re
 import os
+import string
+import threading
 import libdnf.transaction
+import rpm
 
 logger = logging.getLogger('dnfdaemon.base.dnf')
 
 UPDINFO_MAIN = ['id', 'title', 'type', 'description']
 
+# Number of worker processes checking signatures while downloading
+SIG_CHECK_WORKERS = os.cpu_count() or 1
+
+# File in the cachedir with the packages with a verified signature
+SIG_CACHE_FILE = 'dnfdaemon-sigcache.json'
+
+# File in the cachedir with the last use of the cached packages
+CACHE_LRU_FILE = 'dnfdaemon-lru.json'
+
+# <repoid>-<16 hex digits> directories and <repoid>[-<type>].solv[x] files
+CACHE_REPO_DIR = re.compile(r'^(?P<repoid>.+)-[0-9a-fA-F]{16}$')
+CACHE_SOLV_FILE = re.compile(r'^(?P<repoid>.+?)(-(filenames|presto|updateinfo|'
+                             r'other|group|modules))?\.solvx?$')
+
+_sack_generations = itertools.count(1)
+
+
+def next_sack_generation():
+    """Get a new sack generation number, unique in the daemon process."""
+    return next(_sack_generations)
+
+
+def sig_check_file(root, path, hasgpgkey, ts=None):
+    """Verify the GPG signature of a package file.
+
+    Only the file and the rpmdb is used, so it can run in a worker.
+
+    :param root: installroot with the rpmdb keyring
+    :param path: path of the package file
+    :param hasgpgkey: the repo of the package has GPG keys
+    :param ts: read-only rpm transaction set to use, default is a new one
+    :return: (result, error_string) like DnfBase._sig_check_pkg
+    """
+    if ts is None:
+        ts = dnf.rpm.transaction.initReadOnlyTransaction(root)
+    sigresult = dnf.rpm.miscutils.checkSig(ts, path)
+    localfn = os.path.basename(path)
+    del ts
+    if sigresult == 0:
+        result = 0
+        msg = ''
+
+    elif sigresult == 1:
+        if hasgpgkey:
+            result = 1
+        else:
+            result = 2
+        msg = _('Public key for %s is not installed') % localfn
+
+    elif sigresult == 2:
+        result = 2
+        msg = _('Problem opening package %s') % localfn
+
+    elif sigresult == 3:
+        if hasgpgkey:
+            result = 1
+        else:
+            result = 2
+        result = 1
+        msg = _('Public key for %s is not trusted') % localfn
+
+    elif sigresult == 4:
+        result = 2
+        msg = _('Package %s is not signed') % localfn
+    return result, msg
+
+
+_worker_ts = None  # read-only rpm transaction set of a verifier process
+
+
+def _init_sig_worker(root):
+    global _worker_ts
+    _worker_ts = dnf.rpm.transaction.initReadOnlyTransaction(root)
+
+
+def _sig_check_worker(path, hasgpgkey):
+    return sig_check_file(None, path, hasgpgkey, ts=_worker_ts)
+
+
+class SignatureVerifier:
+    """Verify the GPG signatures of package files in a pool of worker
+    processes, each with its own read-only rpm transaction set.
+
+    The keyring of a transaction set is read when it is created, so a key
+    imported later is not seen by the workers.
+    """
+
+    def __init__(self, root, max_workers=None):
+        # spawn, the daemon has threads and bus connections not to fork
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers or SIG_CHECK_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_sig_worker, initargs=(root,))
+
+    def submit(self, path, hasgpgkey):
+        """Start the check of a package file.
+
+        :return: future with the (result, error_string) of the check
+        """
+        return self._executor.submit(_sig_check_worker, path, hasgpgkey)
+
+    def close(self):
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=True)
+
+
+def _scan_files(path, relpath):
+    """Yield (relative path, DirEntry) of the files in a directory tree."""
+    try:
+        with os.scandir(path) as entries:
+            entries = list(entries)
+    except OSError:
+        return
+    for entry in entries:
+        name = os.path.join(relpath, entry.name)
+        if entry.is_dir(follow_symlinks=False):
+            yield from _scan_files(entry.path, name)
+        else:
+            yield name, entry
+
+
+def get_cache_pattern(types):
+    """Get one compiled pattern for the dnf cache files of some types."""
+    # the named groups is not unique, when the patterns are combined
+    patterns = [re.sub(r'\(\?P<\w+>', '(?:', dnf.repo.CACHE_FILES[t])
+                for t in types]
+    return re.compile('|'.join('(?:%s)' % p for p in patterns))
+
+
+def clean_cache(cachedir, pattern, repo_ids=None):
+    """Remove the files matching a pattern from the dnf cachedir.
+
+    Only the top level directories and solv files of the given repos is
+    scanned, not the whole cachedir.
+
+    :param pattern: compiled pattern for the path relative to cachedir
+    :param repo_ids: ids of the repos to clean, default is all
+    :return: (number of files removed, bytes freed)
+    """
+    count = size = 0
+    try:
+        with os.scandir(cachedir) as entries:
+            entries = list(entries)
+    except OSError:
+        return count, size
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            match = CACHE_REPO_DIR.match(entry.name)
+            if repo_ids is not None and \
+                    not (match and match.group('repoid') in repo_ids):
+                continue
+            files = _scan_files(entry.path, entry.name)
+        else:
+            match = CACHE_SOLV_FILE.match(entry.name)
+            if repo_ids is not None and \
+                    not (match and match.group('repoid') in repo_ids):
+                continue
+            files = [(entry.name, entry)]
+        for name, file_entry in files:
+            if not pattern.match(name):
+                continue
+            try:
+                file_size = file_entry.stat(follow_symlinks=False).st_size
+                os.unlink(file_entry.path)
+            except FileNotFoundError:
+                continue
+            logger.debug(_('Removing file %s'), file_entry.path)
+            count += 1
+            size += file_size
+    return count, size
+
+
+def _scan_packages(cachedir):
+    """Yield (repo_id, DirEntry) of the rpms in the package cache."""
+    try:
+        with os.scandir(cachedir) as entries:
+            repo_dirs = [entry for entry in entries
+                         if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return
+    for repo_dir in repo_dirs:
+        match = CACHE_REPO_DIR.match(repo_dir.name)
+        if not match:
+            continue
+        try:
+            with os.scandir(os.path.join(repo_dir.path, 'packages')) as pkgs:
+                for entry in pkgs:
+                    if entry.name.endswith('.rpm') and entry.is_file():
+                        yield match.group('repoid'), entry
+        except OSError:
+            continue
+
+
+def get_cache_usage(cachedir):
+    """Get the number of rpms and the bytes used by each repo in the
+    package cache.
+
+    :return: dict with repo_id -> {'packages': count, 'bytes': size}
+    """
+    usage = {}
+    for repo_id, entry in _scan_packages(cachedir):
+        repo_usage = usage.setdefault(repo_id, {'packages': 0, 'bytes': 0})
+        repo_usage['packages'] += 1
+        repo_usage['bytes'] += entry.stat().st_size
+    return usage
+
+
+def _load_lru(cachedir):
+    """Get the last use of the cached packages, path -> time."""
+    try:
+        with open(os.path.join(cachedir, CACHE_LRU_FILE)) as f:
+            used = json.load(f)
+        if isinstance(used, dict):
+            return used
+    except (OSError, ValueError) as err:
+        logger.debug('package cache lru not loaded : %s', err)
+    return {}
+
+
+def _save_lru(cachedir, used):
+    path = os.path.join(cachedir, CACHE_LRU_FILE)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(used, f)
+        os.replace(tmp_path, path)
+    except OSError as err:
+        logger.debug('package cache lru not saved : %s', err)
+
+
+def touch_packages(cachedir, paths):
+    """Mark packages in the cache as used now, for the LRU eviction.
+
+    The time is kept in the CACHE_LRU_FILE, the atime is not updated on
+    noatime and relatime mounts, and the mtime is part of the
+    SignatureCache stamp.
+    """
+    used = _load_lru(cachedir)
+    now = time()
+    for path in paths:
+        used[path] = now
+    _save_lru(cachedir, used)
+
+
+def enforce_cache_quota(cachedir, quota, keep=()):
+    """Remove the least recently used rpms from the package cache, until
+    it uses no more than quota bytes.
+
+    A package never used by a transaction is used when it is downloaded,
+    the mtime.
+
+    :param quota: max. bytes used by the package cache
+    :param keep: paths of the rpms not to remove, like the packages of a
+                 pending transaction
+    :return: (number of files removed, bytes freed)
+    """
+    used = _load_lru(cachedir)
+    pkgs = []
+    total = 0
+    for repo_id, entry in _scan_packages(cachedir):
+        st = entry.stat()
+        pkgs.append((used.get(entry.path, st.st_mtime), st.st_size,
+                     entry.path))
+        total += st.st_size
+    count = size = 0
+    left = {path for last_used, pkg_size, path in pkgs}
+    for last_used, pkg_size, path in sorted(pkgs):
+        if total <= quota:
+            break
+        if path in keep:
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        logger.debug('Evicting package %s', path)
+        left.discard(path)
+        total -= pkg_size
+        count += 1
+        size += pkg_size
+    if count:
+        logger.info('%d packages evicted, %d bytes freed, %d bytes used',
+                    count, size, total)
+    # forget the packages not in the cache anymore
+    if not used.keys() <= left:
+        _save_lru(cachedir, {path: last_used
+                             for path, last_used in used.items()
+                             if path in left})
+    return count, size
+
+
+class SignatureCache:
+    """Persistent cache of the package files with a verified signature.
+
+    A file is only verified if the size, the mtime and the header digest
+    of the file, and the gpg-pubkey packages in the rpmdb (the keyring),
+    is the same as when it was verified.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, root):
+        self.path = path
+        self.root = root
+        self._entries = None  # file -> [size, mtime_ns, digest, keyring]
+        self._keyring = None
+        self._ts = None
+        self._changed = False
+
+    def _load(self):
+        self._entries = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self._entries = data['packages']
+        except (OSError, ValueError, KeyError, AttributeError) as err:
+            logger.debug('signature cache not loaded : %s', err)
+
+    def _get_keyring(self):
+        if self._keyring is None:
+            self._keyring = self._read_keyring()
+        return self._keyring
+
+    def _read_keyring(self):
+        """Get a digest of the gpg keys imported in the rpmdb."""
+        ts = dnf.rpm.transaction.initReadOnlyTransaction(self.root)
+        keys = sorted('%s-%s' % (hdr['version'], hdr['release'])
+                      for hdr in ts.dbMatch('name', 'gpg-pubkey'))
+        del ts
+        return hashlib.sha256(' '.join(keys).encode()).hexdigest()
+
+    def _header_digest(self, fn):
+        """Get the header digest of a package file, without checking it."""
+        if self._ts is None:
+            self._ts = rpm.TransactionSet(self.root)
+            self._ts.setVSFlags(rpm._RPMVSF_NOSIGNATURES |
+                                rpm._RPMVSF_NODIGESTS)
+        fd = os.open(fn, os.O_RDONLY)
+        try:
+            hdr = self._ts.hdrFromFdno(fd)
+        finally:
+            os.close(fd)
+        sha256 = getattr(rpm, 'RPMTAG_SHA256HEADER', None)
+        digest = hdr[sha256] if sha256 else None
+        return digest or hdr[rpm.RPMTAG_SHA1HEADER]
+
+    def get_stamp(self, fn):
+        """Get the stamp of a package file, None if it can't be read."""
+        try:
+            st = os.stat(fn)
+            return [st.st_size, st.st_mtime_ns, self._header_digest(fn),
+                    self._get_keyring()]
+        except (OSError, rpm.error) as err:
+            logger.debug('no signature cache stamp for %s : %s', fn, err)
+            return None
+
+    def is_verified(self, fn, stamp):
+        """Check if a package file is verified, with a given stamp."""
+        if self._entries is None:
+            self._load()
+        return stamp is not None and self._entries.get(fn) == stamp
+
+    def add(self, fn, stamp):
+        """Add a package file with a verified signature."""
+        if stamp is None:
+            return
+        if self._entries is None:
+            self._load()
+        self._entries[fn] = stamp
+        self._changed = True
+
+    def reset_keyring(self):
+        """Read the keyring again on the next check, the keys can be
+        imported or removed outside the daemon.
+        """
+        self._keyring = None
+
+    def invalidate(self):
+        """Forget all the verified files, like when a key is imported."""
+        self._entries = {}
+        self._keyring = None
+        self._changed = True
+
+    def save(self):
+        """Write the cache, without the files removed from the cache."""
+        if not self._changed:
+            return
+        packages = {fn: stamp for fn, stamp in self._entries.items()
+                    if os.path.exists(fn)}
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'packages': packages}, f)
+            os.replace(tmp_path, self.path)
+            self._changed = False
+        except OSError as err:
+            logger.debug('signature cache not saved : %s', err)
+
+
+class SignatureChecker:
+    """Check the signatures of the downloaded packages in worker processes,
+    while the rest of the packages is downloaded.
+
+    The packages are submitted by Progress.end, and the results are
+    collected by _check_gpg_signatures after the download.
+    """
+
+    def __init__(self, base, verifier=None):
+        self._base = base
+        self._verifier = verifier
+        self._futures = {}  # package -> future with (result, msg)
+        self._stamps = {}  # package -> signature cache stamp
+        base.sig_cache.reset_keyring()
+
+    def submit(self, po):
+        """Start the signature check of a downloaded package."""
+        if po in self._futures:
+            return
+        # the package and the repo is only used here, in the main thread
+        check, hasgpgkey = self._base._sig_check_needed(po)
+        if check:
+            path = po.localPkg()
+            stamp = self._base.sig_cache.get_stamp(path)
+            if self._base.sig_cache.is_verified(path, stamp):
+                self._futures[po] = None
+                return
+            if self._verifier is None:
+                # started on the first package, while the rest downloads
+                self._verifier = SignatureVerifier(
+                    self._base.conf.installroot)
+            self._futures[po] = self._verifier.submit(path, hasgpgkey)
+            self._stamps[po] = stamp
+
+    def result(self, po):
+        """Get the (result, msg) of the signature check of a package.
+
+        Packages not submitted, like the ones rebuilt from delta rpms, are
+        checked right away.
+        """
+        if po not in self._futures:
+            return self._base._sig_check_pkg(po)
+        future = self._futures.pop(po)
+        if future is None:  # verified before
+            return 0, ''
+        result, msg = future.result()
+        if result == 0:
+            self._base.sig_cache.add(po.localPkg(), self._stamps.pop(po))
+        return result, msg
+
+    def close(self):
+        """Cancel the pending checks and stop the verifier."""
+        for future in self._futures.values():
+            if future is not None:
+                future.cancel()
+        self._futures = {}
+        self._stamps = {}
+        self._base.sig_cache.save()
+        if self._verifier is not None:
+            self._verifier.close()
+            self._verifier = None
+
 
 class DnfBase(dnf.Base):
     """An extended version of the dnf.Base class."""
 
-    def __init__(self, parent):
+    def __init__(self, parent, config_file=None):
         super(DnfBase, self).__init__()
         self.parent = parent
         self.md_progress = MDProgress(parent)
+        if config_file:
+            # read it before the plugins, so they can be disabled by it
+            self.conf.config_file_path = config_file
+            self.conf.read()
 
         try:
             self.init_plugins()
@@ -71,44 +547,35 @@ class DnfBase(dnf.Base):
         self.progress = Progress(parent)
         self.repos.all().set_progress_bar(self.md_progress)
         self._packages = None
-
-    def _tree(self, dirpath):
-        """Traverse dirpath recursively and yield relative filenames."""
-        for root, dirs, files in os.walk(dirpath):
-            base = os.path.relpath(root, dirpath)
-            for f in files:
-                path = os.path.join(base, f)
-                yield os.path.normpath(path)
-
-    def _filter(self, files, patterns):
-        """Yield those filenames that match any of the patterns."""
-        return (f for f in files for p in patterns if re.match(p, f))
-
-    def _clean(self, dirpath, files):
-        """Remove the given filenames from dirpath."""
-        count = 0
-        for f in files:
-            path = os.path.join(dirpath, f)
-            logger.debug(_('Removing file %s'), path)
-            misc.unlink_f(path)
-            count += 1
-        return count
-
-    def _removeCacheFiles(self):
-        ''' Remove solv and xml files '''
-        cachedir = self.conf.cachedir
-
+        self._pkg_index = None
+        self._search_index = None
+        self._index_lock = threading.Lock()  # read methods build the index
+        self._rpmdb_stamp = None
+        self._sig_cache = None
+        self.sack_generation = 0
+
+    def _removeCacheFiles(self, repo_ids=None):
+        """Remove the metadata, packages and solv files of the repos.
+
+        :param repo_ids: ids of the repos to clean, default is all files
+        :return: (number of files removed, bytes freed)
+        """
         types = ['metadata', 'packages', 'dbcache']
-        files = list(self._tree(cachedir))
         logger.debug(_('Cleaning data: ' + ' '.join(types)))
+        count, size = clean_cache(self.conf.cachedir,
+                                  get_cache_pattern(types), repo_ids)
+        logger.info('%d file removed, %d bytes freed', count, size)
+        return count, size
 
-        patterns = [dnf.repo.CACHE_FILES[t] for t in types]
-        count = self._clean(cachedir, self._filter(files, patterns))
-        logger.info('%d file removed', count)
+    def expire_cache(self, repo_ids=None):
+        """Make the current cache expire
 
-    def expire_cache(self):
-        """Make the current cache expire"""
+        :param repo_ids: ids of the repos to expire, default is all enabled
+        :return: (number of files removed, bytes freed)
+        """
         for repo in self.repos.iter_enabled():
+            if repo_ids is not None and repo.id not in repo_ids:
+                continue
             # see https://bugzilla.redhat.com/show_bug.cgi?id=1629378
             try:
                 # works up to dnf 3.4 (3.4 took it away)
@@ -118,19 +585,167 @@ class DnfBase(dnf.Base):
                 # works from libdnf 0.18.0 (I think)
                 repo._repo.expire()
                 logger.debug('repo expire (no md)')
-        self._removeCacheFiles()
+        return self._removeCacheFiles(repo_ids)
+
+    def get_repo_packages(self, repo_id):
+        """Get a query of the packages in a repo.
+
+        A disabled repo is loaded in a sack of its own, so the sack and the
+        goal of the base is not changed.
+        """
+        repo = self.repos[repo_id]
+        if repo.enabled:
+            sack = self.sack
+        else:
+            sack = self._load_repo_sack(repo)
+        return sack.query().filterm(reponame__eq=repo_id)
+
+    def _load_repo_sack(self, repo):
+        """Load the metadata of a repo in a new sack."""
+        repo.load()
+        sack = dnf.sack._build_sack(self)
+        sack.load_repo(repo._repo, build_cache=False)
+        return sack
+
+    def get_cache_usage(self):
+        """Get the package cache usage of each repo."""
+        return get_cache_usage(self.conf.cachedir)
+
+    def enforce_cache_quota(self, quota, keep=()):
+        """Evict the least recently used packages from the package cache,
+        until it uses no more than quota bytes.
+
+        :param quota: max. bytes used by the package cache
+        :param keep: paths of the packages not to evict
+        :return: (number of files removed, bytes freed)
+        """
+        return enforce_cache_quota(self.conf.cachedir, quota, keep)
+
+    def touch_packages(self, paths):
+        """Mark packages in the package cache as used now."""
+        touch_packages(self.conf.cachedir, paths)
 
     def setup_base(self):
         """Setup dnf Sack and init packages helper"""
         logger.debug('setup DnfBase sack')
+        self._rpmdb_stamp = self.get_rpmdb_stamp()
         self.fill_sack()
+        self._setup_packages()
+
+    def reload_installed(self):
+        """Reload the sack after the installed packages has changed.
+
+        hawkey can't replace the @System repo in a loaded sack, so a new
+        sack is built, with the enabled repos loaded from the solv files
+        written to the metadata cache, when the repos was loaded. The repo
+        metadata is not parsed again, and never downloaded.
+
+        :return: False if the repos is not in the metadata cache, then the
+                 dnf.Base must be reset
+        """
+        logger.debug('reload installed packages')
+        self._rpmdb_stamp = self.get_rpmdb_stamp()
+        if self._sig_cache is not None:
+            self._sig_cache.reset_keyring()
+        try:
+            self.fill_sack_from_repos_in_cache(load_system_repo=True)
+        except (AttributeError, dnf.exceptions.RepoError) as err:
+            logger.debug('cannot load repos from cache (%s)', err)
+            return False
+        self._setup_packages()
+        return True
+
+    def _setup_packages(self):
         logger.debug('setup packages')
         self._packages = Packages(self)
+        logger.debug('setup package index')
+        self._pkg_index = PackageIndex(self.sack)
+        self._search_index = None  # built on the first search
+        self.sack_generation = next_sack_generation()
 
     @property
     def packages(self):
         return self._packages
 
+    def get_rpmdb_paths(self):
+        """Get the directories with the rpmdb and the dnf history db."""
+        dbpath = rpm.expandMacro('%_dbpath')
+        return [os.path.join(self.conf.installroot, dbpath.lstrip('/')),
+                self.conf.persistdir]
+
+    def get_rpmdb_stamp(self):
+        """Get the modification times of the rpmdb and dnf history db
+        files, to detect changes in the installed packages.
+        """
+        rpmdb_dir, persistdir = self.get_rpmdb_paths()
+        stamp = []
+        for path in [rpmdb_dir, persistdir]:
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if path == persistdir and \
+                                not entry.name.startswith('history'):
+                            continue
+                        if entry.is_file():
+                            stamp.append((entry.path,
+                                          entry.stat().st_mtime_ns))
+            except OSError:
+                continue
+        return sorted(stamp)
+
+    def get_config_stamp(self):
+        """Get the modification times of the dnf config, repo and vars
+        files and the releasever, to detect if a transaction has changed
+        the repo configuration (like a release package).
+        """
+        stamp = []
+        paths = [os.path.dirname(self.conf.config_file_path)]
+        paths += list(self.conf.reposdir) + list(self.conf.varsdir)
+        for path in paths:
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            stamp.append((entry.path,
+                                          entry.stat().st_mtime_ns))
+            except OSError:
+                continue
+        releasever = dnf.rpm.detect_releasever(self.conf.installroot)
+        return releasever, sorted(stamp)
+
+    def rpmdb_changed(self):
+        """Check if the rpmdb has changed since the sack was loaded."""
+        return self.get_rpmdb_stamp() != self._rpmdb_stamp
+
+    def goal_pending(self):
+        """Check if packages has been added to the goal, or a transaction
+        is resolved, and not run or cleared yet.
+        """
+        if self._goal is not None and self._goal.req_length():
+            return True
+        return bool(self.transaction)
+
+    @property
+    def sig_cache(self):
+        """The SignatureCache of the packages in the cachedir."""
+        if self._sig_cache is None:
+            self._sig_cache = SignatureCache(
+                os.path.join(self.conf.cachedir, SIG_CACHE_FILE),
+                self.conf.installroot)
+        return self._sig_cache
+
+    @property
+    def pkg_index(self):
+        return self._pkg_index
+
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            with self._index_lock:  # built once, by the first search
+                if self._search_index is None:
+                    self._search_index = SearchIndex(self.sack)
+        return self._search_index
+
     def search(self, fields, values, match_all=True, showdups=False):
         """Search in a list of package attributes for a list of keys.
 
@@ -144,7 +759,10 @@ class DnfBase(dnf.Base):
         for key in values:
             key_set = set()
             for attr in fields:
-                pkgs = set(self.contains(attr, key).run())
+                if attr in SearchIndex.FIELDS:
+                    pkgs = self.search_index.contains(attr, key)
+                else:
+                    pkgs = set(self.contains(attr, key).run())
                 key_set |= pkgs
             if len(matches) == 0:
                 matches = key_set
@@ -183,6 +801,21 @@ class DnfBase(dnf.Base):
                     might help.
               2 = Fatal GPG verification error, give up.
         """
+        check, hasgpgkey = self._sig_check_needed(po)
+        if check:
+            path = po.localPkg()
+            stamp = self.sig_cache.get_stamp(path)
+            if self.sig_cache.is_verified(path, stamp):
+                return 0, ''
+            result, msg = sig_check_file(self.conf.installroot, path,
+                                         hasgpgkey)
+            if result == 0:
+                self.sig_cache.add(path, stamp)
+            return result, msg
+        return 0, ''
+
+    def _sig_check_needed(self, po):
+        """Get (check, hasgpgkey) for the signature check of a package."""
         if po._from_cmdline:
             check = self.conf.localpkg_gpgcheck
             hasgpgkey = 0
@@ -190,45 +823,7 @@ class DnfBase(dnf.Base):
             repo = self.repos[po.repoid]
             check = repo.gpgcheck
             hasgpgkey = not not repo.gpgkey
-
-        if check:
-            root = self.conf.installroot
-            ts = dnf.rpm.transaction.initReadOnlyTransaction(root)
-            sigresult = dnf.rpm.miscutils.checkSig(ts, po.localPkg())
-            localfn = os.path.basename(po.localPkg())
-            del ts
-            if sigresult == 0:
-                result = 0
-                msg = ''
-
-            elif sigresult == 1:
-                if hasgpgkey:
-                    result = 1
-                else:
-                    result = 2
-                msg = _('Public key for %s is not installed') % localfn
-
-            elif sigresult == 2:
-                result = 2
-                msg = _('Problem opening package %s') % localfn
-
-            elif sigresult == 3:
-                if hasgpgkey:
-                    result = 1
-                else:
-                    result = 2
-                result = 1
-                msg = _('Public key for %s is not trusted') % localfn
-
-            elif sigresult == 4:
-                result = 2
-                msg = _('Package %s is not signed') % localfn
-
-        else:
-            result = 0
-            msg = ''
-
-        return result, msg
+        return check, hasgpgkey
 
     def _get_key_for_package(self, po, askcb=None, fullaskcb=None):
         """Retrieve a key for a package. If needed, use the given
@@ -300,6 +895,8 @@ class DnfBase(dnf.Base):
                     raise dnf.exceptions.Error(_prov_key_data(msg))
                 logger.info(_('Key imported successfully'))
                 key_installed = True
+                # the packages are verified against the old keyring
+                self.sig_cache.invalidate()
 
         if not key_installed and user_cb_fail:
             raise dnf.exceptions.Error(_("Didn't install any keys"))
@@ -328,6 +925,9 @@ class Packages:
         self._base = base
         self._sack = base.sack
         self._inst_na = self._sack.query().installed()._na_dict()
+        self._actions = None
+        self._updates = None
+        self._updates_lock = threading.Lock()
 
     def filter_packages(self, pkg_list, replace=True):
         """Filter a list of package objects and replace
@@ -350,6 +950,13 @@ class Packages:
         """Get the query from the current sack"""
         return self._sack.query()
 
+    @property
+    def actions(self):
+        """Get the package action classifier for the current sack."""
+        if self._actions is None:
+            self._actions = PackageActions(self)
+        return self._actions
+
     @property
     def installed(self):
         """Get installed packages."""
@@ -357,29 +964,50 @@ class Packages:
 
     @property
     def updates(self):
-        """Get available updates."""
-        pkgs = []
-        try:
-            # we have to do upgrade_all & resolve
-            # to make sure pkgs exclude by repo priority etc
-            # get handled.
-            self._base.upgrade_all()
-            self._base.resolve(allow_erasing=True)
-        except dnf.exceptions.DepsolveError as e:
-            logger.debug(str(e))
-            return pkgs
-        # return install/upgrade type pkgs from transaction
-        for tsi in self._base.transaction:
-            logger.debug(f" --> {tsi.action_name} : {tsi} action: {tsi.action} reason: {tsi.reason}")
-            if tsi.action == dnf.transaction.PKG_UPGRADE:
-                pkgs.append(tsi.pkg)
-            elif tsi.action == dnf.transaction.PKG_INSTALL:
-                # action is INSTALL, then it should be a installonlypkg
-                # skip dependencies (direct & real)
-                if tsi.reason == libdnf.transaction.TransactionItemReason_WEAK_DEPENDENCY or \
-                        tsi.reason == libdnf.transaction.TransactionItemReason_DEPENDENCY:
-                    continue
-                pkgs.append(tsi.pkg)
+        """Get available updates.
+
+        The updates are resolved once for the sack, on a goal of their
+        own, so the goal of the current transaction is left untouched.
+        """
+        if self._updates is None:
+            with self._updates_lock:
+                if self._updates is None:
+                    self._updates = self._resolve_updates()
+        return self._updates
+
+    def updates_summary(self):
+        """Get the number of available updates and the download size.
+
+        :return: dict with updates (number of updated packages), installs
+                 (number of new install only packages like kernels) and
+                 download_size (bytes)
+        """
+        pkgs = self.updates
+        installed = set(po.name for po in self.query.installed()
+                        .filter(name=[po.name for po in pkgs]))
+        updates = sum(1 for po in pkgs if po.name in installed)
+        return {'updates': updates,
+                'installs': len(pkgs) - updates,
+                'download_size': sum(po.downloadsize or 0 for po in pkgs)}
+
+    def _resolve_updates(self):
+        # upgrade all & resolve, to make sure pkgs excluded by repo
+        # priority etc. get handled.
+        conf = self._base.conf
+        goal = dnf.goal.Goal(self._sack)
+        goal.upgrade_all()
+        if not goal.run(allow_uninstall=True, force_best=conf.best,
+                        ignore_weak_deps=not conf.install_weak_deps):
+            logger.debug('cannot resolve the updates: %s',
+                         goal.problem_rules())
+            return []
+        pkgs = goal.list_upgrades()
+        for po in goal.list_installs():
+            # an install is a installonlypkg, skip the dependencies
+            if goal.get_reason(po) not in (
+                    libdnf.transaction.TransactionItemReason_DEPENDENCY,
+                    libdnf.transaction.TransactionItemReason_WEAK_DEPENDENCY):
+                pkgs.append(po)
         return pkgs
 
     @property
@@ -449,6 +1077,163 @@ class Packages:
         return recent
 
 
+class PackageActions:
+    """Classify packages by the action that can be performed on them.
+
+    The upgrades, obsoletes and installed packages are looked up once, so
+    a whole package list can be classified without any sack queries.
+    """
+
+    def __init__(self, packages):
+        query = packages.query
+        self._upgrades = set((po.name, po.version, po.release, po.arch)
+                             for po in query.upgrades())
+        self._obsoletes = set(packages.obsoletes)
+        self._installed = {}
+        for po in query.installed():
+            self._installed.setdefault(po.name, po)
+
+    def get(self, po):
+        """Get the action for a given package.
+
+        :return: action (remove, install, update, downgrade, obsolete)
+        """
+        if po.reponame.startswith('@'):
+            return 'remove'
+        n, a, e, v, r = po.pkgtup
+        if (n, v, r, a) in self._upgrades:
+            return 'update'
+        if po in self._obsoletes:
+            return 'obsolete'
+        ipkg = self._installed.get(po.name)
+        if ipkg and ipkg.evr_gt(po):  # inst po > po => downgrade
+            return 'downgrade'
+        return 'install'
+
+    def classify(self, pkgs):
+        """Get the actions for a list of packages."""
+        return [self.get(po) for po in pkgs]
+
+
+class PackageIndex:
+    """Package id to package object index for the current sack.
+
+    The index is built once, when the sack is loaded, so package ids can be
+    resolved without running a sack query for every lookup.
+    """
+
+    def __init__(self, sack):
+        self._installed = {}
+        self._available = {}
+        query = sack.query()
+        for pkg in query.installed():
+            self._installed.setdefault(self._key(pkg), pkg)
+        for pkg in query.available():
+            self._available.setdefault(self._key(pkg), []).append(pkg)
+
+    @staticmethod
+    def _key(pkg):
+        return (pkg.name, str(pkg.epoch), pkg.version, pkg.release, pkg.arch)
+
+    @staticmethod
+    def _split(pkg_id):
+        n, e, v, r, a, repo_id = pkg_id.split(',')
+        return (n, e, v, r, a), repo_id
+
+    def get(self, pkg_id):
+        """Get the package object for a given package id."""
+        key, repo_id = self._split(pkg_id)
+        if repo_id.startswith('@'):  # installed package
+            return self._installed.get(key)
+        return self._get_available(key, repo_id)
+
+    def get_available(self, pkg_id):
+        """Get the available package object for a given package id."""
+        key, repo_id = self._split(pkg_id)
+        return self._get_available(key, repo_id)
+
+    def _get_available(self, key, repo_id):
+        pkgs = self._available.get(key)
+        if not pkgs:
+            return None
+        # prefer the package from the repo in the id
+        for pkg in pkgs:
+            if pkg.reponame == repo_id:
+                return pkg
+        return pkgs[0]
+
+
+class SearchIndex:
+    """Trigram index for case insensitive substring search in package
+    names, summaries and descriptions.
+
+    The index for a field is built on the first search in the field.
+    A search uses the index to find the candidate packages, with all the
+    trigrams of the key, and checks the candidates for the key, so the
+    result is the same as a hawkey ICASE substr query.
+
+    The package numbers of a trigram are kept in an array('I'), 4 bytes
+    a package. The lowered names and summaries are kept for checking the
+    candidates, the descriptions are many times their size, so they are
+    read from the candidate packages.
+    """
+
+    FIELDS = ('name', 'summary', 'description')
+    TEXT_FIELDS = ('name', 'summary')
+
+    # hawkey ignores case for ASCII letters only
+    _LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+    def __init__(self, sack):
+        self._sack = sack
+        self._pkgs = sack.query().run()
+        self._texts = {}
+        self._trigrams = {}
+
+    @classmethod
+    def _lower(cls, text):
+        return text.translate(cls._LOWER)
+
+    def _build(self, field):
+        texts = [] if field in self.TEXT_FIELDS else None
+        trigrams = {}
+        for ndx, pkg in enumerate(self._pkgs):
+            text = self._lower(getattr(pkg, field) or '')
+            for tri in {text[i:i + 3] for i in range(len(text) - 2)}:
+                trigrams.setdefault(tri, array('I')).append(ndx)
+            if texts is not None:
+                texts.append(text)
+        if texts is not None:
+            self._texts[field] = texts
+        self._trigrams[field] = trigrams
+
+    def _text(self, field, ndx):
+        texts = self._texts.get(field)
+        if texts is not None:
+            return texts[ndx]
+        return self._lower(getattr(self._pkgs[ndx], field) or '')
+
+    def contains(self, field, key):
+        """Get the packages where a field contains a key, ignoring case.
+
+        :param field: package attribute, one of FIELDS
+        :param key: string to search for
+        :return: set of package objects
+        """
+        key = self._lower(key)
+        if len(key) < 3:  # too short for the index, use hawkey
+            query = self._sack.query().filter(
+                hawkey.ICASE, **{'%s__substr' % field: key})
+            return set(query.run())
+        if field not in self._trigrams:
+            self._build(field)
+        trigrams = self._trigrams[field]
+        postings = [trigrams.get(key[i:i + 3], ())
+                    for i in range(len(key) - 2)]
+        return {self._pkgs[ndx] for ndx in min(postings, key=len)
+                if key in self._text(field, ndx)}
+
+
 class MDProgress(dnf.callback.DownloadProgress):
     """Metadata Download callback handler."""
 
@@ -478,9 +1263,16 @@ class MDProgress(dnf.callback.DownloadProgress):
 
 
 class Progress(dnf.callback.DownloadProgress):
-    """Package Download callback handler"""
+    """Package Download callback handler
 
-    def __init__(self, parent):
+    The downloaded bytes are kept as a running total, and the progress is
+    sent as DownloadProgressBatch signals at most parent.progress_rate
+    times a second, with the files updated since the last signal.
+    If parent.legacy_progress is set, a DownloadProgress signal is sent
+    every time the total progress moves, like before.
+    """
+
+    def __init__(self, parent, clock=monotonic):
         super(Progress, self).__init__()
         self.parent = parent
         self.max_err = 1
@@ -492,14 +1284,29 @@ class Progress(dnf.callback.DownloadProgress):
         self._err_count = 0
         self.dnl = {}
         self.last_frac = 0
+        self._clock = clock
+        self._legacy = True
+        self._interval = 0.0
+        self._start_time = 0.0
+        self._last_emit = None
+        self._pending = {}  # file -> frac, updated since the last batch
+        self.sig_checker = None  # SignatureChecker for the downloads
 
     def start(self, total_files, total_size, total_drpms=0):
         self.total_files = total_files
         self.total_size = float(total_size)
         self.download_files = 0
         self.download_size = 0.0
+        self.dnl = {}
+        self.last_frac = 0
         self.max_err = int(total_files / 2) + 1
         logger.debug('setting max_err to : %d', self.max_err)
+        self._legacy = self.parent.legacy_progress
+        rate = self.parent.progress_rate
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._start_time = self._clock()
+        self._last_emit = None
+        self._pending = {}
         self.parent.downloadStart(total_files, total_size)
 
     def end(self, payload, status, msg):
@@ -509,6 +1316,15 @@ class Progress(dnf.callback.DownloadProgress):
                       dnf.callback.STATUS_ALREADY_EXISTS,
                       dnf.callback.STATUS_DRPM]:
             self.download_files += 1
+            pkg = getattr(payload, 'pkg', None)
+            if self.sig_checker and pkg and \
+                    status != dnf.callback.STATUS_DRPM:
+                self.sig_checker.submit(pkg)
+            if not self._legacy:
+                self._pending[str(payload)] = 1.0
+                # the last file is always sent, so the batch gets to 100%
+                self._emit_batch(
+                    force=self.download_files >= self.total_files)
         elif status == dnf.callback.STATUS_FAILED:
             pload = str(payload)
             if pload in self._dnl_errors:
@@ -529,27 +1345,50 @@ class Progress(dnf.callback.DownloadProgress):
     def progress(self, payload, done):
         pload = str(payload)
         cur_total_bytes = payload.download_size
-        if not pload in self.dnl:
-            self.dnl[pload] = 0.0
+        if cur_total_bytes:
+            frac = done / cur_total_bytes
         else:
-            self.dnl[pload] = done
-        total_frac = self.get_total()
-        if total_frac > self.last_frac:
-            self.last_frac = total_frac
-            if cur_total_bytes:
-                frac = done / cur_total_bytes
-            else:
-                frac = 0.0
-            self.parent.downloadProgress(
-                pload, frac, total_frac, self.download_files)
+            frac = 0.0
+        if pload not in self.dnl:
+            done = 0.0  # the bytes of the first callback is not counted
+        self.download_size += done - self.dnl.get(pload, 0.0)
+        self.dnl[pload] = done
+        if self._legacy:
+            total_frac = self.get_total()
+            if total_frac > self.last_frac:
+                self.last_frac = total_frac
+                self.parent.downloadProgress(
+                    pload, frac, total_frac, self.download_files)
+        else:
+            self._pending[pload] = frac
+            self._emit_batch()
+
+    def _emit_batch(self, force=False):
+        """Send the pending file progress, if the rate allows it."""
+        if not self._pending:
+            return
+        now = self._clock()
+        if not force and self._last_emit is not None and \
+                now - self._last_emit < self._interval:
+            return
+        self._last_emit = now
+        elapsed = now - self._start_time
+        bytes_per_sec = self.download_size / elapsed if elapsed > 0 else 0.0
+        if bytes_per_sec > 0:
+            eta = max(self.total_size - self.download_size, 0.0) / \
+                bytes_per_sec
+        else:
+            eta = -1.0
+        files, self._pending = self._pending, {}
+        self.parent.downloadProgressBatch(files, self.get_total(),
+                                          bytes_per_sec, eta,
+                                          self.download_files)
 
     def get_total(self):
         """Get the total downloaded percentage."""
-        tot = 0.0
-        for value in self.dnl.values():
-            tot += value
-        frac = tot / self.total_size
-        return frac
+        if not self.total_size:
+            return 0.0
+        return self.download_size / self.total_size
 
     def update(self):
         """Output the current progress."""
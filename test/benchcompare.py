@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark regression gate for the dnfdaemon backend hot paths.
+
+The hot paths are run against a synthetic repository, and the median,
+stddev and peak RSS growth of each path is stored for the current commit in
+a JSON baseline file. The results are compared with the results of an
+earlier commit, and a path is flagged as a regression if it is more than
+--threshold slower (or uses more memory) than in the baseline.
+The exit code is 1 if there is a regression.
+
+Use 'make bench-compare' or run it from the top of the source tree:
+
+    PYTHONPATH=python/ python3 -m test.benchcompare --save
+"""
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import test.synthrepo as synthrepo
+from test.benchmark import get_daemon, _run_forked
+
+BASELINE_FILE = '.bench-baseline.json'
+
+# RSS growth below this (KB) is not flagged, it is in the noise
+RSS_SLACK = 1024
+
+
+#-------------------------------------------------------------- Hot paths
+
+def path_get_po_list(daemon):
+    pkgs = daemon.base.packages.available
+    attrs = ['summary', 'size', 'group']
+    return lambda: [daemon._get_po_list(po, attrs) for po in pkgs]
+
+
+def path_get_id(daemon):
+    pkgs = list(daemon.base.sack.query())
+    return lambda: [daemon._get_id(po) for po in pkgs]
+
+
+def path_filter_packages(daemon):
+    packages = daemon.base.packages
+    pkgs = packages.available
+    return lambda: packages.filter_packages(pkgs)
+
+
+def path_search(daemon):
+    base = daemon.base
+    return lambda: base.search(['name', 'summary', 'description'],
+                               ['python', 'synth0012'], False, True)
+
+
+HOT_PATHS = [('_get_po_list', path_get_po_list), ('_get_id', path_get_id),
+             ('filter_packages', path_filter_packages),
+             ('search', path_search)]
+
+
+def _time_runs(func, runs):
+    func()  # warm up caches like the search index
+    times = []
+    for num in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_paths(daemon, runs, names=None):
+    """Run the hot paths, each in a forked process to get its peak RSS.
+
+    :return: dict with median, stddev, runs and peak_rss_kb for each path
+    """
+    results = {}
+    for name, setup in HOT_PATHS:
+        if names and name not in names:
+            continue
+        func = setup(daemon)
+        times, rss = _run_forked(_time_runs, func, runs)
+        results[name] = {
+            'median': statistics.median(times),
+            'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'runs': len(times),
+            'peak_rss_kb': rss,
+        }
+        print('%-20s median %9.4f s  stddev %8.4f s  peak RSS %8d KB' %
+              (name, results[name]['median'], results[name]['stddev'], rss))
+    return results
+
+
+#-------------------------------------------------------------- Baselines
+
+def _git(*args):
+    try:
+        return subprocess.check_output(('git',) + args,
+                                       universal_newlines=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def current_commit():
+    """Get the current commit, with a -dirty suffix for local changes."""
+    commit = _git('rev-parse', 'HEAD') or 'unknown'
+    if _git('status', '--porcelain', '--untracked-files=no'):
+        commit += '-dirty'
+    return commit
+
+
+def load_baselines(fn):
+    if not os.path.exists(fn):
+        return []
+    with open(fn) as f:
+        return json.load(f)
+
+
+def save_baselines(fn, baselines):
+    tmp_fn = fn + '.tmp'
+    with open(tmp_fn, 'w') as f:
+        json.dump(baselines, f, indent=2)
+    os.replace(tmp_fn, fn)
+
+
+def find_baseline(baselines, commit, packages, ref=None):
+    """Find the baseline to compare with.
+
+    :param ref: commit (or ref) of the baseline, default is the latest
+                baseline of another commit
+    """
+    if ref:
+        ref = _git('rev-parse', ref) or ref
+    for entry in reversed(baselines):
+        if entry['packages'] != packages:
+            continue
+        if ref:
+            if entry['commit'] == ref:
+                return entry
+        elif entry['commit'] != commit:
+            return entry
+    return None
+
+
+def compare(results, baseline, threshold):
+    """Compare results with a baseline.
+
+    :return: list of regression messages
+    """
+    regressions = []
+    for name, value in sorted(results.items()):
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = value['median'] / base['median'] if base['median'] else 1.0
+        status = 'ok'
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append('%s is %.2fx slower (%.4f s -> %.4f s)' %
+                               (name, ratio, base['median'],
+                                value['median']))
+        rss, base_rss = value['peak_rss_kb'], base['peak_rss_kb']
+        if rss > base_rss * (1 + threshold) and rss - base_rss > RSS_SLACK:
+            status = 'REGRESSION'
+            regressions.append('%s peak RSS grew %d KB -> %d KB' %
+                               (name, base_rss, rss))
+        print('%-20s %6.2fx  %s' % (name, ratio, status))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='dnfdaemon benchmark regression gate')
+    parser.add_argument('--packages', type=int, default=20000,
+                        help='number of packages in the synthetic repo')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='number of timed runs for each hot path')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='flag a regression if more than this much '
+                             'slower than the baseline (0.25 = 25%%)')
+    parser.add_argument('--baseline-file', default=BASELINE_FILE,
+                        help='JSON file with the stored baselines')
+    parser.add_argument('--baseline', metavar='COMMIT',
+                        help='commit to compare with (default: the latest '
+                             'baseline of another commit)')
+    parser.add_argument('--path', action='append',
+                        choices=[name for name, setup in HOT_PATHS],
+                        help='hot path to run (default: all)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the baseline of the '
+                             'current commit')
+    args = parser.parse_args()
+    path = tempfile.mkdtemp(prefix='dnfdaemon-bench-')
+    try:
+        synthrepo.generate(path, args.packages)
+        daemon = get_daemon(path)
+        results = run_paths(daemon, args.runs, args.path)
+    finally:
+        shutil.rmtree(path)
+    commit = current_commit()
+    baselines = load_baselines(args.baseline_file)
+    baseline = find_baseline(baselines, commit, args.packages, args.baseline)
+    regressions = []
+    if baseline is None:
+        print('no baseline to compare with')
+    else:
+        print('compared with %s (%s)' % (baseline['commit'],
+                                         baseline['time']))
+        regressions = compare(results, baseline, args.threshold)
+    if args.save:
+        baselines = [entry for entry in baselines
+                     if not (entry['commit'] == commit and
+                             entry['packages'] == args.packages)]
+        baselines.append({'commit': commit,
+                          'time': datetime.datetime.now().isoformat(),
+                          'packages': args.packages, 'results': results})
+        save_baselines(args.baseline_file, baselines)
+    for msg in regressions:
+        print('regression: %s' % msg, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the dnfdaemon backend hot paths.
+
+The benchmarks runs against a synthetic repository, use 'make run-bench'
+or run them from the top of the source tree:
+
+    PYTHONPATH=python/ python3 -m test.benchmark --packages 50000
+
+Use --json to write the results to a file, so runs can be compared, and
+--bench to run some of the benchmarks only.
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import dbus
+import dbus.lowlevel
+import dnf.callback
+import dnfdaemon.server
+import test.synthrepo as synthrepo
+from dnfdaemon.server.backend import SearchIndex
+from test.test_common import DnfBaseMock
+
+
+def timeit(func, *args, repeat=3):
+    """Run func repeat times and return the best time in seconds."""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+# (name, calls, seconds) of the reported benchmarks
+RESULTS = []
+
+
+def report(name, count, elapsed):
+    RESULTS.append((name, count, elapsed))
+    print('%-30s %8d calls %10.4f s %12.0f calls/s' %
+          (name, count, elapsed, count / elapsed if elapsed else 0))
+
+
+def uncached(daemon, func, *args):
+    """Run a daemon method with an empty result cache."""
+    daemon._result_cache.clear()
+    return func(*args)
+
+
+def get_daemon(path):
+    daemon = dnfdaemon.server.DnfDaemonBase()
+    daemon._base = DnfBaseMock(daemon, repo=synthrepo.REPO_ID,
+                               repo_path=path,
+                               comps_path=synthrepo.comps_path(path))
+    daemon._base.setup_base()
+    daemon._base.read_mock_comps(seed_persistor=False)
+    return daemon
+
+
+#-------------------------------------------------------------- Benchmarks
+
+def _get_po_query(daemon, pkg_id):
+    """The sack query based package id lookup, used before the index."""
+    n, e, v, r, a, repo_id = pkg_id.split(',')
+    q = daemon.base.sack.query()
+    if repo_id.startswith('@'):
+        f = q.installed()
+    else:
+        f = q.available()
+    f = f.filter(name=n, version=v, release=r, arch=a)
+    if len(f) > 0:
+        return f[0]
+    return None
+
+
+def bench_get_po(daemon):
+    """Package id lookups, sack queries vs. the package index."""
+    pkg_ids = [daemon._get_id(po) for po in daemon.base.sack.query()]
+
+    def by_query():
+        for pkg_id in pkg_ids:
+            _get_po_query(daemon, pkg_id)
+
+    def by_index():
+        for pkg_id in pkg_ids:
+            daemon._get_po(pkg_id)
+
+    report('_get_po (query)', len(pkg_ids), timeit(by_query, repeat=1))
+    report('_get_po (index)', len(pkg_ids), timeit(by_index))
+    start = time.perf_counter()
+    daemon.base.setup_base()
+    report('PackageIndex build', 1, time.perf_counter() - start)
+
+
+def _get_action_query(daemon, po, obsoletes):
+    """The sack query based action lookup, used before PackageActions."""
+    n, a, e, v, r = po.pkgtup
+    q = daemon.base.sack.query()
+    if po.reponame.startswith('@'):
+        return 'remove'
+    if q.upgrades().filter(name=n, version=v, release=r, arch=a):
+        return 'update'
+    if po in obsoletes:
+        return 'obsolete'
+    ipkgs = q.installed().filter(name=po.name).run()
+    if ipkgs and ipkgs[0].evr_gt(po):
+        return 'downgrade'
+    return 'install'
+
+
+def bench_actions(daemon, sample=1000):
+    """Package action classification, per package queries vs.
+    PackageActions.
+
+    The query based path is too slow to run over a large repo, so it runs
+    over a sample of the packages.
+    """
+    pkgs = daemon.base.packages.available
+    obsoletes = list(daemon.base.packages.obsoletes)
+
+    def by_query():
+        for po in pkgs[:sample]:
+            _get_action_query(daemon, po, obsoletes)
+
+    def by_classifier():
+        daemon.base.packages._actions = None  # include the setup
+        daemon.base.packages.actions.classify(pkgs)
+
+    report('action (query)', min(sample, len(pkgs)),
+           timeit(by_query, repeat=1))
+    report('action (PackageActions)', len(pkgs), timeit(by_classifier))
+    start = time.perf_counter()
+    daemon.get_packages('available', ['action'])
+    report("get_packages(available,action)", 1,
+           time.perf_counter() - start)
+
+
+def bench_updates(daemon):
+    """Resolved updates, first call vs. cached, and the updates summary."""
+    packages = daemon.base.packages
+    packages._updates = None
+    start = time.perf_counter()
+    packages.updates
+    report('updates (resolve)', 1, time.perf_counter() - start)
+    report('updates (cached)', 1, timeit(lambda: packages.updates))
+    report('updates_summary', 1, timeit(packages.updates_summary))
+
+
+def rss():
+    """The resident set size of the process in bytes."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def bench_search(daemon, keys=('synth0012', '45', 'ng')):
+    """DnfBase.search, hawkey substr queries vs. the search index."""
+    base = daemon.base
+    fields = ['name', 'summary', 'description']
+
+    def by_query():
+        for key in keys:
+            for attr in SearchIndex.FIELDS:
+                base.contains(attr, key).run()
+
+    def by_index():
+        for key in keys:
+            for attr in SearchIndex.FIELDS:
+                base.search_index.contains(attr, key)
+
+    report('search (query)', len(keys), timeit(by_query))
+    base._search_index = None
+    gc.collect()
+    before = rss()
+    start = time.perf_counter()
+    by_index()
+    report('search (index, first)', len(keys), time.perf_counter() - start)
+    gc.collect()
+    print('%-30s %12.1f MiB' % ('search index rss',
+                                (rss() - before) / 2 ** 20))
+    report('search (index)', len(keys), timeit(by_index))
+    for key in keys:
+        report('search %r (index)' % key, 1,
+               timeit(base.search, fields, [key], False, True))
+
+
+def _marshal(value, signature):
+    """Marshal a value into a D-Bus method return message."""
+    call = dbus.lowlevel.MethodCallMessage('org.baseurl.DnfSystem', '/',
+                                           'org.baseurl.DnfSystem',
+                                           'GetPackages')
+    msg = dbus.lowlevel.MethodReturnMessage(call)
+    msg.append(value, signature=signature)
+    return msg
+
+
+def _json_path(daemon, pkgs, attrs):
+    start = time.perf_counter()
+    msg = _marshal(json.dumps(daemon._get_po_lists(pkgs, attrs)), 's')
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    json.loads(msg.get_args_list()[0])
+    return encode, time.perf_counter() - start
+
+
+def _native_path(daemon, pkgs, attrs):
+    start = time.perf_counter()
+    msg = _marshal(daemon._get_po_dicts(pkgs, attrs), 'aa{sv}')
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    msg.get_args_list()
+    return encode, time.perf_counter() - start
+
+
+def _rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def _run_forked(func, *args):
+    """Run func in a child process.
+
+    :return: (result of func, peak RSS growth in KB while running func)
+    """
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        start_rss = _rss_kb()
+        result = func(*args)
+        with os.fdopen(wfd, 'w') as f:
+            json.dump([start_rss, result], f)
+        os._exit(0)
+    os.close(wfd)
+    with os.fdopen(rfd) as f:
+        data = f.read()
+    _pid, _status, rusage = os.wait4(pid, 0)
+    start_rss, result = json.loads(data)
+    return result, rusage.ru_maxrss - start_rss
+
+
+def bench_native(daemon, sizes=(10000, 50000),
+                 attrs=('summary', 'size', 'group')):
+    """Package list marshalling, JSON string (s) vs. native D-Bus typed
+    values (aa{sv}).
+
+    Each case runs in a forked process, so the peak RSS growth can be
+    measured per case. Decoding is done with dbus-python, like the message
+    would be read by a dbus-python client.
+    """
+    attrs = list(attrs)
+    all_pkgs = daemon.base.packages.available
+    for size in sizes:
+        pkgs = all_pkgs[:size]
+        for name, path in (('json', _json_path), ('native', _native_path)):
+            (encode, decode), rss = _run_forked(path, daemon, pkgs, attrs)
+            report('%s encode (%d)' % (name, len(pkgs)), len(pkgs), encode)
+            report('%s decode (%d)' % (name, len(pkgs)), len(pkgs), decode)
+            print('%-30s %8d KB peak RSS growth' %
+                  ('%s (%d)' % (name, len(pkgs)), rss))
+
+
+def bench_get_packages(daemon):
+    """get_packages for the package filters, without the result cache."""
+    for pkg_filter in ('installed', 'available', 'updates', 'obsoletes'):
+        for attrs in ([], ['summary', 'size', 'group']):
+            report('get_packages(%s,%d attrs)' % (pkg_filter, len(attrs)),
+                   1, timeit(uncached, daemon, daemon.get_packages,
+                             pkg_filter, attrs))
+
+
+def bench_search_with_attr(daemon):
+    """search_with_attr, without the result cache."""
+    searches = [
+        (['name'], ['synth0012'], [], False, True),
+        (['name', 'summary'], ['python'], ['summary', 'size'], False, True),
+        (['name', 'summary', 'description'], ['tool', 'daemon'], [], True,
+         False),
+    ]
+    for fields, keys, attrs, match_all, newest_only in searches:
+        report('search_with_attr(%s,%s)' % ('+'.join(fields), '+'.join(keys)),
+               1, timeit(uncached, daemon, daemon.search_with_attr, fields,
+                         keys, attrs, match_all, newest_only, False))
+
+
+def bench_get_attribute(daemon, sample=500):
+    """get_attribute for a sample of the available packages."""
+    pkg_ids = [daemon._get_id(po)
+               for po in daemon.base.packages.available[:sample]]
+    for attr in ('summary', 'description', 'updateinfo', 'requires',
+                 'downgrades', 'action'):
+        def get_attribute():
+            for pkg_id in pkg_ids:
+                daemon.get_attribute(pkg_id, attr)
+        report('get_attribute(%s)' % attr, len(pkg_ids),
+               timeit(get_attribute))
+
+
+def bench_transaction(daemon):
+    """_get_transaction, for an update of all installed packages."""
+    base = daemon.base
+    base.reset(goal=True)
+    start = time.perf_counter()
+    base.upgrade_all()
+    base.resolve(allow_erasing=True)
+    report('resolve (update all)', 1, time.perf_counter() - start)
+    report('_get_transaction (%d)' % len(base.transaction), 1,
+           timeit(daemon._get_transaction))
+    base.reset(goal=True)
+
+
+def bench_get_groups(daemon):
+    """get_groups and get_group_pkgs, for the synthetic comps groups."""
+    report('get_groups', 1, timeit(daemon.get_groups))
+    grp_ids = [grp.id for grp in daemon.base.comps.groups_iter()][:20]
+
+    def get_group_pkgs():
+        for grp_id in grp_ids:
+            daemon.get_group_pkgs(grp_id, 'all', ['summary'])
+
+    report('get_group_pkgs', len(grp_ids), timeit(get_group_pkgs))
+
+
+def bench_requires(daemon, sample=1000):
+    """_get_requires for a sample of the available packages, with and
+    without a provider cache shared between the packages.
+    """
+    pkgs = daemon.base.packages.available[:sample]
+
+    def single():
+        for po in pkgs:
+            daemon._get_requires(po)
+
+    def shared():
+        providers = {}
+        for po in pkgs:
+            daemon._get_requires(po, providers)
+
+    report('_get_requires', len(pkgs), timeit(single))
+    report('_get_requires (shared cache)', len(pkgs), timeit(shared))
+
+
+class _SignalCounter:
+    """Stand-in for the daemon in TransactionProgress, the signals are
+    marshalled like by dbus-python and counted.
+    """
+
+    def __init__(self, daemon, legacy, batch):
+        self._get_id = daemon._get_id
+        self.legacy_progress = legacy
+        self.rpm_progress_batch = batch
+        self.progress_rate = dnfdaemon.server.PROGRESS_RATE
+        self.signals = 0
+
+    def _signal(self, name, signature, *args):
+        msg = dbus.lowlevel.SignalMessage('/', 'org.baseurl.DnfSystem', name)
+        msg.append(*args, signature=signature)
+        self.signals += 1
+
+    def RPMProgress(self, *args):
+        self._signal('RPMProgress', 'ssxxxx', *args)
+
+    def RPMProgressBatch(self, events):
+        self._signal('RPMProgressBatch', 'a(ssxxxx)', events)
+
+
+def bench_rpm_progress(daemon, sample=1000, steps=100,
+                       size=10 * 1024 * 1024):
+    """TransactionProgress callbacks for a sample of the available
+    packages, with steps byte progress callbacks for each package.
+    """
+    pkgs = daemon.base.packages.available[:sample]
+    for name, legacy, batch in (('legacy', True, False),
+                                ('throttled', False, False),
+                                ('batch', False, True)):
+        signals = []
+
+        def run():
+            base = _SignalCounter(daemon, legacy, batch)
+            display = dnfdaemon.server.TransactionProgress(base)
+            for num, po in enumerate(pkgs):
+                for step in range(steps + 1):
+                    display.progress(po, dnf.callback.PKG_INSTALL,
+                                     size * step // steps, size, num,
+                                     len(pkgs))
+            display.flush()
+            signals.append(base.signals)
+
+        report('rpm progress (%s)' % name, len(pkgs), timeit(run))
+        print('%-30s %8d signals' % ('', signals[-1]))
+
+
+BENCHMARKS = [bench_get_po, bench_actions, bench_updates, bench_search,
+              bench_native, bench_get_packages, bench_search_with_attr,
+              bench_get_attribute, bench_transaction, bench_get_groups,
+              bench_requires, bench_rpm_progress]
+
+
+def write_json(fn, args, num_pkgs):
+    """Write the results as JSON, with the setup of the run."""
+    data = {
+        'time': datetime.datetime.now().isoformat(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'packages': num_pkgs,
+        'args': vars(args),
+        'results': [{'name': name, 'calls': count, 'seconds': elapsed}
+                    for name, count, elapsed in RESULTS],
+    }
+    with open(fn, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def main():
+    names = [bench.__name__[len('bench_'):] for bench in BENCHMARKS]
+    parser = argparse.ArgumentParser(description='dnfdaemon benchmarks')
+    parser.add_argument('--packages', type=int, default=50000,
+                        help='number of packages in the synthetic repo')
+    parser.add_argument('--provides', type=int, default=2,
+                        help='extra provides for each package')
+    parser.add_argument('--requires', type=int, default=3,
+                        help='requires for each package')
+    parser.add_argument('--bench', action='append', choices=names,
+                        help='benchmark to run (default: all)')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write the results to FILE as JSON')
+    args = parser.parse_args()
+    path = tempfile.mkdtemp(prefix='dnfdaemon-bench-')
+    try:
+        synthrepo.generate(path, args.packages, provides=args.provides,
+                           requires=args.requires)
+        daemon = get_daemon(path)
+        num_pkgs = len(daemon.base.sack.query())
+        print('packages in sack : %d' % num_pkgs)
+        for name, bench in zip(names, BENCHMARKS):
+            if not args.bench or name in args.bench:
+                bench(daemon)
+    finally:
+        shutil.rmtree(path)
+    if args.json:
+        write_json(args.json, args, num_pkgs)
+        print('results written to %s' % args.json, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
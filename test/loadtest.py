@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Load test for the session daemon, with many concurrent clients.
+
+A private bus is started, with the session daemon from the source tree
+using a synthetic repository, so no network or system bus is needed.
+A number of client processes, each with its own bus connection and read
+lease, replays a weighted mix of GetPackages, Search and GetAttribute calls
+for a given time, and the throughput and latency percentiles are reported.
+
+Run it from the top of the source tree, dnf must be installed:
+
+    PYTHONPATH=python/ python3 -m test.loadtest --clients 16 --duration 60
+
+The mix is given as method=weight pairs, like GetPackages=5,Search=3.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from gi.repository import Gio, GLib
+
+import dnfdaemon.client as client
+import test.synthrepo as synthrepo
+
+DEFAULT_MIX = 'GetPackages=5,Search=3,GetAttribute=2'
+
+PKG_FILTERS = ('installed', 'available', 'updates')
+SEARCH_KEYS = ('python', 'library', 'synth0001', 'tool', 'daemon', 'font')
+ATTRIBUTES = ('summary', 'description', 'updateinfo', 'requires')
+
+DNF_CONF = """[main]
+cachedir=%(tmp)s/cache
+persistdir=%(tmp)s/persist
+logdir=%(tmp)s/log
+reposdir=%(tmp)s/repos.d
+plugins=0
+gpgcheck=0
+"""
+
+REPO_CONF = """[%(repo_id)s]
+name=Synthetic repository
+baseurl=file://%(path)s
+enabled=1
+gpgcheck=0
+"""
+
+
+def write_config(tmp, repo_path):
+    """Write a dnf config, using only the synthetic repository."""
+    os.makedirs(os.path.join(tmp, 'repos.d'))
+    with open(os.path.join(tmp, 'repos.d', 'synthetic.repo'), 'w') as f:
+        f.write(REPO_CONF % {'repo_id': synthrepo.REPO_ID,
+                             'path': os.path.join(repo_path,
+                                                  synthrepo.REPO_ID)})
+    config = os.path.join(tmp, 'dnf.conf')
+    with open(config, 'w') as f:
+        f.write(DNF_CONF % {'tmp': tmp})
+    return config
+
+
+def parse_mix(value):
+    """Parse a method=weight,... mix."""
+    mix = []
+    for item in value.split(','):
+        method, weight = item.split('=')
+        if method not in ('GetPackages', 'Search', 'GetAttribute'):
+            raise argparse.ArgumentTypeError('unknown method : %s' % method)
+        mix.append((method, float(weight)))
+    return mix
+
+
+def connect(address):
+    return Gio.DBusConnection.new_for_address_sync(
+        address,
+        Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT |
+        Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION, None, None)
+
+
+def get_proxy(address):
+    return Gio.DBusProxy.new_sync(connect(address),
+                                  Gio.DBusProxyFlags.DO_NOT_AUTO_START,
+                                  None, client.ORG_READONLY, '/',
+                                  client.INTERFACE_READONLY, None)
+
+
+def call(proxy, method, args=None):
+    return proxy.call_sync(method, args, Gio.DBusCallFlags.NONE,
+                           GLib.MAXINT, None).unpack()
+
+
+def wait_for_daemon(address, timeout=60):
+    conn = connect(address)
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        owned = conn.call_sync(
+            'org.freedesktop.DBus', '/org/freedesktop/DBus',
+            'org.freedesktop.DBus', 'NameHasOwner',
+            GLib.Variant('(s)', (client.ORG_READONLY,)), None,
+            Gio.DBusCallFlags.NONE, -1, None).unpack()[0]
+        if owned:
+            return
+        time.sleep(0.1)
+    raise RuntimeError('the session daemon did not start')
+
+
+def get_call(rnd, method, pkg_ids):
+    """Get the D-Bus arguments for a random call of a method."""
+    if method == 'GetPackages':
+        return GLib.Variant('(sas)', (rnd.choice(PKG_FILTERS),
+                                      ['summary', 'size']))
+    elif method == 'Search':
+        return GLib.Variant('(asasasbbb)',
+                            (['name', 'summary'], [rnd.choice(SEARCH_KEYS)],
+                             [], True, True, False))
+    return GLib.Variant('(ss)', (rnd.choice(pkg_ids),
+                                 rnd.choice(ATTRIBUTES)))
+
+
+def run_client(address, num, mix, duration, queue):
+    """Replay the call mix until the duration has passed.
+
+    Puts a list of (method, latency, error) tuples in the queue.
+    """
+    rnd = random.Random(num)
+    methods = [method for method, weight in mix]
+    weights = [weight for method, weight in mix]
+    samples = []
+    try:
+        proxy = get_proxy(address)
+        call(proxy, 'AcquireReadLease')
+        pkg_ids = json.loads(call(proxy, 'GetPackages', GLib.Variant(
+            '(sas)', ('available', [])))[0])
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            method = rnd.choices(methods, weights)[0]
+            args = get_call(rnd, method, pkg_ids)
+            start = time.perf_counter()
+            error = False
+            try:
+                call(proxy, method, args)
+            except GLib.Error:
+                error = True
+            samples.append((method, time.perf_counter() - start, error))
+    finally:
+        queue.put(samples)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[int(round(pct / 100.0 * (len(values) - 1)))]
+
+
+def report(samples, elapsed, clients):
+    """Print the throughput and latencies, and return them as a dict."""
+    result = {'clients': clients, 'seconds': elapsed,
+              'calls': len(samples),
+              'calls_per_second': len(samples) / elapsed, 'methods': {}}
+    print('%d clients, %d calls in %.1f s, %.1f calls/s' %
+          (clients, len(samples), elapsed, len(samples) / elapsed))
+    by_method = {}
+    for method, latency, error in samples:
+        by_method.setdefault(method, []).append((latency, error))
+    for method in sorted(by_method):
+        latencies = [latency for latency, error in by_method[method]]
+        errors = sum(1 for latency, error in by_method[method] if error)
+        value = {'calls': len(latencies), 'errors': errors,
+                 'p50': percentile(latencies, 50),
+                 'p90': percentile(latencies, 90),
+                 'p99': percentile(latencies, 99),
+                 'max': max(latencies)}
+        result['methods'][method] = value
+        print('%-14s %7d calls %5d errors  p50 %8.1f ms  p90 %8.1f ms  '
+              'p99 %8.1f ms  max %8.1f ms' %
+              (method, value['calls'], errors, value['p50'] * 1000,
+               value['p90'] * 1000, value['p99'] * 1000,
+               value['max'] * 1000))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dnfdaemon load test')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='number of client processes')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds each client replays calls')
+    parser.add_argument('--packages', type=int, default=20000,
+                        help='number of packages in the synthetic repo')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='call mix as method=weight pairs (default: %s)'
+                             % DEFAULT_MIX)
+    parser.add_argument('--workers', type=int,
+                        help='number of worker threads in the daemon')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write the results to FILE as JSON')
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp(prefix='dnfdaemon-load-')
+    procs = []
+    try:
+        repo_path = synthrepo.generate(os.path.join(tmp, 'repo'),
+                                       args.packages)
+        config = write_config(tmp, repo_path)
+        bus = subprocess.Popen(['dbus-daemon', '--session', '--nofork',
+                                '--print-address=1'],
+                               stdout=subprocess.PIPE,
+                               universal_newlines=True)
+        procs.append(bus)
+        address = bus.stdout.readline().strip()
+        cmd = [sys.executable, 'daemon/dnfdaemon-session.py', '--notimeout',
+               '--config', config]
+        if args.workers:
+            cmd += ['--workers', str(args.workers)]
+        procs.append(subprocess.Popen(
+            cmd, env=dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address)))
+        wait_for_daemon(address)
+        # load the metadata and the sack, before the clients starts
+        start = time.perf_counter()
+        proxy = get_proxy(address)
+        call(proxy, 'AcquireReadLease')
+        call(proxy, 'GetPackages', GLib.Variant('(sas)', ('available', [])))
+        print('sack loaded in %.1f s' % (time.perf_counter() - start))
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.Queue()
+        clients = [ctx.Process(target=run_client,
+                               args=(address, num, args.mix, args.duration,
+                                     queue))
+                   for num in range(args.clients)]
+        start = time.perf_counter()
+        for proc in clients:
+            proc.start()
+        samples = []
+        for proc in clients:
+            samples.extend(queue.get())
+        elapsed = time.perf_counter() - start
+        for proc in clients:
+            proc.join()
+        result = report(samples, elapsed, args.clients)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(result, f, indent=2)
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            proc.wait()
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Measure how much a pending PolicyKit authorization delays other clients
+of the system daemon.
+
+A private bus is started, with a stand-in PolicyKit service and the system
+daemon from the source tree. The stand-in service holds back the reply to
+the first authorization check for --delay seconds, like a password dialog
+waiting for the user, and grants all other checks right away.
+While the first client waits for its Lock, a second client calls
+AcquireReadLease and SetWatchdogState, and the latency of these calls is
+reported.
+
+Run it from the top of the source tree, dnf must be installed:
+
+    PYTHONPATH=python/ python3 -m test.polkit_harness --delay 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from gi.repository import Gio, GLib
+
+import dnfdaemon.client as client
+
+POLKIT_ORG = 'org.freedesktop.PolicyKit1'
+POLKIT_PATH = '/org/freedesktop/PolicyKit1/Authority'
+POLKIT_INTERFACE = 'org.freedesktop.PolicyKit1.Authority'
+
+
+def run_stand_in(delay):
+    """Run the stand-in PolicyKit service on the system bus."""
+    import dbus
+    import dbus.service
+    import dbus.mainloop.glib
+
+    class StandInAuthority(dbus.service.Object):
+
+        def __init__(self, bus_name):
+            dbus.service.Object.__init__(self, bus_name, POLKIT_PATH)
+            self.calls = 0
+
+        @dbus.service.method(POLKIT_INTERFACE,
+                             in_signature='(sa{sv})sa{ss}us',
+                             out_signature='(bba{ss})',
+                             async_callbacks=('reply_handler',
+                                              'error_handler'))
+        def CheckAuthorization(self, subject, action_id, details, flags,
+                               cancellation_id, reply_handler=None,
+                               error_handler=None):
+            wait = delay if self.calls == 0 else 0
+            self.calls += 1
+
+            def reply():
+                reply_handler((True, False, {}))
+                return False
+
+            GLib.timeout_add(int(wait * 1000), reply)
+
+    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    bus_name = dbus.service.BusName(POLKIT_ORG, bus=dbus.SystemBus())
+    StandInAuthority(bus_name)
+    GLib.MainLoop().run()
+
+
+def connect(address):
+    return Gio.DBusConnection.new_for_address_sync(
+        address,
+        Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT |
+        Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION, None, None)
+
+
+def wait_for_name(conn, name, timeout=30):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        owned = conn.call_sync(
+            'org.freedesktop.DBus', '/org/freedesktop/DBus',
+            'org.freedesktop.DBus', 'NameHasOwner',
+            GLib.Variant('(s)', (name,)), None, Gio.DBusCallFlags.NONE, -1,
+            None).unpack()[0]
+        if owned:
+            return
+        time.sleep(0.1)
+    raise RuntimeError('%s did not start' % name)
+
+
+def get_proxy(address):
+    return Gio.DBusProxy.new_sync(connect(address),
+                                  Gio.DBusProxyFlags.DO_NOT_AUTO_START,
+                                  None, client.ORG, '/', client.INTERFACE,
+                                  None)
+
+
+def timed_call(proxy, method, args=None):
+    start = time.perf_counter()
+    proxy.call_sync(method, args, Gio.DBusCallFlags.NONE, GLib.MAXINT, None)
+    return time.perf_counter() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[int(round(pct / 100.0 * (len(values) - 1)))]
+
+
+def measure(address, delay, calls):
+    pending = {}
+
+    def slow_client():
+        pending['Lock'] = timed_call(get_proxy(address), 'Lock')
+
+    slow = threading.Thread(target=slow_client)
+    slow.start()
+    time.sleep(min(0.5, delay / 4))  # let the first check start
+    proxy = get_proxy(address)
+    latencies = [timed_call(proxy, 'AcquireReadLease')]
+    for num in range(calls):
+        latencies.append(timed_call(proxy, 'SetWatchdogState',
+                                    GLib.Variant('(b)', (True,))))
+    blocked = slow.is_alive()
+    slow.join()
+    print('pending authorization : %.2f s (Lock of the first client)' %
+          pending['Lock'])
+    print('other client          : %d calls, p50 %.1f ms, p99 %.1f ms, '
+          'max %.1f ms' %
+          (len(latencies), percentile(latencies, 50) * 1000,
+           percentile(latencies, 99) * 1000, max(latencies) * 1000))
+    print('other client done while the authorization was pending : %s' %
+          blocked)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='dnfdaemon PolicyKit latency harness')
+    parser.add_argument('--delay', type=float, default=5.0,
+                        help='seconds the first authorization is pending')
+    parser.add_argument('--calls', type=int, default=50,
+                        help='number of calls from the other client')
+    parser.add_argument('--stand-in', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.stand_in:
+        run_stand_in(args.delay)
+        return
+    bus = subprocess.Popen(['dbus-daemon', '--session', '--nofork',
+                            '--print-address=1'],
+                           stdout=subprocess.PIPE, universal_newlines=True)
+    procs = [bus]
+    try:
+        address = bus.stdout.readline().strip()
+        env = dict(os.environ, DBUS_SYSTEM_BUS_ADDRESS=address)
+        procs.append(subprocess.Popen(
+            [sys.executable, '-m', 'test.polkit_harness', '--stand-in',
+             '--delay', str(args.delay)], env=env))
+        procs.append(subprocess.Popen(
+            [sys.executable, 'daemon/dnfdaemon-system.py', '--notimeout'],
+            env=env))
+        conn = connect(address)
+        wait_for_name(conn, POLKIT_ORG)
+        wait_for_name(conn, client.ORG)
+        measure(address, args.delay, args.calls)
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
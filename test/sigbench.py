@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the GPG signature check of the downloaded packages.
+
+The signatures of the rpms in a directory are checked one at a time with a
+new rpm transaction set for each package (like before), one at a time with
+a shared transaction set, and in the SignatureVerifier process pool.
+The keys of the packages must be imported in the rpmdb of --root, or all
+the checks fails the same way.
+
+Run it from the top of the source tree, dnf must be installed:
+
+    PYTHONPATH=python/ python3 -m test.sigbench /path/to/rpms
+"""
+
+import argparse
+import glob
+import os
+
+import dnf.rpm.transaction
+import dnfdaemon.server.backend as backend
+from test.benchmark import report, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='dnfdaemon signature check benchmark')
+    parser.add_argument('directory', help='directory with signed rpms')
+    parser.add_argument('--root', default='/',
+                        help='root with the rpmdb keyring (default: /)')
+    parser.add_argument('--workers', type=int,
+                        default=backend.SIG_CHECK_WORKERS,
+                        help='number of worker processes (default: %s)' %
+                             backend.SIG_CHECK_WORKERS)
+    args = parser.parse_args()
+    paths = sorted(glob.glob(os.path.join(args.directory, '*.rpm')))
+    if not paths:
+        parser.error('no rpms in %s' % args.directory)
+    print('%d packages, %d workers' % (len(paths), args.workers))
+
+    def serial():
+        return [backend.sig_check_file(args.root, path, True)
+                for path in paths]
+
+    def shared_ts():
+        ts = dnf.rpm.transaction.initReadOnlyTransaction(args.root)
+        return [backend.sig_check_file(args.root, path, True, ts=ts)
+                for path in paths]
+
+    def pool(verifier):
+        futures = [verifier.submit(path, True) for path in paths]
+        return [future.result() for future in futures]
+
+    results = serial()
+    failed = sum(1 for result, msg in results if result != 0)
+    if failed:
+        print('%d packages fails the check, like : %s' %
+              (failed, [msg for result, msg in results if result][0]))
+    report('serial', len(paths), timeit(serial))
+    report('serial (shared ts)', len(paths), timeit(shared_ts))
+    verifier = backend.SignatureVerifier(args.root, args.workers)
+    try:
+        # the first run includes the start of the worker processes
+        report('process pool (start)', len(paths), timeit(pool, verifier,
+                                                          repeat=1))
+        report('process pool', len(paths), timeit(pool, verifier))
+        if pool(verifier) != results:
+            print('the results of the process pool differs')
+    finally:
+        verifier.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Stress test for the read methods of a running dnfdaemon.
+
+A number of clients calls a mix of read methods concurrently, and the
+p50/p99 latency is reported for each method. Each client has its own bus
+connection and a shared read lease, like separate applications.
+
+Run it from the top of the source tree, with the daemon running:
+
+    PYTHONPATH=python/ python3 -m test.stress --session --clients 8
+"""
+
+import argparse
+import threading
+import time
+
+from gi.repository import Gio, GLib
+
+import dnfdaemon.client as client
+
+CALLS = [
+    ('GetVersion', None),
+    ('GetPackages', GLib.Variant('(sas)', ('installed', ['summary']))),
+    ('GetPackages', GLib.Variant('(sas)', ('available', ['size']))),
+    ('Search', GLib.Variant('(asasasbbb)',
+                            (['name', 'summary'], ['lib', 'python'], [],
+                             True, True, False))),
+    ('GetUpdatesSummary', None),
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[int(round(pct / 100.0 * (len(values) - 1)))]
+
+
+def get_proxy(bus_type, org, iface):
+    """Get a daemon proxy on a new private bus connection."""
+    address = Gio.dbus_address_get_for_bus_sync(bus_type, None)
+    conn = Gio.DBusConnection.new_for_address_sync(
+        address,
+        Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT |
+        Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION, None, None)
+    return Gio.DBusProxy.new_sync(conn, Gio.DBusProxyFlags.NONE, None,
+                                  org, '/', iface, None)
+
+
+def run_client(proxy, calls, latencies, lock):
+    proxy.call_sync('AcquireReadLease', None, Gio.DBusCallFlags.NONE, -1,
+                    None)
+    for num in range(calls):
+        method, args = CALLS[num % len(CALLS)]
+        start = time.perf_counter()
+        proxy.call_sync(method, args, Gio.DBusCallFlags.NONE,
+                        GLib.MAXINT, None)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.setdefault(method, []).append(elapsed)
+    proxy.call_sync('ReleaseReadLease', None, Gio.DBusCallFlags.NONE, -1,
+                    None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dnfdaemon stress test')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='number of concurrent clients')
+    parser.add_argument('--calls', type=int, default=20,
+                        help='number of calls per client')
+    parser.add_argument('--session', action='store_true',
+                        help='use the session daemon (default: system)')
+    args = parser.parse_args()
+    if args.session:
+        bus_type, org, iface = (Gio.BusType.SESSION, client.ORG_READONLY,
+                                client.INTERFACE_READONLY)
+    else:
+        bus_type, org, iface = (Gio.BusType.SYSTEM, client.ORG,
+                                client.INTERFACE)
+    latencies = {}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=run_client,
+                                args=(get_proxy(bus_type, org, iface),
+                                      args.calls, latencies, lock))
+               for num in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+    print('%d clients, %d calls in %.2f s' %
+          (args.clients, args.clients * args.calls, total))
+    for method in sorted(latencies):
+        values = latencies[method]
+        print('%-20s %6d calls  p50 %8.1f ms  p99 %8.1f ms' %
+              (method, len(values), percentile(values, 50) * 1000,
+               percentile(values, 99) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -56,9 +56,9 @@ LOCAL_RPM = os.path.join(repo_dir(), 'local-pkg-1.0-1.fc22.noarch.rpm')
 # mock objects
 
 
-def mock_comps(history, seed_persistor):
+def mock_comps(history, seed_persistor, comps_path=COMPS_PATH):
     comps = dnf.comps.Comps()
-    comps._add_from_xml_filename(COMPS_PATH)
+    comps._add_from_xml_filename(comps_path)
 
     persistor = history.group
     if seed_persistor:
@@ -80,8 +80,10 @@ class _BaseStubMixin(object):
     different arches.
 
     """
-    def __init__(self, *extra_repos):
+    def __init__(self, *extra_repos, repo_path=None, comps_path=None):
         super(_BaseStubMixin, self).__init__()
+        self._repo_path = repo_path or repo_dir()
+        self._comps_path = comps_path or COMPS_PATH
         for r in extra_repos:
             repo = MockRepo(r, None)
             repo.enable()
@@ -111,11 +113,14 @@ class _BaseStubMixin(object):
         pass
 
     def init_sack(self):
-        self._sack = TestSack(repo_dir(), self)
+        self._sack = TestSack(self._repo_path, self)
         self._sack.load_system_repo()
         for repo in self.repos.iter_enabled():
-            fn = "%s.repo" % repo.id
-            self._sack.load_test_repo(repo.id, fn)
+            if os.path.isdir(os.path.join(self._repo_path, repo.id)):
+                self._sack.load_repomd_repo(repo.id, repo.id)
+            else:
+                fn = "%s.repo" % repo.id
+                self._sack.load_test_repo(repo.id, fn)
 
         self._sack.configure(self.conf.installonlypkgs)
         self._goal = dnf.goal.Goal(self._sack)
@@ -125,7 +130,8 @@ class _BaseStubMixin(object):
         pass
 
     def read_mock_comps(self, seed_persistor=True):
-        self._comps = mock_comps(self.history, seed_persistor)
+        self._comps = mock_comps(self.history, seed_persistor,
+                                 self._comps_path)
         return self._comps
 
     def read_all_repos(self):
@@ -202,6 +208,19 @@ class TestSack(hawkey.test.TestSackMixin, dnf.sack.Sack):
                                pkginitval=base,
                                make_cache_dir=True)
 
+    def load_repomd_repo(self, name, path):
+        """Load a repo with repomd metadata (primary and updateinfo), from
+        a directory with a repodata/ dir.
+        """
+        repodata = os.path.join(self.repo_dir, path, 'repodata')
+        repo = hawkey.Repo(name)
+        repo.repomd_fn = os.path.join(repodata, 'repomd.xml')
+        repo.primary_fn = os.path.join(repodata, 'primary.xml.gz')
+        updateinfo = os.path.join(repodata, 'updateinfo.xml.gz')
+        if os.path.exists(updateinfo):
+            repo.updateinfo_fn = updateinfo
+        self.load_repo(repo, load_updateinfo=os.path.exists(updateinfo))
+
 
 class MockBase(_BaseStubMixin, dnf.Base):
     """A class mocking `dnf.Base`."""
@@ -294,6 +313,9 @@ class DaemonStub:
 
     def __init__(self):
         self._calls = []
+        self.progress_rate = 10
+        self.legacy_progress = True
+        self.rpm_progress_batch = False
 
     def add_call(self, msg):
         self._calls.append(msg)
@@ -311,11 +333,27 @@ class DaemonStub:
         msg = 'DownloadProgress%s' % repr(args)
         self.add_call(msg)
 
+    def downloadProgressBatch(self, *args):
+        """ Progress for the files updated since the last batch """
+        msg = 'DownloadProgressBatch%s' % repr(args)
+        self.add_call(msg)
+
     def downloadEnd(self, *args):
         """ Download of af single instace ended """
         msg = 'DownloadEnd%s' % repr(args)
         self.add_call(msg)
 
+    def _get_id(self, pkg):
+        return str(pkg)
+
+    def RPMProgress(self, *args):
+        msg = 'RPMProgress%s' % repr(args)
+        self.add_call(msg)
+
+    def RPMProgressBatch(self, *args):
+        msg = 'RPMProgressBatch%s' % repr(args)
+        self.add_call(msg)
+
 
 class Payload(object):
 
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic test repositories for benchmarking the dnfdaemon backend.
+
+The installed packages are written as a libsolv testcase repo
+(@System.repo), like the ones in test/test_data/repos, and the available
+packages as repomd metadata (primary, updateinfo and comps), so they can be
+loaded by support.MockBase:
+
+    path = synthrepo.generate(tmpdir, 10000)
+    base = support.MockBase(synthrepo.REPO_ID, repo_path=path,
+                            comps_path=synthrepo.comps_path(path))
+"""
+
+import gzip
+import hashlib
+import os
+import random
+import time
+
+from xml.sax.saxutils import escape, quoteattr
+
+REPO_ID = 'synthetic'
+
+ADVISORY_TYPES = ('bugfix', 'enhancement', 'security')
+
+WORDS = ('library', 'tool', 'python', 'daemon', 'client', 'server', 'data',
+         'network', 'graphics', 'font', 'devel', 'plugin', 'theme', 'game',
+         'docs', 'utils')
+
+
+def pkg_name(num):
+    return 'synth%06d' % num
+
+
+def cap_name(num, cap):
+    return 'synth-cap(%d.%d)' % (num, cap)
+
+
+def comps_path(path):
+    return os.path.join(path, REPO_ID, 'repodata', 'comps.xml')
+
+
+class SynthPkg:
+    """A synthetic package."""
+
+    def __init__(self, num, name, ver, rel='1', arch='noarch'):
+        self.num = num
+        self.name = name
+        self.ver = ver
+        self.rel = rel
+        self.arch = arch
+        self.provides = []
+        self.requires = []
+        self.obsoletes = []
+
+    @property
+    def nvra(self):
+        return '%s-%s-%s.%s' % (self.name, self.ver, self.rel, self.arch)
+
+
+def _write_test_repo(fn, pkgs):
+    """Write a list of packages as a libsolv testcase repo."""
+    with open(fn, 'w') as f:
+        f.write('=Ver: 2.0\n#\n')
+        for pkg in pkgs:
+            f.write('=Pkg: %s %s %s %s\n' % (pkg.name, pkg.ver, pkg.rel,
+                                              pkg.arch))
+            for tag, deps in (('Prv', pkg.provides), ('Req', pkg.requires),
+                              ('Obs', pkg.obsoletes)):
+                for dep in deps:
+                    f.write('=%s: %s\n' % (tag, dep))
+
+
+def _entries(tag, deps):
+    if not deps:
+        return ''
+    entries = ''.join('<rpm:entry name=%s/>' % quoteattr(dep)
+                      for dep in deps)
+    return '<rpm:%s>%s</rpm:%s>' % (tag, entries, tag)
+
+
+def _write_primary(f, pkgs, rnd, now):
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<metadata xmlns="http://linux.duke.edu/metadata/common" '
+            'xmlns:rpm="http://linux.duke.edu/metadata/rpm" '
+            'packages="%d">\n' % len(pkgs))
+    for pkg in pkgs:
+        words = rnd.sample(WORDS, 3)
+        size = rnd.randint(1000, 10000000)
+        f.write(
+            '<package type="rpm"><name>%(name)s</name>'
+            '<arch>%(arch)s</arch>'
+            '<version epoch="0" ver="%(ver)s" rel="%(rel)s"/>'
+            '<checksum type="sha256" pkgid="YES">%(checksum)s</checksum>'
+            '<summary>%(summary)s</summary>'
+            '<description>%(description)s</description>'
+            '<packager>Synthetic</packager><url>http://example.com/</url>'
+            '<time file="%(time)d" build="%(time)d"/>'
+            '<size package="%(size)d" installed="%(installed)d" '
+            'archive="%(installed)d"/>'
+            '<location href="Packages/%(nvra)s.rpm"/>'
+            '<format><rpm:license>MIT</rpm:license>'
+            '<rpm:group>Unspecified</rpm:group>'
+            '<rpm:buildhost>localhost</rpm:buildhost>'
+            '<rpm:sourcerpm>%(name)s-%(ver)s-%(rel)s.src.rpm</rpm:sourcerpm>'
+            '<rpm:header-range start="0" end="0"/>'
+            '%(provides)s%(requires)s%(obsoletes)s</format></package>\n' %
+            {'name': escape(pkg.name), 'arch': pkg.arch, 'ver': pkg.ver,
+             'rel': pkg.rel, 'nvra': escape(pkg.nvra),
+             'checksum': hashlib.sha256(pkg.nvra.encode()).hexdigest(),
+             'summary': escape('%s %s' % (words[0], words[1])),
+             'description': escape('Synthetic %s package with %s and %s '
+                                   'support.' % tuple(words)),
+             'time': now - rnd.randint(0, 365 * 86400), 'size': size,
+             'installed': size * 3,
+             'provides': _entries('provides', pkg.provides),
+             'requires': _entries('requires', pkg.requires),
+             'obsoletes': _entries('obsoletes', pkg.obsoletes)})
+    f.write('</metadata>\n')
+
+
+def _write_updateinfo(f, advisories, now):
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n<updates>\n')
+    for num, (adv_type, pkgs) in enumerate(advisories):
+        date = time.strftime('%Y-%m-%d %H:%M:%S',
+                             time.gmtime(now - num * 3600))
+        pkglist = ''.join(
+            '<package name=%s version="%s" release="%s" epoch="0" '
+            'arch="%s"><filename>%s.rpm</filename></package>' %
+            (quoteattr(pkg.name), pkg.ver, pkg.rel, pkg.arch,
+             escape(pkg.nvra)) for pkg in pkgs)
+        f.write(
+            '<update from="synth@example.com" status="stable" type="%s" '
+            'version="1"><id>SYNTH-%06d</id>'
+            '<title>Synthetic %s update %d</title>'
+            '<issued date="%s"/><updated date="%s"/>'
+            '<description>Synthetic %s advisory for %d packages.'
+            '</description><references>'
+            '<reference href="http://bugzilla.example.com/%d" id="%d" '
+            'type="bugzilla" title="Synthetic bug %d"/></references>'
+            '<pkglist><collection short="synth"><name>synth</name>%s'
+            '</collection></pkglist></update>\n' %
+            (adv_type, num, adv_type, num, date, date, adv_type, len(pkgs),
+             num, num, num, pkglist))
+    f.write('</updates>\n')
+
+
+def _write_comps(fn, groups):
+    with open(fn, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<comps>\n')
+        for grp_id, pkgs in groups:
+            f.write('<group><id>%s</id><name>Synthetic group %s</name>'
+                    '<description>Synthetic test group</description>'
+                    '<default>false</default><uservisible>true</uservisible>'
+                    '<packagelist>' % (grp_id, grp_id))
+            for num, pkg in enumerate(pkgs):
+                pkg_type = 'mandatory' if num % 3 == 0 else 'default'
+                f.write('<packagereq type="%s">%s</packagereq>' %
+                        (pkg_type, escape(pkg.name)))
+            f.write('</packagelist></group>\n')
+        f.write('<category><id>synthetic</id><name>Synthetic</name>'
+                '<description>Synthetic test groups</description>'
+                '<grouplist>')
+        for grp_id, pkgs in groups:
+            f.write('<groupid>%s</groupid>' % grp_id)
+        f.write('</grouplist></category>\n</comps>\n')
+
+
+def _write_repomd(path, files, now):
+    with open(os.path.join(path, 'repomd.xml'), 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<repomd xmlns="http://linux.duke.edu/metadata/repo">\n'
+                '<revision>%d</revision>\n' % now)
+        for md_type, fn in files:
+            with open(os.path.join(path, fn), 'rb') as md:
+                checksum = hashlib.sha256(md.read()).hexdigest()
+            f.write('<data type="%s"><checksum type="sha256">%s</checksum>'
+                    '<location href="repodata/%s"/>'
+                    '<timestamp>%d</timestamp></data>\n' %
+                    (md_type, checksum, fn, now))
+        f.write('</repomd>\n')
+
+
+def generate(path, num_pkgs, installed_every=10, update_every=2,
+             obsolete_every=10, provides=2, requires=3, advisory_size=5,
+             group_size=50, seed=0):
+    """Generate a system repo and an available repo in a given directory.
+
+    :param path: directory to write the repositories to
+    :param num_pkgs: number of packages in the available repo
+    :param installed_every: every n'th package is installed
+    :param update_every: every n'th installed package has an update
+    :param obsolete_every: every n'th installed package without an update
+                           is obsoleted by a new package
+    :param provides: number of extra provides for each package
+    :param requires: number of requires for each package, on the provides
+                     and names of other packages
+    :param advisory_size: number of updates in an updateinfo advisory
+    :param group_size: number of packages in a comps group
+    :param seed: seed for the random package data
+    :return: path
+    """
+    rnd = random.Random(seed)
+    now = int(time.time())
+    repodata = os.path.join(path, REPO_ID, 'repodata')
+    os.makedirs(repodata, exist_ok=True)
+    system = []
+    available = []
+    updates = []
+    for num in range(num_pkgs):
+        name = pkg_name(num)
+        if num % installed_every == 0:
+            system.append(SynthPkg(num, name, '1.0'))
+            inst_num = num // installed_every
+            if inst_num % update_every == 0:
+                pkg = SynthPkg(num, name, '2.0')
+                updates.append(pkg)
+            elif inst_num % obsolete_every == 1:
+                pkg = SynthPkg(num, '%s-ng' % name, '1.0')
+                pkg.obsoletes.append(name)
+                pkg.provides.append(name)
+            else:
+                pkg = SynthPkg(num, name, '1.0')
+        else:
+            pkg = SynthPkg(num, name, '1.0')
+        available.append(pkg)
+    installed = set(pkg.num for pkg in system)
+    for pkgs in (system, available):
+        for pkg in pkgs:
+            pkg.provides += [cap_name(pkg.num, cap)
+                             for cap in range(provides)]
+            # only depend on lower numbered packages, there is no loops
+            for req in range(requires if pkg.num else 0):
+                other = rnd.randrange(pkg.num)
+                if pkgs is system and other not in installed:
+                    # the requires of the installed packages are installed
+                    other -= other % installed_every
+                if provides and req % 2 == 0:
+                    dep = cap_name(other, rnd.randrange(provides))
+                else:
+                    dep = pkg_name(other)
+                if dep not in pkg.requires:
+                    pkg.requires.append(dep)
+    _write_test_repo(os.path.join(path, '@System.repo'), system)
+    with gzip.open(os.path.join(repodata, 'primary.xml.gz'), 'wt') as f:
+        _write_primary(f, available, rnd, now)
+    advisories = [(ADVISORY_TYPES[num % len(ADVISORY_TYPES)],
+                   updates[start:start + advisory_size])
+                  for num, start in enumerate(
+                      range(0, len(updates), max(advisory_size, 1)))]
+    with gzip.open(os.path.join(repodata, 'updateinfo.xml.gz'), 'wt') as f:
+        _write_updateinfo(f, advisories, now)
+    groups = [('synth-grp-%04d' % num, available[start:start + group_size])
+              for num, start in enumerate(
+                  range(0, len(available), max(group_size, 1)))]
+    _write_comps(comps_path(path), groups)
+    _write_repomd(repodata, [('primary', 'primary.xml.gz'),
+                             ('updateinfo', 'updateinfo.xml.gz'),
+                             ('group', 'comps.xml')], now)
+    return path
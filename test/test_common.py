@@ -3,12 +3,21 @@
 import dnfdaemon.server
 import dnfdaemon.server.backend as backend
 
+import concurrent.futures
 import datetime
+import dbus
 import dnf.callback
 import test.support as support
+import test.synthrepo as synthrepo
 import hawkey
 import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
 import time
+from gi.repository import GLib
 from unittest import mock
 
 TEST_LOCAL_PKG = 'local-pkg,0,1.0,1.fc22,noarch,@commandline'
@@ -16,15 +25,36 @@ TEST_LOCAL_PKG = 'local-pkg,0,1.0,1.fc22,noarch,@commandline'
 
 class DnfBaseMock(backend.DnfBase):
 
-    def __init__(self, parent, repo='main'):
-        self._base = support.MockBase(repo)
+    def __init__(self, parent, repo='main', repo_path=None, comps_path=None):
+        self._base = support.MockBase(repo, repo_path=repo_path,
+                                      comps_path=comps_path)
         self.parent = mock.MagicMock()
         self.md_progress = backend.MDProgress(parent)
         self.progress = backend.Progress(parent)
         self._packages = None
+        self._index_lock = threading.Lock()
 
     def setup_base(self):
         self._packages = backend.Packages(self._base)
+        self._pkg_index = backend.PackageIndex(self._base.sack)
+        self._search_index = None
+        self.sack_generation = backend.next_sack_generation()
+
+    def reload_installed(self):
+        self._base.reset(goal=True)  # like fill_sack_from_repos_in_cache
+        self.setup_base()
+        return True
+
+    def rpmdb_changed(self):
+        return True
+
+    def get_config_stamp(self):
+        return None
+
+    def _load_repo_sack(self, repo):
+        sack = support.TestSack(support.repo_dir(), self._base)
+        sack.load_test_repo(repo.id, '%s.repo' % repo.id)
+        return sack
 
     def __getattr__(self, attr):
         if hasattr(self._base, attr):
@@ -147,6 +177,432 @@ DownloadEnd('foobar0-1.0-1.noarch', None, 'done')"""
 
         #print("\n".join(calls))
 
+    def _batch_progress(self, clock):
+        daemon = support.DaemonStub()
+        daemon.legacy_progress = False
+        return daemon, backend.Progress(daemon, clock=lambda: clock[0])
+
+    def test_progress_batch_rate(self):
+        """Test the batched progress is rate limited."""
+        clock = [100.0]
+        daemon, progress = self._batch_progress(clock)
+        progress.start(2, 2 * 10240)
+        pload0 = self._get_pload(0)
+        pload1 = self._get_pload(1)
+        progress.progress(pload0, 0)
+        progress.progress(pload1, 0)
+        for done in range(1024, 10240, 1024):
+            clock[0] += 0.01
+            progress.progress(pload0, done)
+            progress.progress(pload1, done)
+        # only the first callback is sent in the first 0.1 s
+        calls = [call for call in daemon.get_calls()
+                 if call.startswith('DownloadProgressBatch')]
+        self.assertEqual(len(calls), 1)
+        clock[0] += 0.1
+        progress.progress(pload0, 10240)
+        calls = [call for call in daemon.get_calls()
+                 if call.startswith('DownloadProgressBatch')]
+        self.assertEqual(len(calls), 2)
+        # both files are updated since the last batch
+        self.assertIn("'foobar0-1.0-1.noarch': 1.0", calls[-1])
+        self.assertIn("'foobar1-1.0-1.noarch': 0.9", calls[-1])
+
+    def test_progress_batch_end(self):
+        """Test the batched progress is sent for the last file."""
+        clock = [100.0]
+        daemon, progress = self._batch_progress(clock)
+        progress.start(1, 10240)
+        self._simulate_download(progress, 0)
+        calls = daemon.get_calls()
+        self.assertEqual(calls[-2], "DownloadProgressBatch("
+                         "{'foobar0-1.0-1.noarch': 1.0}, 1.0, 0.0, -1.0, 1)")
+        self.assertEqual(calls[-1],
+                         "DownloadEnd('foobar0-1.0-1.noarch', None, 'done')")
+        self.assertFalse(any(call.startswith('DownloadProgress(')
+                             for call in calls))
+
+    def test_progress_batch_speed(self):
+        """Test the speed and eta of the batched progress."""
+        clock = [100.0]
+        daemon, progress = self._batch_progress(clock)
+        progress.start(1, 10240)
+        pload = self._get_pload(0)
+        progress.progress(pload, 0)
+        clock[0] += 2.0
+        progress.progress(pload, 2048)
+        self.assertEqual(daemon.get_calls()[-1], "DownloadProgressBatch("
+                         "{'foobar0-1.0-1.noarch': 0.2}, 0.2, 1024.0, 8.0, 0)")
+        self.assertEqual(progress.download_size, 2048)
+
+
+class TestTransactionProgress(support.TestCase):
+
+    def _get_progress(self, clock, legacy=False, batch=False):
+        daemon = support.DaemonStub()
+        daemon.legacy_progress = legacy
+        daemon.rpm_progress_batch = batch
+        daemon.progress_rate = 4
+        daemon._get_id = mock.Mock(side_effect=str)
+        progress = dnfdaemon.server.TransactionProgress(
+            daemon, clock=lambda: clock[0])
+        return daemon, progress
+
+    def _run(self, progress, clock, pkgs=('foo', 'bar'), steps=10):
+        for num, pkg in enumerate(pkgs):
+            pload = support.Payload(pkg, 0)
+            for step in range(steps + 1):
+                clock[0] += 0.0625
+                progress.progress(pload, dnf.callback.PKG_INSTALL, step * 100,
+                                  steps * 100, num, len(pkgs))
+
+    def test_legacy(self):
+        """Test a RPMProgress signal is sent for every callback."""
+        clock = [100.0]
+        daemon, progress = self._get_progress(clock, legacy=True)
+        self._run(progress, clock)
+        calls = daemon.get_calls()
+        self.assertEqual(len(calls), 22)
+        self.assertEqual(calls[1], "RPMProgress('foo', 'install', 100, "
+                                   "1000, 0, 2)")
+
+    def test_throttled(self):
+        """Test the byte progress is throttled, but not start and end."""
+        clock = [100.0]
+        daemon, progress = self._get_progress(clock)
+        self._run(progress, clock)
+        calls = daemon.get_calls()
+        self.assertEqual(calls, [
+            "RPMProgress('foo', 'install', 0, 1000, 0, 2)",
+            "RPMProgress('foo', 'install', 400, 1000, 0, 2)",
+            "RPMProgress('foo', 'install', 800, 1000, 0, 2)",
+            "RPMProgress('foo', 'install', 1000, 1000, 0, 2)",
+            "RPMProgress('bar', 'install', 0, 1000, 1, 2)",
+            "RPMProgress('bar', 'install', 400, 1000, 1, 2)",
+            "RPMProgress('bar', 'install', 800, 1000, 1, 2)",
+            "RPMProgress('bar', 'install', 1000, 1000, 1, 2)"])
+        # the package ids are cached
+        self.assertEqual(daemon._get_id.call_count, 2)
+
+    def test_batch(self):
+        """Test the byte progress is batched, but not start and end."""
+        clock = [100.0]
+        daemon, progress = self._get_progress(clock, batch=True)
+        self._run(progress, clock)
+        clock[0] += 0.0625
+        progress.progress('foo', dnf.callback.PKG_SCRIPTLET, 0, 0, 2, 2)
+        calls = daemon.get_calls()
+        self.assertEqual(calls, [
+            "RPMProgressBatch([('foo', 'install', 0, 1000, 0, 2)],)",
+            "RPMProgressBatch([('foo', 'install', 400, 1000, 0, 2)],)",
+            "RPMProgressBatch([('foo', 'install', 800, 1000, 0, 2)],)",
+            "RPMProgressBatch([('foo', 'install', 1000, 1000, 0, 2)],)",
+            "RPMProgressBatch([('bar', 'install', 0, 1000, 1, 2)],)",
+            "RPMProgressBatch([('bar', 'install', 400, 1000, 1, 2)],)",
+            "RPMProgressBatch([('bar', 'install', 800, 1000, 1, 2)],)",
+            "RPMProgressBatch([('bar', 'install', 1000, 1000, 1, 2)],)",
+            "RPMProgressBatch([('foo', 'scriptlet', 0, 0, 2, 2)],)"])
+
+    def test_batch_pending(self):
+        """Test the pending byte progress is sent before a start."""
+        clock = [100.0]
+        daemon, progress = self._get_progress(clock, batch=True)
+        progress.progress('foo', dnf.callback.PKG_INSTALL, 0, 1000, 0, 2)
+        progress.progress('foo', dnf.callback.PKG_INSTALL, 500, 1000, 0, 2)
+        progress.progress('bar', dnf.callback.PKG_INSTALL, 0, 1000, 1, 2)
+        self.assertEqual(daemon.get_calls(), [
+            "RPMProgressBatch([('foo', 'install', 0, 1000, 0, 2)],)",
+            "RPMProgressBatch([('foo', 'install', 500, 1000, 0, 2), "
+            "('bar', 'install', 0, 1000, 1, 2)],)"])
+
+
+class TestSignatureChecker(support.TestCase):
+
+    def _get_base(self):
+        base = mock.Mock()
+        base.conf.installroot = '/'
+        base._sig_check_needed.return_value = (True, True)
+        base._sig_check_pkg.return_value = (0, '')
+        base.sig_cache.is_verified.return_value = False
+        return base
+
+    def test_submit(self):
+        """Test the signature check of a submitted package."""
+        base = self._get_base()
+        po = mock.Mock()
+        po.localPkg.return_value = '/cache/foo-1.0-1.noarch.rpm'
+        verifier = mock.Mock()
+        future = concurrent.futures.Future()
+        future.set_result((1, 'no key'))
+        verifier.submit.return_value = future
+        checker = backend.SignatureChecker(base, verifier)
+        try:
+            checker.submit(po)
+            checker.submit(po)  # only checked once
+            self.assertEqual(checker.result(po), (1, 'no key'))
+        finally:
+            checker.close()
+        verifier.submit.assert_called_once_with(
+            '/cache/foo-1.0-1.noarch.rpm', True)
+        verifier.close.assert_called_once_with()
+        base._sig_check_pkg.assert_not_called()
+
+    def test_cached(self):
+        """Test packages verified before are not checked again."""
+        base = self._get_base()
+        verifier = mock.Mock()
+        future = concurrent.futures.Future()
+        future.set_result((0, ''))
+        verifier.submit.return_value = future
+        po = mock.Mock()
+        po.localPkg.return_value = '/cache/foo-1.0-1.noarch.rpm'
+        checker = backend.SignatureChecker(base, verifier)
+        checker.submit(po)
+        self.assertEqual(checker.result(po), (0, ''))
+        base.sig_cache.add.assert_called_once_with(
+            '/cache/foo-1.0-1.noarch.rpm', base.sig_cache.get_stamp())
+        base.sig_cache.is_verified.return_value = True
+        checker.submit(po)
+        self.assertEqual(checker.result(po), (0, ''))
+        checker.close()
+        self.assertEqual(verifier.submit.call_count, 1)
+        base.sig_cache.save.assert_called_once_with()
+
+    def test_no_check(self):
+        """Test packages without gpgcheck are not submitted."""
+        base = self._get_base()
+        base._sig_check_needed.return_value = (False, False)
+        po = mock.Mock()
+        checker = backend.SignatureChecker(base)
+        checker.submit(po)
+        self.assertEqual(checker.result(po), (0, ''))
+        checker.close()
+
+    @mock.patch.object(backend, 'sig_check_file', return_value=(0, ''))
+    def test_worker_ts(self, sig_check_file):
+        """Test the transaction set of a worker is reused."""
+        with mock.patch.object(backend.dnf.rpm.transaction,
+                               'initReadOnlyTransaction') as init_ts:
+            backend._init_sig_worker('/')
+            backend._sig_check_worker('/cache/foo.rpm', True)
+            backend._sig_check_worker('/cache/bar.rpm', True)
+        init_ts.assert_called_once_with('/')
+        sig_check_file.assert_called_with(None, '/cache/bar.rpm', True,
+                                          ts=init_ts.return_value)
+
+    def test_not_submitted(self):
+        """Test packages not submitted are checked by the base."""
+        base = self._get_base()
+        po = mock.Mock()
+        checker = backend.SignatureChecker(base)
+        try:
+            self.assertEqual(checker.result(po), (0, ''))
+        finally:
+            checker.close()
+        base._sig_check_pkg.assert_called_once_with(po)
+
+    def test_progress_submit(self):
+        """Test the downloaded packages are submitted by Progress.end."""
+        daemon = support.DaemonStub()
+        progress = backend.Progress(daemon)
+        progress.sig_checker = mock.Mock()
+        progress.start(2, 2 * 10240)
+        pload = support.Payload('foo-1.0-1.noarch', 10240)
+        pload.pkg = 'foo'
+        progress.end(pload, dnf.callback.STATUS_OK, 'done')
+        # a delta rpm is not rebuilt yet, when the download ends
+        pload = support.Payload('bar-1.0-1.noarch', 10240)
+        pload.pkg = 'bar'
+        progress.end(pload, dnf.callback.STATUS_DRPM, 'done')
+        progress.sig_checker.submit.assert_called_once_with('foo')
+
+
+class TestSignatureCache(support.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='dnfdaemon-test-')
+        self.pkg = os.path.join(self.tmpdir, 'foo-1.0-1.noarch.rpm')
+        with open(self.pkg, 'w') as f:
+            f.write('rpm')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _get_cache(self, keyring='key1'):
+        cache = backend.SignatureCache(
+            os.path.join(self.tmpdir, backend.SIG_CACHE_FILE), '/')
+        cache._header_digest = mock.Mock(return_value='digest')
+        cache._get_keyring = mock.Mock(return_value=keyring)
+        return cache
+
+    def test_persistent(self):
+        """Test the verified packages are stored in the cache file."""
+        cache = self._get_cache()
+        stamp = cache.get_stamp(self.pkg)
+        self.assertFalse(cache.is_verified(self.pkg, stamp))
+        cache.add(self.pkg, stamp)
+        cache.save()
+        cache = self._get_cache()
+        self.assertTrue(cache.is_verified(self.pkg,
+                                          cache.get_stamp(self.pkg)))
+        # a new key is imported
+        cache = self._get_cache(keyring='key2')
+        self.assertFalse(cache.is_verified(self.pkg,
+                                           cache.get_stamp(self.pkg)))
+
+    def test_changed_file(self):
+        """Test a changed package file is not verified."""
+        cache = self._get_cache()
+        cache.add(self.pkg, cache.get_stamp(self.pkg))
+        with open(self.pkg, 'a') as f:
+            f.write('changed')
+        self.assertFalse(cache.is_verified(self.pkg,
+                                           cache.get_stamp(self.pkg)))
+        self.assertIsNone(cache.get_stamp(self.pkg + '.missing'))
+
+    def test_keyring_changed(self):
+        """Test a key removed outside the daemon is a cache miss."""
+        cache = backend.SignatureCache(
+            os.path.join(self.tmpdir, backend.SIG_CACHE_FILE), '/')
+        cache._header_digest = mock.Mock(return_value='digest')
+        keyrings = iter(['key1', 'key2'])
+        cache._read_keyring = mock.Mock(side_effect=lambda: next(keyrings))
+        cache.add(self.pkg, cache.get_stamp(self.pkg))
+        self.assertTrue(cache.is_verified(self.pkg,
+                                          cache.get_stamp(self.pkg)))
+        # the signature checker of the next transaction reads the keyring
+        backend.SignatureChecker(mock.Mock(sig_cache=cache))
+        self.assertFalse(cache.is_verified(self.pkg,
+                                           cache.get_stamp(self.pkg)))
+
+    def test_invalidate(self):
+        """Test the cache is cleared, when a key is imported."""
+        cache = self._get_cache()
+        stamp = cache.get_stamp(self.pkg)
+        cache.add(self.pkg, stamp)
+        cache.invalidate()
+        self.assertFalse(cache.is_verified(self.pkg, stamp))
+        cache.save()
+        with open(cache.path) as f:
+            self.assertEqual(json.load(f)['packages'], {})
+
+
+class TestCleanCache(support.TestCase):
+
+    FILES = ['fedora-0123456789abcdef/repodata/repomd.xml',
+             'fedora-0123456789abcdef/repodata/primary.xml.gz',
+             'fedora-0123456789abcdef/packages/foo-1.0-1.noarch.rpm',
+             'fedora-0123456789abcdef/notes.txt',
+             'fedora-modular-0123456789abcdef/repodata/repomd.xml',
+             'updates-fedcba9876543210/repodata/repomd.xml',
+             'fedora.solv', 'fedora-filenames.solvx', 'fedora-modular.solv',
+             'updates.solv', '@System.solv']
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp(prefix='dnfdaemon-test-')
+        for fn in self.FILES:
+            path = os.path.join(self.cachedir, fn)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('x' * 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _left(self):
+        return sorted(os.path.relpath(os.path.join(root, fn), self.cachedir)
+                      for root, dirs, files in os.walk(self.cachedir)
+                      for fn in files)
+
+    def test_clean_repos(self):
+        """Test only the files of the given repos are removed."""
+        pattern = backend.get_cache_pattern(['metadata', 'packages',
+                                             'dbcache'])
+        count, size = backend.clean_cache(self.cachedir, pattern, ['fedora'])
+        self.assertEqual((count, size), (5, 50))
+        self.assertEqual(self._left(), [
+            '@System.solv', 'fedora-0123456789abcdef/notes.txt',
+            'fedora-modular-0123456789abcdef/repodata/repomd.xml',
+            'fedora-modular.solv',
+            'updates-fedcba9876543210/repodata/repomd.xml', 'updates.solv'])
+
+    def test_clean_all(self):
+        """Test the files of all repos are removed."""
+        pattern = backend.get_cache_pattern(['metadata', 'dbcache'])
+        count, size = backend.clean_cache(self.cachedir, pattern)
+        self.assertEqual(count, 9)
+        self.assertEqual(self._left(), [
+            'fedora-0123456789abcdef/notes.txt',
+            'fedora-0123456789abcdef/packages/foo-1.0-1.noarch.rpm'])
+
+
+class TestCacheQuota(support.TestCase):
+
+    # (path, size, mtime)
+    FILES = [('fedora-0123456789abcdef/packages/a-1.0-1.noarch.rpm', 100, 10),
+             ('fedora-0123456789abcdef/packages/b-1.0-1.noarch.rpm', 200, 30),
+             ('fedora-0123456789abcdef/repodata/repomd.xml', 1000, 0),
+             ('updates-fedcba9876543210/packages/c-1.0-1.noarch.rpm', 300, 20),
+             ('updates-fedcba9876543210/packages/d-1.0-1.noarch.rpm', 400, 40),
+             ('fedora.solv', 1000, 0)]
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp(prefix='dnfdaemon-test-')
+        for fn, size, mtime in self.FILES:
+            path = os.path.join(self.cachedir, fn)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('x' * size)
+            os.utime(path, (0, mtime))  # like a noatime mount
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _path(self, name):
+        for fn, size, mtime in self.FILES:
+            if os.path.basename(fn).startswith(name + '-'):
+                return os.path.join(self.cachedir, fn)
+
+    def _left(self):
+        return sorted(fn.split('-')[0] for root, dirs, files
+                      in os.walk(self.cachedir) for fn in files
+                      if fn.endswith('.rpm'))
+
+    def test_usage(self):
+        """Test the package cache usage of each repo."""
+        self.assertEqual(backend.get_cache_usage(self.cachedir), {
+            'fedora': {'packages': 2, 'bytes': 300},
+            'updates': {'packages': 2, 'bytes': 700}})
+        self.assertEqual(backend.get_cache_usage(
+            os.path.join(self.cachedir, 'missing')), {})
+
+    def test_quota(self):
+        """Test the least recently used packages are evicted."""
+        count, size = backend.enforce_cache_quota(self.cachedir, 1000)
+        self.assertEqual((count, size), (0, 0))
+        count, size = backend.enforce_cache_quota(self.cachedir, 600)
+        self.assertEqual((count, size), (2, 400))
+        self.assertEqual(self._left(), ['b', 'd'])
+
+    def test_quota_keep(self):
+        """Test the packages of a pending transaction is not evicted."""
+        keep = {self._path('a')}
+        count, size = backend.enforce_cache_quota(self.cachedir, 500, keep)
+        self.assertEqual((count, size), (2, 500))
+        self.assertEqual(self._left(), ['a', 'd'])
+
+    def test_touch(self):
+        """Test a used package is evicted last, and the mtime is kept."""
+        path = self._path('a')
+        backend.touch_packages(self.cachedir, [path, path + '.missing'])
+        self.assertEqual(os.stat(path).st_mtime, 10)
+        backend.enforce_cache_quota(self.cachedir, 100)
+        self.assertEqual(self._left(), ['a'])
+        # the evicted and missing packages are forgotten
+        with open(os.path.join(self.cachedir,
+                               backend.CACHE_LRU_FILE)) as f:
+            self.assertEqual(list(json.load(f)), [path])
+
 
 class TestPackages(support.TestCase):
 
@@ -170,6 +626,273 @@ class TestPackages(support.TestCase):
         obs = list(map(str, pkgs.obsoletes))
         self.assertEqual(obs, ['bar-new-2.0-1.noarch'])
 
+    def test_updates_scratch_goal(self):
+        """Test updates leaves the current goal untouched"""
+        base = support.MockBase('main')
+        pkgs = backend.Packages(base)
+        base.install('petzoo')
+        goal = base._goal
+        self.assertEqual(list(map(str, pkgs.updates)), ['bar-2.0-1.noarch'])
+        self.assertIs(base._goal, goal)
+        base.resolve(allow_erasing=True)
+        self.assertEqual([str(tsi.pkg) for tsi in base.transaction],
+                         ['petzoo-1.0-1.noarch'])
+        self.assertEqual(pkgs.updates_summary(),
+                         {'updates': 1, 'installs': 0, 'download_size': 0})
+
+    def test_package_actions(self):
+        """Test the package actions classifier"""
+        base = support.MockBase('main')
+        pkgs = backend.Packages(base)
+        po_list = pkgs.query.filter(name=['bar', 'bar-new', 'foo', 'petzoo'])
+        actions = dict(zip(['%s,%s' % (po, po.reponame) for po in po_list],
+                           pkgs.actions.classify(po_list)))
+        self.assertEqual(actions,
+            {'bar-1.0-1.noarch,@System': 'remove',
+             'foo-2.0-1.noarch,@System': 'remove',
+             'bar-1.0-1.noarch,main': 'install',
+             'bar-2.0-1.noarch,main': 'update',
+             'bar-new-2.0-1.noarch,main': 'obsolete',
+             'foo-1.0-1.noarch,main': 'downgrade',
+             'foo-2.0-1.noarch,main': 'install',
+             'petzoo-1.0-1.noarch,main': 'install'})
+
+
+class TestPackageIndex(support.TestCase):
+
+    def setUp(self):
+        self.base = support.MockBase('main')
+        self.index = backend.PackageIndex(self.base.sack)
+
+    def test_get(self):
+        """Test package index lookups"""
+        po = self.index.get('bar,0,2.0,1,noarch,main')
+        self.assertEqual(str(po), 'bar-2.0-1.noarch')
+        self.assertEqual(po.reponame, 'main')
+        po = self.index.get('bar,0,1.0,1,noarch,@System')
+        self.assertEqual(str(po), 'bar-1.0-1.noarch')
+        self.assertEqual(po.reponame, '@System')
+        po = self.index.get('bar,0,1.0,1,noarch,main')
+        self.assertEqual(po.reponame, 'main')
+        self.assertIsNone(self.index.get('not-found,0,1.0,1,noarch,main'))
+
+    def test_get_epoch(self):
+        """Test package index honor the epoch"""
+        self.assertIsNone(self.index.get('bar,1,2.0,1,noarch,main'))
+        self.assertIsNone(self.index.get('bar,1,1.0,1,noarch,@System'))
+
+    def test_get_available(self):
+        """Test package index lookups of available packages"""
+        po = self.index.get_available('foo,0,2.0,1,noarch,@System')
+        self.assertEqual(str(po), 'foo-2.0-1.noarch')
+        self.assertEqual(po.reponame, 'main')
+        self.assertIsNone(
+            self.index.get_available('bar-old,0,2.0,1,noarch,@System'))
+
+
+class TestResultCache(support.TestCase):
+
+    def test_lru(self):
+        """Test result cache eviction"""
+        cache = dnfdaemon.server.ResultCache(max_size=10)
+        cache.put('a', '1234')
+        cache.put('b', '1234')
+        self.assertEqual(cache.get('a'), '1234')
+        cache.put('c', '1234')  # b is least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), '1234')
+        cache.put('d', '12345678901')  # too big to be cached
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.stats(),
+            {'hits': 2, 'misses': 2, 'evictions': 1, 'entries': 2,
+             'size': 8, 'max_size': 10})
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 0)
+
+
+class TestAuthorizationCache(support.TestCase):
+
+    def test_expire(self):
+        """Test authorizations expire after the ttl"""
+        now = [0]
+        cache = dnfdaemon.server.AuthorizationCache(ttl=10,
+                                                    clock=lambda: now[0])
+        cache.add(':1.1', 'read')
+        self.assertTrue(cache.is_authorized(':1.1', 'read'))
+        self.assertFalse(cache.is_authorized(':1.1', 'write'))
+        self.assertFalse(cache.is_authorized(':1.2', 'read'))
+        now[0] = 5
+        cache.add(':1.1', 'write')
+        now[0] = 10
+        self.assertFalse(cache.is_authorized(':1.1', 'read'))
+        self.assertTrue(cache.is_authorized(':1.1', 'write'))
+        now[0] = 15
+        self.assertFalse(cache.is_authorized(':1.1', 'write'))
+        self.assertEqual(len(cache), 0)
+
+    def test_remove(self):
+        """Test the sender watch is cancelled, when the sender is removed"""
+        watches = {}
+
+        def watch(sender):
+            watches[sender] = mock.Mock()
+            return watches[sender]
+
+        cache = dnfdaemon.server.AuthorizationCache(watch=watch)
+        cache.add(':1.1', 'read')
+        cache.add(':1.1', 'write')
+        cache.add(':1.2', 'read')
+        self.assertEqual(sorted(watches), [':1.1', ':1.2'])
+        cache.remove(':1.1')
+        self.assertFalse(cache.is_authorized(':1.1', 'read'))
+        self.assertTrue(cache.is_authorized(':1.2', 'read'))
+        watches[':1.1'].cancel.assert_called_once_with()
+        cache.clear()
+        watches[':1.2'].cancel.assert_called_once_with()
+        self.assertEqual(len(cache), 0)
+
+
+class TestMethodStats(support.TestCase):
+
+    def test_stats(self):
+        """Test method stats percentiles and histogram"""
+        stats = dnfdaemon.server.MethodStats()
+        for num in range(98):
+            stats.record('GetPackages', 0.002, 100)
+        stats.record('GetPackages', 0.2, 1000)
+        stats.record('GetPackages', 2.0, error=True)
+        value = stats.stats()['methods']['GetPackages']
+        self.assertEqual(value['calls'], 100)
+        self.assertEqual(value['errors'], 1)
+        self.assertEqual(value['p50'], 0.0025)
+        self.assertEqual(value['p90'], 0.0025)
+        self.assertEqual(value['p99'], 0.25)
+        self.assertEqual(value['max'], 2.0)
+        self.assertEqual(value['bytes'], 98 * 100 + 1000)
+        self.assertEqual(value['max_bytes'], 1000)
+        self.assertEqual(value['histogram'],
+                         [[0.0025, 98], [0.25, 1], [2.5, 1]])
+
+    def test_payload_size(self):
+        """Test the reply size estimate"""
+        self.assertEqual(dnfdaemon.server._payload_size('abc'), 3)
+        self.assertEqual(dnfdaemon.server._payload_size(
+            [{'id': 'foo', 'size': 10}, None]), 2 + 3 + 4 + 8)
+        # a large list is estimated from a sample
+        self.assertEqual(dnfdaemon.server._payload_size(
+            [{'id': 'foo', 'size': 10}] * 10000), 10000 * (2 + 3 + 4 + 8))
+        size = dnfdaemon.server._payload_size(
+            ['x' * (num // 1000) for num in range(10000)])
+        self.assertAlmostEqual(size, 45000, delta=4500)
+
+
+class TestProfiler(support.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cpu(self):
+        """Test cpu profiling, with a job run in a worker thread"""
+        profiler = dnfdaemon.server.Profiler('cpu', self.directory)
+        profiler.start()
+        sorted(range(1000))
+        thread = threading.Thread(target=profiler.run_job,
+                                  args=(json.dumps, list(range(1000))))
+        thread.start()
+        thread.join()
+        result = profiler.stop(top=5)
+        self.assertEqual(result['mode'], 'cpu')
+        self.assertTrue(result['path'].endswith('.pstats'))
+        self.assertLessEqual(len(result['top']), 5)
+        stats = pstats.Stats(result['path'])
+        functions = [pstats.func_std_string(func) for func in stats.stats]
+        self.assertTrue(any('sorted' in func for func in functions))
+        self.assertTrue(any('dumps' in func for func in functions))
+
+    def test_memory(self):
+        """Test memory profiling"""
+        profiler = dnfdaemon.server.Profiler('memory', self.directory)
+        profiler.start()
+        data = [str(num) for num in range(10000)]
+        result = profiler.stop()
+        self.assertEqual(len(data), 10000)
+        self.assertTrue(os.path.exists(result['path']))
+        self.assertGreater(result['top'][0]['size'], 0)
+
+    def test_mode(self):
+        """Test an unknown profiling mode"""
+        self.assertRaises(ValueError, dnfdaemon.server.Profiler, 'disk')
+
+    def test_directory(self):
+        """Test the profile directory is created private, and a symlink or
+        a directory accessible by others is refused"""
+        path = os.path.join(self.directory, 'profiles')
+        profiler = dnfdaemon.server.Profiler('cpu', path)
+        profiler._check_directory()
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+        link = os.path.join(self.directory, 'link')
+        os.symlink(path, link)
+        profiler = dnfdaemon.server.Profiler('cpu', link)
+        self.assertRaises(OSError, profiler._check_directory)
+        os.chmod(path, 0o777)
+        profiler = dnfdaemon.server.Profiler('cpu', path)
+        self.assertRaises(OSError, profiler._check_directory)
+
+
+class TestSynthRepo(support.TestCase):
+
+    def setUp(self):
+        self.path = synthrepo.generate(tempfile.mkdtemp(), 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_load(self):
+        """Test the synthetic repo can be loaded by MockBase"""
+        base = support.MockBase(synthrepo.REPO_ID, repo_path=self.path,
+                                comps_path=synthrepo.comps_path(self.path))
+        q = base.sack.query()
+        self.assertEqual(len(q.available()), 100)
+        self.assertEqual(len(q.installed()), 10)
+        self.assertEqual(len(q.upgrades()), 5)
+        self.assertEqual(len(q.filter(name='synth000010-ng')), 1)
+        po = q.available().filter(name='synth000020')[0]
+        self.assertEqual(str(po.evr), '2.0-1')
+        self.assertTrue(po.requires)
+        advisories = backend.UpdateInfo(po).advisories_list()
+        self.assertEqual([adv['id'] for adv in advisories], ['SYNTH-000000'])
+        comps = base.read_mock_comps(seed_persistor=False)
+        self.assertEqual(len(list(comps.groups_iter())), 2)
+
+
+class TestSearchIndex(support.TestCase):
+
+    def setUp(self):
+        self.base = support.MockBase('main')
+        self.index = backend.SearchIndex(self.base.sack)
+
+    def test_contains(self):
+        """Test search index gives the same result as hawkey"""
+        for key in ['bar', 'BAR', 'ar', 'b', '', 'foo-dep', 'not-found',
+                    'r-o']:
+            query = self.base.sack.query().filter(hawkey.ICASE,
+                                                  name__substr=key)
+            self.assertEqual(self.index.contains('name', key),
+                             set(query.run()), key)
+
+    def test_contains_summary(self):
+        """Test search index for fields with no value"""
+        for field in ['summary', 'description']:
+            for key in ['bar', 'BAR', 'ba']:
+                query = self.base.sack.query().filter(
+                    hawkey.ICASE, **{'%s__substr' % field: key})
+                self.assertEqual(self.index.contains(field, key),
+                                 set(query.run()), (field, key))
+
 
 class TestAdvisory(support.TestCase):
 
@@ -300,6 +1023,35 @@ class TestCommonMisc(TestCommonBase):
         repos = self.daemon.get_repositories('enabled')
         self.assertEqual(repos, ['main'])
 
+    def test_get_repo_disabled(self):
+        """Test get_repo of a disabled repo keeps the pending transaction"""
+        base = self.daemon.base
+        repo = support.MockRepo('updates', None)
+        repo.disable()
+        base.repos.add(repo)
+        self.daemon.add_transaction('petzoo,0,1.0,1,noarch,main', 'install')
+        self.daemon.build_transaction()
+        value = json.loads(self.daemon.get_repo('updates'))
+        self.assertEqual(value['packages'], 2)
+        self.assertFalse(value['enabled'])
+        self.assertIs(self.daemon._base, base)
+        self.assertEqual(self.daemon.get_repositories('enabled'), ['main'])
+        self.assertEqual(json.loads(self.daemon.get_transaction()),
+            [True, [['install', [['petzoo,0,1.0,1,noarch,main', 0.0, []]]]]])
+
+    def test_cache_quota_keep_transaction(self):
+        """Test the packages of the transaction are not evicted"""
+        self.daemon.add_transaction('petzoo,0,1.0,1,noarch,main', 'install')
+        self.daemon.build_transaction()
+        self.daemon.cache_quota = 100
+        with mock.patch.object(self.daemon.base,
+                               'enforce_cache_quota') as enforce:
+            self.daemon._enforce_cache_quota()
+        keep = {po.localPkg()
+                for po in self.daemon.base.transaction.install_set}
+        self.assertEqual(len(keep), 1)
+        enforce.assert_called_once_with(100, keep)
+
     def test_get_config(self):
         # read all conf
         cfg = self.daemon.get_config('*')
@@ -325,6 +1077,234 @@ class TestCommonMisc(TestCommonBase):
              'bar-old,0,1.0,1,noarch,@System',
              'old-bar,0,1.0,1,noarch,@System'])
 
+    def test_get_packages_page(self):
+        """Test get_packages_page & get_page"""
+        res = json.loads(self.daemon.get_packages_page('installed', [], 0, 3))
+        self.assertEqual(res['packages'],
+            ['bar,0,1.0,1,noarch,@System',
+             'foo,0,2.0,1,noarch,@System',
+             'bar-old,0,1.0,1,noarch,@System'])
+        self.assertEqual(res['total'], 4)
+        res = json.loads(self.daemon.get_page(res['cursor'], 3))
+        self.assertEqual(res['packages'], ['old-bar,0,1.0,1,noarch,@System'])
+        self.assertEqual(res['total'], 4)
+        self.assertEqual(res['cursor'], '')
+        # cursors are invalid after the sack is reloaded
+        res = json.loads(self.daemon.get_packages_page('installed',
+                                                       ['size'], 1, 1))
+        self.assertEqual(res['packages'], [['foo,0,2.0,1,noarch,@System', 0]])
+        self.daemon.base.setup_base()
+        self.assertIsNone(self.daemon.get_page(res['cursor'], 1))
+        self.assertIsNone(self.daemon.get_page('not a cursor', 1))
+
+    def test_result_cache(self):
+        """Test the result cache"""
+        pkgs = self.daemon.get_packages('installed', ['size'])
+        self.assertEqual(self.daemon.get_packages('installed', ['size']),
+                         pkgs)
+        self.daemon.get_packages('installed', [])
+        stats = json.loads(self.daemon.get_result_cache_stats())
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['entries'], 2)
+        # results from an older sack is not used
+        self.daemon.base.setup_base()
+        self.assertEqual(self.daemon.get_packages('installed', ['size']),
+                         pkgs)
+        stats = json.loads(self.daemon.get_result_cache_stats())
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+
+    def test_get_updates_summary(self):
+        """Test get_updates_summary"""
+        summary = json.loads(self.daemon.get_updates_summary())
+        self.assertEqual(summary,
+                         {'updates': 1, 'installs': 0, 'download_size': 0})
+
+    def test_rpmdb_changed(self):
+        """Test the installed packages is reloaded after rpmdb changes"""
+        generation = self.daemon.base.sack_generation
+        self.daemon.get_packages('installed', [])
+        self.daemon._on_rpmdb_changed()
+        self.assertNotEqual(self.daemon.base.sack_generation, generation)
+        self.assertFalse(self.daemon._installed_changed)
+        self.daemon.get_packages('installed', [])
+        stats = json.loads(self.daemon.get_result_cache_stats())
+        self.assertEqual(stats['misses'], 2)
+
+    def test_rpmdb_changed_not_cached(self):
+        """Test the base is reset, if the repos is not in the cache"""
+        self.daemon._base.reload_installed = mock.Mock(return_value=False)
+        self.daemon._reset_base = mock.Mock()
+        self.daemon._on_rpmdb_changed()
+        self.daemon.base
+        self.daemon._base.reload_installed.assert_called_once_with()
+        self.daemon._reset_base.assert_called_once_with()
+
+    def test_rpmdb_changed_pending_transaction(self):
+        """Test a pending transaction survives a rpmdb change"""
+        generation = self.daemon.base.sack_generation
+        self.daemon.add_transaction('petzoo,0,1.0,1,noarch,main', 'install')
+        self.daemon.build_transaction()
+        self.daemon._on_rpmdb_changed()
+        self.assertEqual(self.daemon.base.sack_generation, generation)
+        self.assertTrue(self.daemon._installed_changed)
+        self.assertEqual(json.loads(self.daemon.get_transaction()),
+            [True, [['install', [['petzoo,0,1.0,1,noarch,main', 0.0, []]]]]])
+        # reloaded when the transaction is cleared
+        self.daemon.clear_transaction()
+        self.assertNotEqual(self.daemon.base.sack_generation, generation)
+        self.assertFalse(self.daemon._installed_changed)
+
+    def test_run_in_worker(self):
+        """Test read methods running in a worker thread"""
+        result = {}
+        self.daemon.run_in_worker(
+            lambda value: result.setdefault('value', value),
+            lambda err: result.setdefault('error', err),
+            self.daemon.get_packages, 'installed', [])
+        self.daemon.run_in_worker(
+            lambda value: result.setdefault('value', value),
+            lambda err: result.setdefault('error', err),
+            int, 'not a number')
+        context = GLib.MainContext.default()
+        while len(result) < 2:
+            context.iteration(True)
+        self.assertEqual(json.loads(result['value']),
+            ['bar,0,1.0,1,noarch,@System',
+             'foo,0,2.0,1,noarch,@System',
+             'bar-old,0,1.0,1,noarch,@System',
+             'old-bar,0,1.0,1,noarch,@System'])
+        self.assertIsInstance(result['error'], ValueError)
+        self.assertEqual(self.daemon._jobs, 0)
+
+    def _wait_replies(self, replies, count):
+        context = GLib.MainContext.default()
+        while len(replies) < count:
+            context.iteration(True)
+
+    def test_run_in_worker_shared(self):
+        """Test read methods run at the same time in the worker threads"""
+        barrier = threading.Barrier(2, timeout=10)
+        replies = []
+        for num in range(2):
+            self.daemon.run_in_worker(replies.append, replies.append,
+                                      barrier.wait)
+        self._wait_replies(replies, 2)
+        self.assertEqual(sorted(replies), [0, 1])
+
+    def test_run_exclusive(self):
+        """Test a method changing the sack is queued, not blocking the
+        main loop, until the running read methods are done"""
+        release = threading.Event()
+        replies = []
+
+        def read():
+            release.wait(10)
+            return 'read'
+
+        self.daemon.run_in_worker(replies.append, replies.append, read)
+        self.daemon.run_exclusive(replies.append, replies.append,
+                                  lambda: 'write')
+        self.daemon.run_in_worker(replies.append, replies.append,
+                                  lambda: 'read2')
+        self.assertEqual(replies, [])
+        self.assertEqual(self.daemon._jobs, 1)  # read2 waits for write
+        release.set()
+        self._wait_replies(replies, 3)
+        self.assertEqual(replies, ['read', 'write', 'read2'])
+        # run at once, when no read method is running
+        self.daemon.run_exclusive(replies.append, replies.append,
+                                  lambda: 'now')
+        self.assertEqual(replies[-1], 'now')
+
+    def test_reset_base_deferred(self):
+        """Test the dnf.Base is closed after the running read methods"""
+        release = threading.Event()
+        replies = []
+        self.daemon.run_in_worker(replies.append, replies.append,
+                                  lambda: release.wait(10))
+        self.daemon._reset_base()
+        self.assertIsNotNone(self.daemon._base)
+        release.set()
+        self._wait_replies(replies, 1)
+        self.assertIsNone(self.daemon._base)
+
+    def test_read_leases(self):
+        """Test read leases and lock release when the sender leaves"""
+        self.assertTrue(self.daemon.add_read_lease(':1.1'))
+        self.assertTrue(self.daemon.has_read_lease(':1.1'))
+        self.daemon.set_lock(':1.2')
+        self.daemon._on_name_owner_changed(':1.1', '')
+        self.assertFalse(self.daemon.has_read_lease(':1.1'))
+        self.assertFalse(self.daemon.remove_read_lease(':1.1'))
+        self.assertEqual(self.daemon._lock, ':1.2')
+        self.daemon._on_name_owner_changed(':1.2', ':1.2')  # still there
+        self.assertEqual(self.daemon._lock, ':1.2')
+        self.daemon._on_name_owner_changed(':1.2', '')
+        self.assertIsNone(self.daemon._lock)
+        self.assertIsNone(self.daemon._base)
+
+    def test_logger_stats(self):
+        """Test the Logger decorator records the method stats"""
+        @dnfdaemon.server.Logger
+        def GetValue(daemon, value):
+            return value
+
+        @dnfdaemon.server.Logger
+        def GetAsync(daemon, reply_handler=None, error_handler=None):
+            reply_handler('[1, 2]')
+
+        @dnfdaemon.server.Logger
+        def Fail(daemon):
+            raise ValueError('failed')
+
+        self.assertEqual(GetValue(self.daemon, 'abcd'), 'abcd')
+        replies = []
+        GetAsync(self.daemon, reply_handler=replies.append,
+                 error_handler=None)
+        self.assertEqual(replies, ['[1, 2]'])
+        self.assertRaises(ValueError, Fail, self.daemon)
+        stats = json.loads(self.daemon.get_stats())['methods']
+        self.assertEqual(stats['GetValue']['calls'], 1)
+        self.assertEqual(stats['GetValue']['bytes'], 4)
+        self.assertEqual(stats['GetAsync']['bytes'], 6)
+        self.assertEqual(stats['Fail']['errors'], 1)
+
+    def test_auth_cache_name_owner_changed(self):
+        """Test authorizations are removed when the sender leaves"""
+        self.daemon._auth_cache.add(':1.1', 'read')
+        self.daemon._on_name_owner_changed(':1.1', '')
+        self.assertFalse(self.daemon._auth_cache.is_authorized(':1.1', 'read'))
+
+    def test_get_packages_native(self):
+        """Test get_packages_native"""
+        pkgs = self.daemon.get_packages_native('installed', ['size', 'action'])
+        self.assertEqual(pkgs,
+            [{'id': 'bar,0,1.0,1,noarch,@System', 'size': 0,
+              'action': 'remove'},
+             {'id': 'foo,0,2.0,1,noarch,@System', 'size': 0,
+              'action': 'remove'},
+             {'id': 'bar-old,0,1.0,1,noarch,@System', 'size': 0,
+              'action': 'remove'},
+             {'id': 'old-bar,0,1.0,1,noarch,@System', 'size': 0,
+              'action': 'remove'}])
+        self.assertEqual(pkgs[0].signature, 'sv')
+        self.assertIsInstance(pkgs[0]['size'], dbus.Int64)
+        # None values are left out
+        pkgs = self.daemon.get_packages_native('installed', ['not-found'])
+        self.assertEqual(pkgs[0], {'id': 'bar,0,1.0,1,noarch,@System'})
+
+    def test_to_dbus_value(self):
+        """Test the D-Bus typed values used by the native API"""
+        to_dbus = dnfdaemon.server._to_dbus_value
+        self.assertIsInstance(to_dbus(True), dbus.Boolean)
+        self.assertIsInstance(to_dbus(2 ** 40), dbus.Int64)
+        self.assertEqual(to_dbus(['a', 'b']).signature, 's')
+        self.assertEqual(to_dbus(['a', 1, None]), ['a', 1, ''])
+        self.assertEqual(to_dbus({'a': 1, 'b': None}), {'a': 1})
+        self.assertIsNone(to_dbus(None))
+
     def test_get_attribute(self):
         pkg_id = 'bar,0,2.0,1,noarch,main'
         attr = self.daemon.get_attribute(pkg_id, 'size')
@@ -345,6 +1325,21 @@ class TestCommonMisc(TestCommonBase):
         attr = self.daemon.get_attribute(pkg_id, 'requires')
         self.assertEqual(json.loads(attr), {})
 
+    def test_get_attributes(self):
+        """Test get_attributes"""
+        pkg_ids = ['bar,0,2.0,1,noarch,main',
+                   'foo,0,2.0,1,noarch,@System',
+                   'not-found,0,1.0,1,noarch,main']
+        attrs = self.daemon.get_attributes(pkg_ids,
+                                           ['size', 'action', 'downgrades'])
+        self.assertEqual(json.loads(attrs),
+            {'bar,0,2.0,1,noarch,main': [0, 'update', []],
+             'foo,0,2.0,1,noarch,@System':
+                 [0, 'remove', ['foo,0,1.0,1,noarch,main']],
+             'not-found,0,1.0,1,noarch,main': None})
+        attrs = self.daemon.get_attributes(pkg_ids[:1], [])
+        self.assertEqual(json.loads(attrs), {'bar,0,2.0,1,noarch,main': []})
+
     def test_search_with_attr_all(self):
         """Test search_with_attr (all)"""
         fields = ['name']
@@ -384,6 +1379,19 @@ class TestCommonMisc(TestCommonBase):
              'bar-dep-err,0,1.0,1,noarch,main',
              'bar-new,0,2.0,1,noarch,main'])
 
+    def test_search_page(self):
+        """Test search_page"""
+        res = json.loads(self.daemon.search_page(['name'], ['bar'], [],
+                                                  True, True, False, 0, 0))
+        self.assertEqual(res['packages'],
+            ['bar-old,0,1.0,1,noarch,@System',
+             'old-bar,0,1.0,1,noarch,@System',
+             'bar,0,2.0,1,noarch,main',
+             'bar-dep-err,0,1.0,1,noarch,main',
+             'bar-new,0,2.0,1,noarch,main'])
+        self.assertEqual(res['total'], 5)
+        self.assertEqual(res['cursor'], '')
+
     def test_get_packages_by_name_with_attr(self):
         """Test get_packages_by_name_with_attr"""
         attrs = []
@@ -539,6 +1547,17 @@ class TestCommonTransaction(TestCommonBase):
             [False, ['Cant find package object for : '
                  'not-found,0,1.0,1,noarch,main']])
 
+    def test_build_transaction_native(self):
+        pkg_id = 'petzoo,0,1.0,1,noarch,main'
+        self.daemon.add_transaction(pkg_id, 'install')
+        res = self.daemon.build_transaction_native()
+        self.assertEqual(res,
+            (True, [('install', [('petzoo,0,1.0,1,noarch,main', 0.0, [])])],
+             []))
+        res = self.daemon.get_transaction_native()
+        self.assertEqual(res,
+            (True, [('install', [('petzoo,0,1.0,1,noarch,main', 0.0, [])])]))
+
     def test_add_transaction_install_local(self):
         pkg_id = support.LOCAL_RPM
         res = self.daemon.add_transaction(pkg_id, 'localinstall')
@@ -633,5 +1652,10 @@ class TestCommonTransaction(TestCommonBase):
         res = self.daemon.build_transaction()
         self.assertEqual(json.loads(res),
             [True, [['install', [['petzoo,0,1.0,1,noarch,main', 0.0, []]]]]])
+        base = self.daemon.base
+        generation = base.sack_generation
         res = self.daemon.run_transaction()
         self.assertEqual(json.loads(res), [0, []])
+        # the base is kept, only the installed packages is reloaded
+        self.assertIs(self.daemon.base, base)
+        self.assertNotEqual(base.sack_generation, generation)